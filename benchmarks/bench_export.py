@@ -0,0 +1,115 @@
+"""Compare report formats by export time, file size and time to read back.
+
+Run from the repository root:
+
+    python benchmarks/bench_export.py --rows 100000
+
+"read" loads the whole file into Python values: json.load for JSON, a csv
+reader for CSV, one json.loads per line for NDJSON and read_columnar() for
+PTC. "read_2_columns" reads only the status and created_at columns, which
+only the columnar format can do without parsing everything else.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault(
+    "PYTASKY_DB", os.path.join(tempfile.gettempdir(), "pytasky_bench_export.db")
+)
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from models import Base, Task, create_storage_engine  # noqa: E402
+from columnar import read_columnar  # noqa: E402
+from reports import REPORT_FORMATS, export_report  # noqa: E402
+
+STATUSES = ["todo", "in-progress", "done", "done", "cancelled"]
+
+
+def populate(session, rows):
+    start = datetime(2024, 1, 1, 9)
+    for offset in range(0, rows, 10000):
+        batch = []
+        for i in range(offset, min(rows, offset + 10000)):
+            created = start + timedelta(minutes=i)
+            status = STATUSES[i % len(STATUSES)]
+            batch.append(
+                {
+                    "title": f"Ticket {i}: fix the thing",
+                    "notes": "Reported by support" if i % 3 else None,
+                    "tag": f"team-{i % 7}",
+                    "status": status,
+                    "created_at": created,
+                    "completed_at": (
+                        created + timedelta(hours=5) if status == "done" else None
+                    ),
+                    "last_updated": created + timedelta(hours=5),
+                }
+            )
+        session.execute(insert(Task), batch)
+    session.commit()
+
+
+def read_back(path, format_type, columns=None):
+    if format_type == "ptc":
+        return read_columnar(path, columns)
+    with open(path, newline="") as f:
+        if format_type == "json":
+            records = json.load(f)
+        elif format_type == "csv":
+            records = list(csv.reader(f))
+        else:
+            records = [json.loads(line) for line in f]
+    if columns and format_type != "csv":
+        return [[record[column] for column in columns] for record in records]
+    return records
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return round(time.perf_counter() - start, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_storage_engine(os.path.join(tmpdir, "tasks.db"))
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        populate(session, args.rows)
+        start, end = datetime(2000, 1, 1), datetime(2100, 1, 1)
+
+        for format_type in REPORT_FORMATS:
+            path = os.path.join(tmpdir, f"report.{format_type}")
+            write_s = timed(export_report, session, path, format_type, start, end)
+            print(
+                json.dumps(
+                    {
+                        "format": format_type,
+                        "rows": args.rows,
+                        "write_s": write_s,
+                        "bytes": os.path.getsize(path),
+                        "read_s": timed(read_back, path, format_type),
+                        "read_2_columns_s": timed(
+                            read_back, path, format_type, ["status", "created_at"]
+                        ),
+                    }
+                )
+            )
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Measure bulk import throughput for each supported file format.
+
+Run from the repository root:
+
+    python benchmarks/bench_import.py --rows 100000
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault(
+    "PYTASKY_DB", os.path.join(tempfile.gettempdir(), "pytasky_bench_import.db")
+)
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from models import Base, create_storage_engine, upgrade_schema  # noqa: E402
+from importer import IMPORT_FORMATS, import_file  # noqa: E402
+from reports import REPORT_FIELDS  # noqa: E402
+
+STATUSES = ["todo", "in-progress", "done", "done", "cancelled"]
+
+
+def records(rows):
+    for i in range(rows):
+        yield {
+            "title": f"Imported ticket {i}",
+            "notes": "Migrated from the old tracker",
+            "tag": f"team-{i % 7}",
+            "status": STATUSES[i % len(STATUSES)],
+            "created_at": "2024-06-01 09:00:00",
+        }
+
+
+def write_source(path, format_type, rows):
+    with open(path, "w", newline="") as f:
+        if format_type == "csv":
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS[1:])
+            writer.writeheader()
+            writer.writerows(records(rows))
+        elif format_type == "ndjson":
+            for record in records(rows):
+                f.write(json.dumps(record) + "\n")
+        else:
+            json.dump(list(records(rows)), f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for format_type in IMPORT_FORMATS:
+            source = os.path.join(tmpdir, f"tasks.{format_type}")
+            write_source(source, format_type, args.rows)
+            engine = create_storage_engine(os.path.join(tmpdir, f"{format_type}.db"))
+            Base.metadata.create_all(engine)
+            upgrade_schema(engine)
+            session = sessionmaker(bind=engine)()
+            start = time.perf_counter()
+            count = import_file(session, source, format_type, args.batch_size)
+            session.commit()
+            elapsed = time.perf_counter() - start
+            session.close()
+            engine.dispose()
+            print(
+                json.dumps(
+                    {
+                        "format": format_type,
+                        "rows": count,
+                        "seconds": round(elapsed, 3),
+                        "rows_per_minute": round(count / elapsed * 60),
+                    }
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
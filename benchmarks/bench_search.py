@@ -0,0 +1,109 @@
+"""Time incremental full-text search, one query per simulated keystroke.
+
+Run from the repository root:
+
+    python benchmarks/bench_search.py --rows 100000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault(
+    "PYTASKY_DB", os.path.join(tempfile.gettempdir(), "pytasky_bench_search.db")
+)
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from models import (  # noqa: E402
+    ACTIVE_STATUSES,
+    STATUSES,
+    Base,
+    Task,
+    create_storage_engine,
+    search_tasks,
+    upgrade_schema,
+)
+
+COMMON = (
+    "release login signup invoice report backlog sprint review deploy cache "
+    "database migration onboarding customer refactor flaky pipeline budget"
+).split()
+
+
+def vocabulary(rng, size=5000):
+    """Common tracker words plus a long tail of rarer synthetic ones"""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    tail = {"".join(rng.choices(letters, k=rng.randint(4, 9))) for _ in range(size)}
+    return COMMON + sorted(tail)
+
+
+def populate(session, rows):
+    rng = random.Random(42)
+    words = vocabulary(rng)
+    # Zipf-like weights: a few words are everywhere, most are rare
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    now = datetime.now()
+    batch = []
+    for i in range(rows):
+        batch.append(
+            {
+                "title": " ".join(rng.choices(words, weights, k=4)),
+                "notes": " ".join(rng.choices(words, weights, k=12)),
+                "tag": rng.choice(COMMON),
+                "status": rng.choice(STATUSES),
+                "created_at": now,
+                "last_updated": now,
+            }
+        )
+        if len(batch) == 5000:
+            session.execute(insert(Task), batch)
+            batch = []
+    if batch:
+        session.execute(insert(Task), batch)
+    session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--phrase", default="release pipeline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_storage_engine(os.path.join(tmpdir, "tasks.db"))
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        session = sessionmaker(bind=engine)()
+        populate(session, args.rows)
+
+        timings = []
+        for end in range(1, len(args.phrase) + 1):
+            start = time.perf_counter()
+            results = search_tasks(session, args.phrase[:end], ACTIVE_STATUSES)
+            timings.append(((time.perf_counter() - start) * 1000, len(results)))
+        session.close()
+        engine.dispose()
+
+    latencies = sorted(ms for ms, _ in timings)
+    print(
+        json.dumps(
+            {
+                "rows": args.rows,
+                "keystrokes": len(timings),
+                "search_ms_median": round(statistics.median(latencies), 2),
+                "search_ms_max": round(latencies[-1], 2),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
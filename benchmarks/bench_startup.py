@@ -0,0 +1,74 @@
+"""Measure cold import time and time to first paint of the desktop app.
+
+Run from the repository root (first paint needs a display, e.g. xvfb-run):
+
+    python benchmarks/bench_startup.py --runs 5 [--db path/to/tasks.db]
+
+Every run is a fresh interpreter, so module imports are never cached.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+import pytasky
+imported = time.perf_counter()
+result = {{"import_ms": (imported - start) * 1000, "first_paint_ms": None}}
+try:
+    root = pytasky.tk.Tk()
+except pytasky.tk.TclError as e:
+    result["error"] = str(e)
+else:
+    app = pytasky.PyTaskyApp(root)
+    root.update()
+    result["first_paint_ms"] = (time.perf_counter() - start) * 1000
+    app.on_close()
+print(json.dumps(result))
+"""
+
+
+def run_once(env):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(src=SRC)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db", help="database to open (default: PYTASKY_DB)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.db:
+        env["PYTASKY_DB"] = os.path.abspath(args.db)
+    runs = [run_once(env) for _ in range(args.runs)]
+    result = {
+        "runs": args.runs,
+        "import_ms_median": round(statistics.median(r["import_ms"] for r in runs), 1),
+        "first_paint_ms_median": None,
+    }
+    paints = [r["first_paint_ms"] for r in runs if r["first_paint_ms"] is not None]
+    if paints:
+        result["first_paint_ms_median"] = round(statistics.median(paints), 1)
+    else:
+        result["error"] = runs[-1].get("error")
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
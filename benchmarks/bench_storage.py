@@ -0,0 +1,147 @@
+"""Compare SQLite storage profiles: commit latency and concurrent throughput.
+
+Run from the repository root:
+
+    python benchmarks/bench_storage.py --commits 500 --seconds 3
+
+Each profile gets a fresh database file. Writers and readers run in separate
+processes, like several PyTasky instances sharing one database.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault(
+    "PYTASKY_DB", os.path.join(tempfile.gettempdir(), "pytasky_bench_storage.db")
+)
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from models import (  # noqa: E402
+    STORAGE_PROFILES,
+    Base,
+    Task,
+    create_storage_engine,
+    done_tasks_query,
+    upgrade_schema,
+)
+
+
+def new_task(i):
+    now = datetime.now()
+    return Task(
+        title=f"Task {i}",
+        tag="bench",
+        status="done" if i % 3 else "todo",
+        created_at=now,
+        completed_at=now if i % 3 else None,
+        last_updated=now,
+    )
+
+
+def measure_commits(path, profile, commits):
+    engine = create_storage_engine(path, profile)
+    Session = sessionmaker(bind=engine)
+    latencies = []
+    for i in range(commits):
+        start = time.perf_counter()
+        session = Session()
+        session.add(new_task(i))
+        session.commit()
+        session.close()
+        latencies.append((time.perf_counter() - start) * 1000)
+    engine.dispose()
+    latencies.sort()
+    return {
+        "commit_ms_median": round(statistics.median(latencies), 3),
+        "commit_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+    }
+
+
+def worker(path, profile, role, seconds, results):
+    engine = create_storage_engine(path, profile)
+    Session = sessionmaker(bind=engine)
+    done = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        session = Session()
+        try:
+            if role == "writer":
+                session.add(new_task(done))
+                session.commit()
+            else:
+                done_tasks_query(session).limit(50).all()
+            done += 1
+        except OperationalError:
+            session.rollback()
+            errors += 1
+        finally:
+            session.close()
+    engine.dispose()
+    results.put((role, done, errors))
+
+
+def measure_concurrency(path, profile, writers, readers, seconds):
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=worker, args=(path, profile, role, seconds, results)
+        )
+        for role in ["writer"] * writers + ["reader"] * readers
+    ]
+    for process in processes:
+        process.start()
+    totals = {"writer": [0, 0], "reader": [0, 0]}
+    for _ in processes:
+        role, done, errors = results.get()
+        totals[role][0] += done
+        totals[role][1] += errors
+    for process in processes:
+        process.join()
+    return {
+        "writes_per_s": round(totals["writer"][0] / seconds, 1),
+        "reads_per_s": round(totals["reader"][0] / seconds, 1),
+        "lock_errors": totals["writer"][1] + totals["reader"][1],
+    }
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "tasks.db")
+        engine = create_storage_engine(path, profile)
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        engine.dispose()
+        result = {"profile": profile}
+        result.update(measure_commits(path, profile, args.commits))
+        result.update(
+            measure_concurrency(path, profile, args.writers, args.readers, args.seconds)
+        )
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["default", "local"])
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        if profile not in STORAGE_PROFILES:
+            parser.error(f"unknown profile {profile!r}")
+        print(json.dumps(run_profile(profile, args)))
+
+
+if __name__ == "__main__":
+    main()
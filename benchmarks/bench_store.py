@@ -0,0 +1,129 @@
+"""Time refreshing the active task list after an edit, with and without the cache.
+
+Run from the repository root:
+
+    python benchmarks/bench_store.py --rows 10000 100000
+
+"reload" is a full re-query of the list from SQLite after each edit, "cached"
+rebuilds the list from the TaskStore cache and "patch" applies only the edited
+row to the list model, which is what the desktop app does.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault(
+    "PYTASKY_DB", os.path.join(tempfile.gettempdir(), "pytasky_bench_store.db")
+)
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from models import (  # noqa: E402
+    ACTIVE_STATUSES,
+    STATUSES,
+    Base,
+    Task,
+    active_tasks_query,
+    create_storage_engine,
+)
+from listview import (  # noqa: E402
+    TaskListModel,
+    active_sort_key,
+    format_active_row,
+    row_from_task,
+)
+from store import TaskStore  # noqa: E402
+
+
+def populate(session, rows):
+    rng = random.Random(42)
+    now = datetime.now()
+    for start in range(0, rows, 5000):
+        session.execute(
+            insert(Task),
+            [
+                {
+                    "title": f"Task {i}",
+                    "notes": "benchmark",
+                    "tag": rng.choice(["work", "home", ""]),
+                    "status": rng.choice(STATUSES),
+                    "created_at": now,
+                    "last_updated": now,
+                }
+                for i in range(start, min(rows, start + 5000))
+            ],
+        )
+    session.commit()
+
+
+def time_refreshes(store, model, refresh, edits, rng):
+    active = [row.id for row in store.rows(ACTIVE_STATUSES)]
+    timings = []
+    for _ in range(edits):
+        row = store.update(rng.choice(active), title=f"Edited {rng.random():.6f}")
+        start = time.perf_counter()
+        refresh(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run(rows, edits):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_storage_engine(os.path.join(tmpdir, "tasks.db"))
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        session = factory()
+        populate(session, rows)
+        session.close()
+
+        store = TaskStore(factory)
+        model = TaskListModel(format_active_row, active_sort_key)
+
+        def reload(row):
+            session = factory()
+            tasks = active_tasks_query(session).all()
+            model.load([row_from_task(task) for task in tasks])
+            session.close()
+
+        def cached(row):
+            model.load(store.rows(ACTIVE_STATUSES))
+
+        def patch(row):
+            model.upsert(row)
+
+        results = []
+        for name, refresh in (("reload", reload), ("cached", cached), ("patch", patch)):
+            model.load(store.rows(ACTIVE_STATUSES))
+            timings = time_refreshes(store, model, refresh, edits, random.Random(7))
+            results.append(
+                {
+                    "rows": rows,
+                    "refresh": name,
+                    "refresh_ms_median": round(statistics.median(timings), 3),
+                    "refresh_ms_max": round(max(timings), 3),
+                }
+            )
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--edits", type=int, default=20)
+    args = parser.parse_args()
+    for rows in args.rows:
+        for result in run(rows, args.edits):
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
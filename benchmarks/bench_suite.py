@@ -0,0 +1,299 @@
+"""Run the benchmark suite against synthetic databases and check thresholds.
+
+Run from the repository root:
+
+    python benchmarks/bench_suite.py --sizes 1k 100k [--output results.json]
+    python benchmarks/bench_suite.py --sizes 1k --baseline results-0.1.11.json
+
+Databases come from generate_db.py and are cached in the temp directory, so
+only the first run at a size pays for generating it. Everything runs against
+the data layer the window uses (TaskStore and the list models), so no display
+is needed; with one (e.g. under xvfb-run) startup also measures first paint.
+
+Each result prints as one JSON line with the median and p95 in milliseconds.
+--output writes all of them with the release, Python and SQLite versions, in
+the format --baseline reads back. The run fails (exit status 1) when a median
+exceeds its limit in thresholds.json, or is more than --tolerance times the
+baseline's median.
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, "..", "src")
+sys.path.insert(0, SRC)
+os.environ.setdefault(
+    "PYTASKY_DB", os.path.join(tempfile.gettempdir(), "pytasky_bench_suite.db")
+)
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from generate_db import END, SIZES, cached_database, parse_size  # noqa: E402
+from listview import (  # noqa: E402
+    PagedTaskListModel,
+    TaskListModel,
+    active_sort_key,
+    done_sort_key,
+    format_active_row,
+    format_done_row,
+)
+from models import ACTIVE_STATUSES, DONE_PAGE_SIZE, create_storage_engine  # noqa: E402
+from store import TaskStore  # noqa: E402
+from worker import Job  # noqa: E402
+
+THRESHOLDS = os.path.join(HERE, "thresholds.json")
+
+SEARCH_TERMS = ["login", "release notes", "dashboard", "vendor"]
+
+# Differences below this are noise, whatever the ratio
+NOISE_MS = 2.0
+
+# Loads the data the window shows at startup, in a fresh interpreter
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+from listview import TaskListModel, active_sort_key, format_active_row
+from models import ACTIVE_STATUSES, DONE_PAGE_SIZE
+from store import TaskStore
+store = TaskStore()
+store.sync()
+model = TaskListModel(format_active_row, active_sort_key)
+model.load(store.rows(ACTIVE_STATUSES))
+[model.text(i) for i in range(min(len(model), 40))]
+store.done_page(limit=DONE_PAGE_SIZE)
+print(json.dumps({{"ms": (time.perf_counter() - start) * 1000}}))
+"""
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(name, tasks, samples, **extra):
+    ordered = sorted(samples)
+    result = {
+        "bench": name,
+        "tasks": tasks,
+        "runs": len(samples),
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+    }
+    result.update(extra)
+    return result
+
+
+def bench_startup(path, runs):
+    env = dict(os.environ, PYTASKY_DB=path, PYTASKY_SERVER="")
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE.format(src=SRC)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1])["ms"])
+    return samples
+
+
+def bench_first_paint(path, runs):
+    """First paint samples of the real window, or None without a display"""
+    from bench_startup import run_once
+
+    env = dict(os.environ, PYTASKY_DB=path, PYTASKY_SERVER="")
+    samples = []
+    for _ in range(runs):
+        result = run_once(env)
+        if result["first_paint_ms"] is None:
+            return None
+        samples.append(result["first_paint_ms"])
+    return samples
+
+
+def run_size(tasks, runs, seed):
+    source = cached_database(tasks, seed)
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Edits and exports write, so they get a copy of the cached database
+        path = os.path.join(tmpdir, "tasks.db")
+        shutil.copyfile(source, path)
+        engine = create_storage_engine(path)
+        factory = sessionmaker(bind=engine)
+
+        results.append(summarize("startup", tasks, bench_startup(path, runs)))
+        if os.environ.get("DISPLAY"):
+            paints = bench_first_paint(path, runs)
+            if paints:
+                results.append(summarize("first_paint", tasks, paints))
+
+        model = TaskListModel(format_active_row, active_sort_key)
+
+        def cold_refresh():
+            model.load(TaskStore(factory).rows(ACTIVE_STATUSES))
+
+        results.append(
+            summarize(
+                "list_refresh_cold", tasks, timed(cold_refresh, runs), rows=len(model)
+            )
+        )
+
+        store = TaskStore(factory)
+        store.sync()
+        model.load(store.rows(ACTIVE_STATUSES))
+        results.append(
+            summarize(
+                "list_refresh_cached",
+                tasks,
+                timed(lambda: model.load(store.rows(ACTIVE_STATUSES)), runs),
+            )
+        )
+
+        done_model = PagedTaskListModel(
+            format_done_row,
+            done_sort_key,
+            lambda after, limit: store.done_page(
+                after and (after.completed_at, after.id), limit
+            ),
+            reverse=True,
+            page_size=DONE_PAGE_SIZE,
+        )
+        results.append(
+            summarize("done_first_page", tasks, timed(done_model.reload, runs))
+        )
+
+        rng = random.Random(seed)
+        active_ids = [row.id for row in store.rows(ACTIVE_STATUSES)]
+
+        def edit_save():
+            row = store.update(rng.choice(active_ids), title=f"Edited {rng.random()}")
+            model.upsert(row)
+
+        results.append(summarize("edit_save", tasks, timed(edit_save, max(runs, 20))))
+
+        for term in SEARCH_TERMS:
+            store.search(term)  # warm the FTS pages once, as typing would
+        samples = []
+        for _ in range(runs):
+            for term in SEARCH_TERMS:
+                samples += timed(lambda: store.search(term), 1)
+        results.append(summarize("search", tasks, samples))
+
+        # A quarter's report, as exported from the Reports tab
+        start, end = END - timedelta(days=90), END
+        for format_type in ("json", "csv"):
+            filename = os.path.join(tmpdir, f"report.{format_type}")
+            counts = []
+            samples = timed(
+                lambda: counts.append(
+                    store.export(Job(queue.Queue()), filename, format_type, start, end)
+                ),
+                runs,
+            )
+            results.append(
+                summarize(
+                    f"export_{format_type}",
+                    tasks,
+                    samples,
+                    rows=counts[-1],
+                    bytes=os.path.getsize(filename),
+                )
+            )
+        engine.dispose()
+    return results
+
+
+def size_label(tasks):
+    """Key of a database size in thresholds.json: "1k", "100k", "1m" or the count"""
+    labels = {size: label for label, size in SIZES.items()}
+    return labels.get(tasks, str(tasks))
+
+
+def check(results, thresholds, baseline, tolerance):
+    """Regression messages for results over their limit or their baseline"""
+    failures = []
+    previous = {(r["bench"], r["tasks"]): r for r in baseline or ()}
+    for result in results:
+        name, median = result["bench"], result["median_ms"]
+        limit = thresholds.get(name, {}).get(size_label(result["tasks"]))
+        if limit is not None and median > limit:
+            failures.append(
+                f"{name} at {result['tasks']} tasks: {median} ms > limit {limit} ms"
+            )
+        before = previous.get((name, result["tasks"]))
+        if (
+            before is not None
+            and median > before["median_ms"] * tolerance
+            and median - before["median_ms"] > NOISE_MS
+        ):
+            failures.append(
+                f"{name} at {result['tasks']} tasks: {median} ms"
+                f" > {tolerance} x baseline {before['median_ms']} ms"
+            )
+    return failures
+
+
+def environment():
+    with open(os.path.join(SRC, "version.txt")) as f:
+        version = f.read().strip()
+    return {
+        "version": version,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[1000, 100000])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write all results to this JSON file")
+    parser.add_argument("--thresholds", default=THRESHOLDS)
+    parser.add_argument("--baseline", help="results JSON of an earlier release")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args()
+
+    results = []
+    for tasks in args.sizes:
+        for result in run_size(tasks, args.runs, args.seed):
+            print(json.dumps(result), flush=True)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dict(environment(), results=results), f, indent=2)
+
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    failures = check(results, thresholds, baseline, args.tolerance)
+    for failure in failures:
+        print(json.dumps({"regression": failure}))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""Time tag-filtered views and per-tag counts through the tag index.
+
+Run from the repository root:
+
+    python benchmarks/bench_tags.py --rows 100000
+
+Each tag lookup is compared with what the free-text tag column allowed
+before: a LIKE scan over every task for filters, and splitting every task's
+tag text in Python for counts. "tag_members" is how the active list is
+filtered: the ids of a tag's tasks, read from the index alone, are matched
+against the cached rows.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault(
+    "PYTASKY_DB", os.path.join(tempfile.gettempdir(), "pytasky_bench_tags.db")
+)
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from models import (  # noqa: E402
+    ACTIVE_STATUSES,
+    Base,
+    Task,
+    create_storage_engine,
+    done_tasks_page,
+    link_tags_after,
+    parse_tags,
+    report_query,
+    tag_counts,
+    tag_members,
+    tagged,
+    upgrade_schema,
+)
+
+STATUSES = ["todo", "in-progress", "done", "done", "cancelled"]
+
+
+def populate(session, rows):
+    start = datetime(2024, 1, 1, 9)
+    for offset in range(0, rows, 10000):
+        batch = []
+        for i in range(offset, min(rows, offset + 10000)):
+            created = start + timedelta(minutes=i)
+            status = STATUSES[i % len(STATUSES)]
+            batch.append(
+                {
+                    "title": f"Ticket {i}",
+                    "tag": f"team-{i % 50}, area-{i % 7}"
+                    + (", rare" if i % 997 == 0 else ""),
+                    "status": status,
+                    "created_at": created,
+                    "completed_at": (
+                        created + timedelta(hours=5) if status == "done" else None
+                    ),
+                    "last_updated": created,
+                }
+            )
+        session.execute(insert(Task), batch)
+    link_tags_after(session, 0)
+    session.commit()
+
+
+def timed(func, repeat=5):
+    """Best of ``repeat`` runs, in milliseconds, and the last result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 2), result
+
+
+def like(name):
+    return Task.tag.like(f"%{name}%")
+
+
+def split_counts(session):
+    counts = Counter()
+    for (text,) in session.query(Task.tag).filter(Task.status.in_(ACTIVE_STATUSES)):
+        counts.update(parse_tags(text))
+    return counts.most_common()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_storage_engine(os.path.join(tmpdir, "tasks.db"))
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        session = sessionmaker(bind=engine)()
+        populate(session, args.rows)
+        start, end = datetime(2000, 1, 1), datetime(2100, 1, 1)
+
+        cases = {
+            "active_ids_rare": (
+                lambda f: session.query(Task.id)
+                .filter(Task.status.in_(ACTIVE_STATUSES), f("rare"))
+                .all()
+            ),
+            "report_count_rare": (
+                lambda f: report_query(session, start, end).filter(f("rare")).count()
+            ),
+        }
+        for name, query in cases.items():
+            index_ms, rows = timed(lambda: query(tagged))
+            like_ms, _ = timed(lambda: query(like))
+            print(
+                json.dumps(
+                    {
+                        "case": name,
+                        "rows": args.rows,
+                        "matches": rows if isinstance(rows, int) else len(rows),
+                        "index_ms": index_ms,
+                        "like_ms": like_ms,
+                    }
+                )
+            )
+
+        for tag in ("rare", "area-3"):
+            index_ms, ids = timed(
+                lambda: session.execute(tag_members(tag)).scalars().all()
+            )
+            like_ms, _ = timed(lambda: session.query(Task.id).filter(like(tag)).all())
+            print(
+                json.dumps(
+                    {
+                        "case": f"tag_members_{tag}",
+                        "rows": args.rows,
+                        "matches": len(ids),
+                        "index_ms": index_ms,
+                        "like_ms": like_ms,
+                    }
+                )
+            )
+
+        index_ms, page = timed(lambda: done_tasks_page(session, tag="rare"))
+        print(
+            json.dumps(
+                {
+                    "case": "done_page_rare",
+                    "rows": args.rows,
+                    "matches": len(page),
+                    "index_ms": index_ms,
+                }
+            )
+        )
+
+        index_ms, counts = timed(lambda: tag_counts(session, ACTIVE_STATUSES))
+        split_ms, _ = timed(lambda: split_counts(session))
+        print(
+            json.dumps(
+                {
+                    "case": "tag_counts_active",
+                    "rows": args.rows,
+                    "tags": len(counts),
+                    "index_ms": index_ms,
+                    "split_ms": split_ms,
+                }
+            )
+        )
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Build a synthetic PyTasky database for benchmarks.
+
+Run from the repository root:
+
+    python benchmarks/generate_db.py --tasks 100k --out /tmp/pytasky_100k.db
+
+The same --tasks and --seed always give the same tasks, so timings from
+different releases are measured against the same data. The distributions
+follow a long-lived task list:
+
+- created_at spreads over --days days before a fixed end date, mostly on
+  weekdays during working hours
+- the older a task, the likelier it is done or cancelled; cycle times are
+  log-normal around a couple of days
+- tags follow a Zipf-like curve over a few dozen names, with up to three
+  per task; titles and notes are drawn from a small vocabulary
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault(
+    "PYTASKY_DB", os.path.join(tempfile.gettempdir(), "pytasky_bench_generate.db")
+)
+
+from sqlalchemy import func, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from models import (  # noqa: E402
+    SCHEMA_VERSION,
+    Base,
+    Task,
+    create_storage_engine,
+    link_tags_after,
+    upgrade_schema,
+)
+
+SIZES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+
+# Fixed so generated timestamps don't depend on when the generator runs
+END = datetime(2025, 6, 30, 18, 0)
+
+ACTIVE_WEIGHTS = {
+    "todo": 45,
+    "in-progress": 25,
+    "blocked": 10,
+    "testing": 10,
+    "verify": 10,
+}
+
+TAGS = [
+    "backend",
+    "frontend",
+    "docs",
+    "bug",
+    "ops",
+    "design",
+    "testing",
+    "security",
+    "performance",
+    "mobile",
+    "billing",
+    "onboarding",
+    "search",
+    "reports",
+    "api",
+    "infra",
+    "customer",
+    "release",
+    "research",
+    "hiring",
+    "finance",
+    "legal",
+    "marketing",
+    "support",
+    "data",
+    "ux",
+    "accessibility",
+    "i18n",
+    "analytics",
+    "cleanup",
+]
+TAG_WEIGHTS = [1 / (rank + 1) for rank in range(len(TAGS))]
+
+VERBS = [
+    "Fix",
+    "Add",
+    "Update",
+    "Review",
+    "Write",
+    "Refactor",
+    "Investigate",
+    "Remove",
+    "Document",
+    "Test",
+    "Migrate",
+    "Plan",
+]
+NOUNS = [
+    "login timeout",
+    "export dialog",
+    "search index",
+    "release notes",
+    "billing page",
+    "sync server",
+    "onboarding email",
+    "API pagination",
+    "report totals",
+    "tag filter",
+    "crash on startup",
+    "slow dashboard",
+    "password reset",
+    "invoice PDF",
+    "dark mode",
+    "backup job",
+]
+NOTES = [
+    "Reported by support",
+    "Customer is waiting on this",
+    "See the thread from last week",
+    "Needs a design review first",
+    "Blocked on the vendor",
+    "Follow up after the release",
+]
+
+
+def parse_size(value):
+    return SIZES.get(value.lower()) or int(value)
+
+
+def task_record(rng, index, days):
+    # Working hours on weekdays, so day and hour aren't uniform
+    while True:
+        created = END - timedelta(days=rng.random() * days)
+        if created.weekday() < 5 or rng.random() < 0.15:
+            break
+    created = min(
+        END,
+        created.replace(
+            hour=int(min(23, max(0, rng.gauss(13, 3)))),
+            minute=rng.randrange(60),
+            second=rng.randrange(60),
+            microsecond=0,
+        ),
+    )
+    age_days = (END - created).total_seconds() / 86400
+    completed = None
+    if rng.random() < min(0.97, 0.2 + age_days / 60):
+        status = "done" if rng.random() < 0.87 else "cancelled"
+        cycle_s = int(rng.lognormvariate(math.log(40 * 3600), 1.2))
+        completed = min(END, created + timedelta(seconds=cycle_s))
+        updated = completed
+    else:
+        status = rng.choices(list(ACTIVE_WEIGHTS), list(ACTIVE_WEIGHTS.values()))[0]
+        idle_s = int((END - created).total_seconds() * rng.random())
+        updated = created + timedelta(seconds=idle_s)
+    tag_count = rng.choices([0, 1, 2, 3], [20, 55, 20, 5])[0]
+    tags = []
+    for tag in rng.choices(TAGS, TAG_WEIGHTS, k=tag_count):
+        if tag not in tags:
+            tags.append(tag)
+    return {
+        "title": f"{rng.choice(VERBS)} {rng.choice(NOUNS)} #{index}",
+        "notes": rng.choice(NOTES) if rng.random() < 0.4 else None,
+        "tag": ", ".join(tags) or None,
+        "status": status,
+        "created_at": created,
+        "completed_at": completed,
+        "last_updated": updated,
+    }
+
+
+def generate(path, tasks, seed=1, days=730, batch_size=10000):
+    """Write a database of ``tasks`` synthetic tasks to path, replacing it"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = create_storage_engine(path)
+    Base.metadata.create_all(engine)
+    upgrade_schema(engine)
+    session = sessionmaker(bind=engine)()
+    rng = random.Random(seed)
+    try:
+        for start in range(0, tasks, batch_size):
+            last_id = session.query(func.max(Task.id)).scalar() or 0
+            batch = [
+                task_record(rng, index, days)
+                for index in range(start, min(tasks, start + batch_size))
+            ]
+            # render_nulls keeps rows with different NULL columns in one executemany
+            session.execute(insert(Task).execution_options(render_nulls=True), batch)
+            link_tags_after(session, last_id)
+            session.commit()
+        session.connection().exec_driver_sql("ANALYZE")
+        session.commit()
+    finally:
+        session.close()
+        engine.dispose()
+    return path
+
+
+def cached_database(tasks, seed=1, directory=None):
+    """Path of a generated database, built on first use and reused afterwards.
+
+    The file name carries the schema version, so a schema change regenerates it.
+    """
+    directory = directory or os.path.join(tempfile.gettempdir(), "pytasky-bench")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"tasks-{tasks}-seed{seed}-v{SCHEMA_VERSION}.db")
+    if not os.path.exists(path):
+        generate(path + ".tmp", tasks, seed)
+        os.replace(path + ".tmp", path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + ".tmp" + suffix):
+                os.remove(path + ".tmp" + suffix)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=parse_size, default="100k")
+    parser.add_argument("--out", required=True, help="database file to write")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--days", type=int, default=730)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate(args.out, args.tasks, args.seed, args.days)
+    print(
+        json.dumps(
+            {
+                "tasks": args.tasks,
+                "seed": args.seed,
+                "path": args.out,
+                "bytes": os.path.getsize(args.out),
+                "generate_s": round(time.perf_counter() - start, 2),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
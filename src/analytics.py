@@ -0,0 +1,151 @@
+from datetime import timedelta
+from sqlalchemy import func
+from models import (
+    ALL_TASKS_TAG,
+    CYCLE_TIME_BUCKETS,
+    CycleTimeRollup,
+    DailyRollup,
+    PomodoroSession,
+    Task,
+)
+
+
+def _day(value):
+    return value.strftime("%Y-%m-%d")
+
+
+def record_pomodoro(session, task_id, started_at, ended_at):
+    session.add(
+        PomodoroSession(
+            task_id=task_id,
+            started_at=started_at,
+            ended_at=ended_at,
+            seconds=int((ended_at - started_at).total_seconds()),
+        )
+    )
+
+
+def completed_per_day(session, start, end, status="done"):
+    """[(day, tag, count)] of transitions into status, read from the rollups;
+    a task with several tags counts under each"""
+    return (
+        session.query(DailyRollup.day, DailyRollup.tag, DailyRollup.transitions)
+        .filter(
+            DailyRollup.day.between(_day(start), _day(end)),
+            DailyRollup.status == status,
+            DailyRollup.tag != ALL_TASKS_TAG,
+        )
+        .order_by(DailyRollup.day, DailyRollup.tag)
+        .all()
+    )
+
+
+def estimate_median(histogram):
+    """Median seconds from {bucket: count}, interpolated within its bucket"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = total / 2
+    seen = 0
+    for bucket in sorted(histogram):
+        count = histogram[bucket]
+        if seen + count >= target:
+            lower = CYCLE_TIME_BUCKETS[bucket - 1] if bucket else 0
+            if bucket < len(CYCLE_TIME_BUCKETS):
+                upper = CYCLE_TIME_BUCKETS[bucket]
+            else:
+                upper = lower * 1.5
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+
+
+def tag_summary(session, start, end):
+    """Per-tag done/cancelled counts and cycle times over whole days start..end.
+
+    Returns ({tag: stats}, overall median cycle seconds). A task with several
+    tags counts under each, but once in the overall median.
+    """
+    day_range = DailyRollup.day.between(_day(start), _day(end))
+    summary = {}
+    for tag, status, transitions, cycle_seconds in (
+        session.query(
+            DailyRollup.tag,
+            DailyRollup.status,
+            func.sum(DailyRollup.transitions),
+            func.sum(DailyRollup.cycle_seconds),
+        )
+        .filter(day_range, DailyRollup.status.in_(["done", "cancelled"]))
+        .group_by(DailyRollup.tag, DailyRollup.status)
+    ):
+        stats = summary.setdefault(
+            tag,
+            {"done": 0, "cancelled": 0, "mean_cycle_s": None, "median_cycle_s": None},
+        )
+        stats[status] = transitions
+        if status == "done" and transitions:
+            stats["mean_cycle_s"] = cycle_seconds / transitions
+
+    summary.pop(ALL_TASKS_TAG, None)
+
+    histograms = {}
+    for tag, bucket, tasks in (
+        session.query(
+            CycleTimeRollup.tag, CycleTimeRollup.bucket, func.sum(CycleTimeRollup.tasks)
+        )
+        .filter(CycleTimeRollup.day.between(_day(start), _day(end)))
+        .group_by(CycleTimeRollup.tag, CycleTimeRollup.bucket)
+    ):
+        histograms.setdefault(tag, {})[bucket] = tasks
+    for tag, histogram in histograms.items():
+        if tag in summary:
+            summary[tag]["median_cycle_s"] = estimate_median(histogram)
+    return summary, estimate_median(histograms.get(ALL_TASKS_TAG, {}))
+
+
+def status_totals(session, start, end):
+    """{status: tasks} moved into each status over whole days start..end"""
+    return dict(
+        session.query(DailyRollup.status, func.sum(DailyRollup.transitions))
+        .filter(
+            DailyRollup.day.between(_day(start), _day(end)),
+            DailyRollup.tag == ALL_TASKS_TAG,
+        )
+        .group_by(DailyRollup.status)
+    )
+
+
+def _ended_within(start, end):
+    return PomodoroSession.ended_at >= start, PomodoroSession.ended_at < (
+        end + timedelta(days=1)
+    )
+
+
+def pomodoro_summary(session, start, end):
+    pomodoros, seconds, tasks = (
+        session.query(
+            func.count(PomodoroSession.id),
+            func.coalesce(func.sum(PomodoroSession.seconds), 0),
+            func.count(PomodoroSession.task_id.distinct()),
+        )
+        .filter(*_ended_within(start, end))
+        .one()
+    )
+    return {
+        "pomodoros": pomodoros,
+        "focus_hours": seconds / 3600,
+        "tasks": tasks,
+        "per_task": pomodoros / tasks if tasks else None,
+    }
+
+
+def pomodoros_per_task(session, start, end, limit=20):
+    """[(task_id, title, pomodoros)] for the tasks with the most pomodoros"""
+    return (
+        session.query(Task.id, Task.title, func.count(PomodoroSession.id))
+        .join(PomodoroSession, PomodoroSession.task_id == Task.id)
+        .filter(*_ended_within(start, end))
+        .group_by(Task.id)
+        .order_by(func.count(PomodoroSession.id).desc())
+        .limit(limit)
+        .all()
+    )
@@ -0,0 +1,251 @@
+"""Pre-scaled variants of the logo and icon, so startup never decodes the originals.
+
+    python src/assets.py --out build/assets
+
+renders every variant into a directory that the PyInstaller build bundles.
+Running from source, the app renders them in the background on first launch
+into a cache directory next to the database instead, and falls back to the
+original image until they exist.
+
+Variant file names carry a digest of the original, so editing logo.png or
+icon.png makes the old variants unreachable rather than stale. Only the
+standard library is used: 8-bit RGB/RGBA PNGs are decoded, box-filtered in
+premultiplied alpha and encoded here.
+"""
+
+import argparse
+import hashlib
+import os
+import struct
+import zlib
+from itertools import accumulate
+from operator import mul
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# The About tab shows the logo at a fifth of the window width
+LOGO_WIDTHS = (160, 240, 320, 480)
+ICON_SIZES = (16, 32, 64, 128)
+
+ASSETS = {"logo.png": LOGO_WIDTHS, "icon.png": ICON_SIZES}
+
+# path -> (mtime_ns, size, digest), so each original is hashed once per process
+_digests = {}
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def _unfilter(kind, line, prev, bpp):
+    if kind == 0:
+        return line
+    if kind == 2:
+        return bytearray((x + b) & 255 for x, b in zip(line, prev))
+    if kind == 1:
+        for i in range(bpp, len(line)):
+            line[i] = (line[i] + line[i - bpp]) & 255
+    elif kind == 3:
+        for i in range(len(line)):
+            left = line[i - bpp] if i >= bpp else 0
+            line[i] = (line[i] + ((left + prev[i]) >> 1)) & 255
+    elif kind == 4:
+        for i in range(len(line)):
+            if i >= bpp:
+                left, corner = line[i - bpp], prev[i - bpp]
+            else:
+                left = corner = 0
+            line[i] = (line[i] + _paeth(left, prev[i], corner)) & 255
+    else:
+        raise ValueError(f"bad PNG filter type {kind}")
+    return line
+
+
+def read_png(path):
+    """(width, height, rows) of an 8-bit, non-interlaced RGB or RGBA PNG, each
+    row an RGBA bytearray"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError(f"{path} is not a PNG file")
+    header, idat, pos = None, [], 8
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos : pos + 8])
+        chunk = data[pos + 8 : pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        elif kind == b"IEND":
+            break
+    width, height, depth, color, _, _, interlace = header
+    if depth != 8 or color not in (2, 6) or interlace:
+        raise ValueError(f"{path}: only 8-bit non-interlaced RGB(A) is supported")
+    bpp = 4 if color == 6 else 3
+    stride = width * bpp
+    raw = zlib.decompress(b"".join(idat))
+    rows, prev = [], bytearray(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        line = bytearray(raw[start + 1 : start + 1 + stride])
+        prev = _unfilter(raw[start], line, prev, bpp)
+        rows.append(prev)
+    if bpp == 3:
+        for y, line in enumerate(rows):
+            rgba = bytearray(width * 4)
+            for channel in range(3):
+                rgba[channel::4] = line[channel::3]
+            rgba[3::4] = b"\xff" * width
+            rows[y] = rgba
+    return width, height, rows
+
+
+def write_png(path, width, height, rows):
+    """Write RGBA bytearray rows as an 8-bit RGBA PNG"""
+
+    def chunk(kind, body):
+        return (
+            struct.pack(">I", len(body))
+            + kind
+            + body
+            + struct.pack(">I", zlib.crc32(kind + body))
+        )
+
+    raw = b"".join(b"\x00" + bytes(line) for line in rows)
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE)
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 9)))
+        f.write(chunk(b"IEND", b""))
+
+
+def _spans(source, target):
+    """[start, end) of the source pixels averaged into each target pixel"""
+    return [
+        (
+            i * source // target,
+            max(i * source // target + 1, (i + 1) * source // target),
+        )
+        for i in range(target)
+    ]
+
+
+def scale(width, height, rows, new_width, new_height):
+    """Downscale RGBA rows with a box filter, averaging in premultiplied alpha
+    so transparent pixels don't darken the edges"""
+    xs, ys = _spans(width, new_width), _spans(height, new_height)
+    # Horizontal pass: per source row, the sums of each channel over each span
+    summed = []
+    for line in rows:
+        alpha = line[3::4]
+        channels = [map(mul, line[c::4], alpha) for c in range(3)] + [alpha]
+        sums = []
+        for values in channels:
+            prefix = [0, *accumulate(values)]
+            sums.append([prefix[end] - prefix[start] for start, end in xs])
+        summed.append(sums)
+    # Vertical pass: add up the row sums of each span, then normalize
+    out = []
+    for start, end in ys:
+        totals = [
+            list(map(sum, zip(*(summed[y][c] for y in range(start, end)))))
+            for c in range(4)
+        ]
+        line = bytearray(new_width * 4)
+        for x, (x0, x1) in enumerate(xs):
+            a = totals[3][x]
+            if not a:
+                continue
+            area = (x1 - x0) * (end - start)
+            line[4 * x] = min(255, round(totals[0][x] / a))
+            line[4 * x + 1] = min(255, round(totals[1][x] / a))
+            line[4 * x + 2] = min(255, round(totals[2][x] / a))
+            line[4 * x + 3] = round(a / area)
+        out.append(line)
+    return out
+
+
+def source_digest(path):
+    stat = os.stat(path)
+    cached = _digests.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:10]
+    _digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def variant_name(source, width, digest=None):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return f"{stem}-{digest or source_digest(source)}-{width}.png"
+
+
+def cache_dir(database_path):
+    """Where variants rendered at runtime are kept: next to the database"""
+    return os.path.join(os.path.dirname(os.path.abspath(database_path)), "assets")
+
+
+def render_variants(source, widths, out_dir, check=None):
+    """Write a variant of source for each width that doesn't exist yet;
+    returns the paths of all of them. ``check()`` is called before each one,
+    so a caller can stop the work by raising from it"""
+    os.makedirs(out_dir, exist_ok=True)
+    digest = source_digest(source)
+    paths = [os.path.join(out_dir, variant_name(source, w, digest)) for w in widths]
+    missing = [(w, p) for w, p in zip(widths, paths) if not os.path.exists(p)]
+    if missing:
+        width, height, rows = read_png(source)
+        for new_width, path in missing:
+            if check:
+                check()
+            new_width = min(new_width, width)
+            new_height = max(1, round(height * new_width / width))
+            scaled = scale(width, height, rows, new_width, new_height)
+            # Written under a temporary name, so readers never see half a file
+            write_png(path + ".tmp", new_width, new_height, scaled)
+            os.replace(path + ".tmp", path)
+    return paths
+
+
+def find_variant(source, width, directories):
+    """Path of the smallest variant at least ``width`` wide (else the widest)
+    found in the directories, or None when none was rendered"""
+    widths = ASSETS[os.path.basename(source)]
+    wanted = [w for w in widths if w >= width] or [max(widths)]
+    digest = source_digest(source)
+    for directory in directories:
+        for candidate in sorted(wanted):
+            path = os.path.join(directory, variant_name(source, candidate, digest))
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def render_all(source_dir, out_dir, check=None):
+    """Render the variants of every asset found in source_dir"""
+    paths = []
+    for name, widths in ASSETS.items():
+        source = os.path.join(source_dir, name)
+        if os.path.exists(source):
+            paths += render_variants(source, widths, out_dir, check)
+    return paths
+
+
+def main():
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default=root, help="directory of the originals")
+    parser.add_argument("--out", required=True, help="directory to write to")
+    args = parser.parse_args()
+    for path in render_all(args.source, args.out):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
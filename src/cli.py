@@ -0,0 +1,327 @@
+"""Headless PyTasky commands: python src/pytasky.py <command> [options]"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from models import (
+    ACTIVE_STATUSES,
+    CHANGES_PAGE_SIZE,
+    STATUSES,
+    Task,
+    active_tasks_query,
+    done_tasks_query,
+    session_scope,
+    tagged,
+)
+from importer import IMPORT_FORMATS, import_file
+from instrument import enable_from_environment, tracer
+from listview import format_active_row, format_done_row, row_from_task
+from recurrence import RecurrenceScheduler
+from reports import (
+    INCREMENTAL_FORMATS,
+    REPORT_FORMATS,
+    export_incremental,
+    export_report,
+)
+from store import TaskStore, encode_change
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError("dates must be in YYYY-MM-DD format")
+
+
+def cmd_add(args):
+    row = TaskStore(cache=False).add(args.title, args.notes, args.tag, args.status)
+    print(row.id)
+    return 0
+
+
+def cmd_list(args):
+    with session_scope() as session:
+        if args.done:
+            query, formatter = done_tasks_query(session), format_done_row
+        else:
+            query, formatter = active_tasks_query(session), format_active_row
+        if args.status:
+            query = query.filter(Task.status.in_(args.status))
+        if args.tag:
+            query = query.filter(tagged(args.tag))
+        if args.limit:
+            query = query.limit(args.limit)
+        for task in query.yield_per(1000):
+            print(formatter(row_from_task(task)))
+    return 0
+
+
+def cmd_update(args):
+    store = TaskStore(cache=False)
+    if len(args.ids) == 1:
+        row = store.update(
+            args.ids[0],
+            title=args.title,
+            notes=args.notes,
+            tag=args.tag,
+            status=args.status,
+        )
+        found = [] if row is None else [row.id]
+    elif args.title is not None or args.notes is not None:
+        print("--title and --notes change one task at a time", file=sys.stderr)
+        return 2
+    else:
+        # One UPDATE for the whole set, in a single transaction
+        found = [row.id for row in store.update_many(args.ids, args.status, args.tag)]
+    missing = sorted(set(args.ids) - set(found))
+    for task_id in missing:
+        print(f"Task {task_id} not found", file=sys.stderr)
+    return 1 if missing else 0
+
+
+def cmd_delete(args):
+    count = TaskStore(cache=False).delete(args.ids)
+    print(f"Deleted {count} tasks")
+    return 0 if count == len(set(args.ids)) else 1
+
+
+def cmd_export(args):
+    with session_scope() as session:
+        count = export_report(
+            session,
+            args.file,
+            args.format,
+            args.start,
+            args.end,
+            args.status,
+            tag=args.tag,
+        )
+    print(f"Exported {count} tasks to {args.file}", file=sys.stderr)
+    return 0
+
+
+def cmd_export_changes(args):
+    with session_scope() as session:
+        part = export_incremental(session, args.target, args.format)
+    if part is None:
+        print("No tasks changed since the last export", file=sys.stderr)
+    else:
+        print(
+            f"Exported {part['rows']} tasks and {len(part['deleted'])} deletions"
+            f" to {os.path.join(args.target, part['file'])}",
+            file=sys.stderr,
+        )
+    return 0
+
+
+def cmd_import(args):
+    start = time.perf_counter()
+    with session_scope() as session:
+        count = import_file(session, args.file, args.format, args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"Imported {count} tasks in {elapsed:.2f}s", file=sys.stderr)
+    return 0
+
+
+def cmd_stats(args):
+    stats = TaskStore(cache=False).stats(args.start, args.end)
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+def cmd_tags(args):
+    for name, count in TaskStore(cache=False).tag_counts(args.status):
+        print(f"{count}\t{name}")
+    return 0
+
+
+def cmd_archive(args):
+    count = TaskStore(cache=False).archive(args.before)
+    print(f"Archived {count} tasks completed before {args.before:%Y-%m-%d}")
+    return 0
+
+
+def cmd_changes(args):
+    for change in TaskStore(cache=False).changes_since(args.since, args.limit):
+        print(json.dumps(encode_change(change)))
+    return 0
+
+
+def cmd_recur_add(args):
+    rule = RecurrenceScheduler().add(
+        args.title, args.rule, args.notes, args.tag, args.status
+    )
+    print(f"{rule.id}\tnext {rule.next_fire_at:%Y-%m-%d %H:%M}")
+    return 0
+
+
+def cmd_recur_list(args):
+    for rule in RecurrenceScheduler().rules():
+        print(
+            f"{rule.id}\t{rule.next_fire_at:%Y-%m-%d %H:%M}\t{rule.rule}\t{rule.title}"
+        )
+    return 0
+
+
+def cmd_recur_delete(args):
+    if not RecurrenceScheduler().remove(args.id):
+        print(f"pytasky: no recurrence {args.id}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_recur_run(args):
+    count = RecurrenceScheduler().tick()
+    print(f"Added {count} recurring tasks")
+    return 0
+
+
+def cmd_serve(args):
+    from server import serve
+
+    print(f"Serving tasks on http://{args.host}:{args.port}", file=sys.stderr)
+    serve(args.host, args.port)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pytasky", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add a task")
+    add.add_argument("title")
+    add.add_argument("--notes")
+    add.add_argument("--tag")
+    add.add_argument("--status", choices=STATUSES, default="todo")
+    add.set_defaults(func=cmd_add)
+
+    list_ = commands.add_parser("list", help="list active (or done) tasks")
+    list_.add_argument("--done", action="store_true", help="list done tasks")
+    list_.add_argument("--status", nargs="+", choices=STATUSES)
+    list_.add_argument("--tag", help="only tasks with this tag")
+    list_.add_argument("--limit", type=int)
+    list_.set_defaults(func=cmd_list)
+
+    update = commands.add_parser("update", help="change fields of tasks")
+    update.add_argument("ids", type=int, nargs="+", metavar="id")
+    update.add_argument("--title")
+    update.add_argument("--notes")
+    update.add_argument("--tag")
+    update.add_argument("--status", choices=STATUSES)
+    update.set_defaults(func=cmd_update)
+
+    delete = commands.add_parser("delete", help="delete tasks")
+    delete.add_argument("ids", type=int, nargs="+", metavar="id")
+    delete.set_defaults(func=cmd_delete)
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    export = commands.add_parser("export", help="export a report")
+    export.add_argument("file")
+    export.add_argument("--format", choices=REPORT_FORMATS, default="json")
+    export.add_argument("--start", type=parse_date, default=today - timedelta(30))
+    export.add_argument("--end", type=parse_date, default=today)
+    export.add_argument("--status", nargs="+", choices=STATUSES)
+    export.add_argument("--tag", help="only tasks with this tag")
+    export.set_defaults(func=cmd_export)
+
+    export_changes = commands.add_parser(
+        "export-changes",
+        help="append tasks changed since the last run to an export directory",
+    )
+    export_changes.add_argument("target", help="directory holding the parts")
+    export_changes.add_argument(
+        "--format", choices=INCREMENTAL_FORMATS, default="ndjson"
+    )
+    export_changes.set_defaults(func=cmd_export_changes)
+
+    stats = commands.add_parser("stats", help="throughput and cycle time stats")
+    stats.add_argument("--start", type=parse_date, default=today - timedelta(30))
+    stats.add_argument("--end", type=parse_date, default=today)
+    stats.set_defaults(func=cmd_stats)
+
+    tags = commands.add_parser("tags", help="count tasks per tag")
+    tags.add_argument("--status", nargs="+", choices=STATUSES)
+    tags.set_defaults(func=cmd_tags)
+
+    archive = commands.add_parser(
+        "archive", help="move old done tasks to the archive table"
+    )
+    archive.add_argument(
+        "--before",
+        type=parse_date,
+        default=today - timedelta(365),
+        help="archive tasks completed before this date (default: a year ago)",
+    )
+    archive.set_defaults(func=cmd_archive)
+
+    import_ = commands.add_parser(
+        "import", help="bulk import tasks from CSV, JSON or NDJSON"
+    )
+    import_.add_argument("file")
+    import_.add_argument(
+        "--format", choices=IMPORT_FORMATS, help="default: from file extension"
+    )
+    import_.add_argument("--batch-size", type=int, default=5000)
+    import_.set_defaults(func=cmd_import)
+
+    changes = commands.add_parser(
+        "changes", help="print change log entries as NDJSON, oldest first"
+    )
+    changes.add_argument(
+        "--since", type=int, default=0, help="sequence number of the last change seen"
+    )
+    changes.add_argument("--limit", type=int, default=CHANGES_PAGE_SIZE)
+    changes.set_defaults(func=cmd_changes)
+
+    recur = commands.add_parser("recur", help="manage recurring tasks")
+    recur_commands = recur.add_subparsers(dest="recur_command", required=True)
+    recur_add = recur_commands.add_parser(
+        "add", help='add a rule, e.g. --rule "weekdays 09:30"'
+    )
+    recur_add.add_argument("title")
+    recur_add.add_argument(
+        "--rule",
+        required=True,
+        help="daily HH:MM | weekdays HH:MM | weekly DAY[,DAY...] HH:MM"
+        " | monthly DAY HH:MM | cron MIN HOUR DOM MON DOW",
+    )
+    recur_add.add_argument("--notes")
+    recur_add.add_argument("--tag")
+    recur_add.add_argument("--status", choices=ACTIVE_STATUSES, default="todo")
+    recur_add.set_defaults(func=cmd_recur_add)
+    recur_list = recur_commands.add_parser("list", help="list rules, soonest first")
+    recur_list.set_defaults(func=cmd_recur_list)
+    recur_delete = recur_commands.add_parser("delete", help="delete a rule")
+    recur_delete.add_argument("id", type=int)
+    recur_delete.set_defaults(func=cmd_recur_delete)
+    recur_run = recur_commands.add_parser(
+        "run", help="add the tasks of rules due by now, catching up missed ones"
+    )
+    recur_run.set_defaults(func=cmd_recur_run)
+
+    serve = commands.add_parser(
+        "serve", help="share the task database with other clients over HTTP"
+    )
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    enable_from_environment()
+    try:
+        with tracer.span("cli." + args.command):
+            return args.func(args)
+    except ValueError as e:
+        print(f"pytasky: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""PyTasky columnar reports (.ptc): a compact binary format and its reader.
+
+Layout, integers little-endian:
+
+    b"PTC1"
+    row groups        zlib-compressed column buffers, ROW_GROUP_SIZE rows each
+    footer            JSON: the schema and, per row group, its row count,
+                      dictionaries and the offset and size of every buffer
+    u32 footer size, b"PTC1"
+
+Column buffers follow Arrow's layouts, so they load into array.array, numpy
+or Arrow without parsing text:
+
+- ``int64``: one signed 64-bit integer per row
+- ``timestamp``: int64 seconds since the epoch, the stored wall-clock time
+  read as UTC; INT64_MIN for null
+- ``string``: a validity byte per row, int32 end offsets, then UTF-8 data
+- ``dictionary``: int32 codes into the row group's dictionary, -1 for null
+"""
+
+import json
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime
+from itertools import accumulate, islice
+
+MAGIC = b"PTC1"
+
+ROW_GROUP_SIZE = 65536
+
+NULL_TIMESTAMP = -(2**63)
+
+EPOCH = datetime(1970, 1, 1)
+_SECOND = datetime(1970, 1, 1, 0, 0, 1) - EPOCH
+
+# Column name and type of each field of a report row, in REPORT_FIELDS order
+REPORT_SCHEMA = [
+    ("id", "int64"),
+    ("title", "string"),
+    ("notes", "string"),
+    ("tag", "dictionary"),
+    ("status", "dictionary"),
+    ("created_at", "timestamp"),
+    ("completed_at", "timestamp"),
+    ("last_updated", "timestamp"),
+]
+
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+def _pack(values):
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def _epoch(value):
+    """Seconds since the epoch from an int, a datetime or report timestamp text"""
+    if value is None:
+        return NULL_TIMESTAMP
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - EPOCH) // _SECOND
+
+
+def _encode_column(kind, values):
+    """(buffers, dictionary) for one column of a row group"""
+    if kind == "int64":
+        return [_pack(array("q", values))], None
+    if kind == "timestamp":
+        return [_pack(array("q", map(_epoch, values)))], None
+    if kind == "dictionary":
+        codes = {}
+        column = array(
+            "i",
+            (
+                -1 if value is None else codes.setdefault(value, len(codes))
+                for value in values
+            ),
+        )
+        return [_pack(column)], list(codes)
+    validity = bytes(value is not None for value in values)
+    encoded = [b"" if value is None else value.encode() for value in values]
+    offsets = array("i", accumulate(map(len, encoded)))
+    return [validity, _pack(offsets), b"".join(encoded)], None
+
+
+def _decode_column(kind, buffers, dictionary):
+    if kind == "int64":
+        return _unpack("q", buffers[0]).tolist()
+    if kind == "timestamp":
+        return [
+            None if value == NULL_TIMESTAMP else value
+            for value in _unpack("q", buffers[0])
+        ]
+    if kind == "dictionary":
+        return [
+            None if code < 0 else dictionary[code] for code in _unpack("i", buffers[0])
+        ]
+    validity, offsets, data = buffers
+    text = []
+    start = 0
+    for valid, end in zip(validity, _unpack("i", offsets)):
+        text.append(data[start:end].decode() if valid else None)
+        start = end
+    return text
+
+
+def write_columnar(rows, f, schema=REPORT_SCHEMA, row_group_size=ROW_GROUP_SIZE):
+    """Write row tuples to binary file f a row group at a time; returns the count"""
+    f.write(MAGIC)
+    offset = len(MAGIC)
+    groups = []
+    count = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, row_group_size))
+        if not chunk:
+            break
+        group = {"rows": len(chunk), "columns": {}}
+        for (name, kind), values in zip(schema, zip(*chunk)):
+            buffers, dictionary = _encode_column(kind, values)
+            column = {"buffers": []}
+            if dictionary is not None:
+                column["dictionary"] = dictionary
+            for buffer in buffers:
+                data = zlib.compress(buffer, 1)
+                f.write(data)
+                column["buffers"].append([offset, len(data)])
+                offset += len(data)
+            group["columns"][name] = column
+        groups.append(group)
+        count += len(chunk)
+    footer = json.dumps(
+        {"schema": [list(field) for field in schema], "row_groups": groups},
+        separators=(",", ":"),
+    ).encode()
+    f.write(footer)
+    f.write(struct.pack("<I", len(footer)) + MAGIC)
+    return count
+
+
+def read_footer(f):
+    """The footer of a .ptc file open in binary mode"""
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a PyTasky columnar file")
+    f.seek(-8, 2)
+    size, magic = struct.unpack("<I4s", f.read(8))
+    if magic != MAGIC:
+        raise ValueError("truncated PyTasky columnar file")
+    f.seek(-8 - size, 2)
+    return json.loads(f.read(size))
+
+
+def read_columnar(filename, columns=None):
+    """Read a .ptc file into {column: list of values}, in file order.
+
+    Only the named columns are read and decompressed when ``columns`` is given.
+    Timestamps stay seconds since the epoch; see to_datetime().
+    """
+    with open(filename, "rb") as f:
+        footer = read_footer(f)
+        schema = [
+            (name, kind)
+            for name, kind in footer["schema"]
+            if columns is None or name in columns
+        ]
+        result = {name: [] for name, _ in schema}
+        for group in footer["row_groups"]:
+            for name, kind in schema:
+                column = group["columns"][name]
+                buffers = []
+                for offset, size in column["buffers"]:
+                    f.seek(offset)
+                    buffers.append(zlib.decompress(f.read(size)))
+                result[name] += _decode_column(kind, buffers, column.get("dictionary"))
+    return result
+
+
+def to_datetime(seconds):
+    """A timestamp column value as the naive datetime it was written from"""
+    return None if seconds is None else EPOCH + seconds * _SECOND
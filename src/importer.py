@@ -0,0 +1,152 @@
+import csv
+import json
+import os
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import func, insert
+from models import DONE_STATUSES, STATUSES, Task, link_tags_after
+from reports import CSV_HEADER, REPORT_FIELDS
+
+IMPORT_FORMATS = ["json", "csv", "ndjson"]
+
+# Accept both report CSV headers ("Created At") and field names ("created_at")
+CSV_FIELD_NAMES = dict(zip(CSV_HEADER, REPORT_FIELDS))
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension == "jsonl":
+        return "ndjson"
+    if extension not in IMPORT_FORMATS:
+        raise ValueError(f"Cannot tell the format of {path}; pass --format")
+    return extension
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """Yield the elements of a top-level JSON array without loading it whole"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array of task objects")
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(","):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+
+
+def iter_ndjson(f):
+    for number, line in enumerate(f, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {number}: {e}") from None
+
+
+def iter_csv(f):
+    for record in csv.DictReader(f):
+        yield {CSV_FIELD_NAMES.get(key, key): value for key, value in record.items()}
+
+
+def parse_timestamp(value):
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    return datetime.fromisoformat(value)
+
+
+def _text(record, field):
+    value = record.get(field)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{field} must be text, not {value!r}")
+    return value
+
+
+def _timestamp(record, field):
+    value = record.get(field)
+    try:
+        return parse_timestamp(value)
+    except (TypeError, ValueError, OverflowError, OSError) as e:
+        raise ValueError(f"bad {field} {value!r}: {e}") from None
+
+
+def task_values(record, now):
+    """Map one imported record onto Task column values"""
+    if not isinstance(record, dict):
+        raise ValueError(f"expected a task object, not {record!r}")
+    title = (_text(record, "title") or "").strip()
+    if not title:
+        raise ValueError(f"no title in {record!r}")
+    status = _text(record, "status") or "todo"
+    if status not in STATUSES:
+        raise ValueError(f"unknown status {status!r} in {record!r}")
+    created_at = _timestamp(record, "created_at") or now
+    completed_at = _timestamp(record, "completed_at")
+    if status in DONE_STATUSES and completed_at is None:
+        completed_at = now
+    return {
+        "title": title,
+        "notes": _text(record, "notes") or None,
+        "tag": _text(record, "tag") or None,
+        "status": status,
+        "created_at": created_at,
+        "completed_at": completed_at,
+        "last_updated": _timestamp(record, "last_updated") or created_at,
+    }
+
+
+def _numbered_values(records, now):
+    """task_values() of each record, naming the record that fails"""
+    for number, record in enumerate(records, 1):
+        try:
+            yield task_values(record, now)
+        except ValueError as e:
+            raise ValueError(f"Record {number}: {e}") from None
+
+
+def iter_records(f, format_type):
+    readers = {"json": iter_json_array, "ndjson": iter_ndjson, "csv": iter_csv}
+    return readers[format_type](f)
+
+
+def import_tasks(session, records, batch_size=5000):
+    """Bulk insert records in batches; the caller owns the transaction.
+
+    Source ids are not kept, imported tasks get fresh ids. Returns the number
+    of inserted rows. Tags are linked a batch at a time, as bulk inserts
+    bypass the ORM flush that links them otherwise.
+    """
+    now = datetime.now()
+    values = _numbered_values(records, now)
+    count = 0
+    while True:
+        batch = list(islice(values, batch_size))
+        if not batch:
+            return count
+        last_id = session.query(func.max(Task.id)).scalar() or 0
+        session.execute(insert(Task), batch)
+        link_tags_after(session, last_id)
+        count += len(batch)
+
+
+def import_file(session, path, format_type=None, batch_size=5000):
+    format_type = format_type or detect_format(path)
+    newline = "" if format_type == "csv" else None
+    with open(path, newline=newline, encoding="utf-8") as f:
+        return import_tasks(session, iter_records(f, format_type), batch_size)
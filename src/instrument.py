@@ -0,0 +1,224 @@
+"""Timing spans and SQL statistics, for finding where the app spends its time.
+
+Recording is off by default. span() then returns a shared no-op context
+manager and no SQLAlchemy hooks are attached, so instrumented code pays for
+one attribute check. Recording starts with PYTASKY_TRACE set to a file path,
+which also appends every span to it as a JSON line, or from the diagnostics
+window (Ctrl+Shift+D).
+
+Spans are named by what they time: app methods such as "update_task_list",
+"sql.select" and friends for each statement, and "session.commit" for each
+ORM commit, flush included.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as OrmSession
+
+# Longest statement text written to the trace file
+MAX_STATEMENT = 500
+
+_NULL_SPAN = nullcontext()
+
+
+class SpanStats:
+    """Running totals of every span recorded under one name"""
+
+    __slots__ = ("count", "total_s", "max_s")
+
+    def __init__(self):
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    @property
+    def mean_s(self):
+        return self.total_s / self.count if self.count else 0.0
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self.name, elapsed, self.attrs)
+        return False
+
+
+class Tracer:
+    """Collects span timings as totals per name and, when tracing to a file,
+    as one JSON line per span"""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_path = None
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._trace = None
+
+    def enable(self, trace_path=None):
+        """Start recording, appending spans to trace_path when it is given"""
+        with self._lock:
+            if trace_path and self._trace is None:
+                self._trace = open(trace_path, "a", encoding="utf-8")
+                self.trace_path = trace_path
+            if not self.enabled:
+                _attach_sql_hooks()
+                self.enabled = True
+
+    def disable(self):
+        with self._lock:
+            if self.enabled:
+                _detach_sql_hooks()
+                self.enabled = False
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+                self.trace_path = None
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def span(self, name, **attrs):
+        """Context manager timing its block as one ``name`` span"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, attrs)
+
+    def record(self, name, elapsed, attrs=None):
+        """Add a finished span that took ``elapsed`` seconds"""
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = SpanStats()
+            stats.count += 1
+            stats.total_s += elapsed
+            stats.max_s = max(stats.max_s, elapsed)
+            if self._trace is not None:
+                entry = {
+                    "ts": round(time.time(), 6),
+                    "span": name,
+                    "ms": round(elapsed * 1000, 3),
+                    "thread": threading.current_thread().name,
+                }
+                if attrs:
+                    entry.update(attrs)
+                self._trace.write(json.dumps(entry, default=str) + "\n")
+                self._trace.flush()
+
+    def summary(self):
+        """[(name, SpanStats)], most total time first"""
+        with self._lock:
+            items = [(name, _copy(stats)) for name, stats in self.stats.items()]
+        return sorted(items, key=lambda item: item[1].total_s, reverse=True)
+
+
+def _copy(stats):
+    copy = SpanStats()
+    copy.count, copy.total_s, copy.max_s = stats.count, stats.total_s, stats.max_s
+    return copy
+
+
+tracer = Tracer()
+
+
+def traced(name):
+    """Decorator recording each call of the function as a ``name`` span"""
+
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def enable_from_environment():
+    """Start recording to the file named by PYTASKY_TRACE, if it is set"""
+    path = os.environ.get("PYTASKY_TRACE")
+    if path:
+        tracer.enable(path)
+    return bool(path)
+
+
+# SQLAlchemy hooks, attached to every engine and session only while recording
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("pytasky_span_starts", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    starts = conn.info.get("pytasky_span_starts")
+    if not starts:
+        # Recording started while the statement was running
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    tracer.record(
+        "sql." + statement.split(None, 1)[0].lower(),
+        elapsed,
+        {"statement": statement[:MAX_STATEMENT]} if tracer.trace_path else None,
+    )
+
+
+def _handle_error(context):
+    starts = context.connection and context.connection.info.get("pytasky_span_starts")
+    if starts:
+        starts.pop()
+
+
+def _before_commit(session):
+    session.info["pytasky_commit_start"] = time.perf_counter()
+
+
+def _after_commit(session):
+    start = session.info.pop("pytasky_commit_start", None)
+    if start is not None:
+        tracer.record("session.commit", time.perf_counter() - start)
+
+
+def _after_rollback(session):
+    session.info.pop("pytasky_commit_start", None)
+
+
+_SQL_HOOKS = [
+    (Engine, "before_cursor_execute", _before_cursor_execute),
+    (Engine, "after_cursor_execute", _after_cursor_execute),
+    (Engine, "handle_error", _handle_error),
+    (OrmSession, "before_commit", _before_commit),
+    (OrmSession, "after_commit", _after_commit),
+    (OrmSession, "after_rollback", _after_rollback),
+]
+
+
+def _attach_sql_hooks():
+    for target, name, hook in _SQL_HOOKS:
+        event.listen(target, name, hook)
+
+
+def _detach_sql_hooks():
+    for target, name, hook in _SQL_HOOKS:
+        event.remove(target, name, hook)
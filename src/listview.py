@@ -0,0 +1,620 @@
+import tkinter as tk
+import tkinter.font as tkfont
+from array import array
+from collections import namedtuple
+from datetime import datetime
+from tkinter import ttk
+from instrument import traced
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+TaskRow = namedtuple(
+    "TaskRow",
+    [
+        "id",
+        "title",
+        "notes",
+        "tag",
+        "status",
+        "created_at",
+        "completed_at",
+        "last_updated",
+    ],
+)
+
+
+def row_from_task(task):
+    """Snapshot the columns of a Task so the row outlives its session"""
+    return TaskRow(
+        task.id,
+        task.title,
+        task.notes,
+        task.tag,
+        task.status,
+        task.created_at,
+        task.completed_at,
+        task.last_updated,
+    )
+
+
+def format_timestamp(value):
+    return value.strftime(TIMESTAMP_FORMAT) if value else "N/A"
+
+
+def format_active_row(row):
+    text = (
+        f"{row.id}. {row.title} [{row.status} - "
+        f"Created: {format_timestamp(row.created_at)} - "
+        f"Updated: {format_timestamp(row.last_updated)}]"
+    )
+    if row.tag:
+        text += f" - {row.tag}"
+    return text
+
+
+def format_done_row(row):
+    text = (
+        f"{row.id}. {row.title} [{row.status} - "
+        f"Created: {format_timestamp(row.created_at)} - "
+        f"Completed: {format_timestamp(row.completed_at)} - "
+        f"Updated: {format_timestamp(row.last_updated)}]"
+    )
+    if row.tag:
+        text += f" - {row.tag}"
+    return text
+
+
+def active_sort_key(row):
+    return row.id
+
+
+def done_sort_key(row):
+    # Mirrors ORDER BY completed_at DESC with NULLs last once reversed
+    return (row.completed_at or datetime.min, row.id)
+
+
+class TaskListModel:
+    """Sorted in-memory rows for one task list, patched one task at a time.
+
+    Row text is formatted lazily and cached, so only rows that are actually
+    rendered pay for the timestamp formatting. Task ids are also kept in a
+    compact array parallel to the rows, so an index maps to its id in O(1).
+
+    A changed row that ``accepts`` rejects, such as one that no longer has
+    the tag the list is filtered on, is dropped instead of upserted.
+    """
+
+    def __init__(self, formatter, sort_key, reverse=False):
+        self.formatter = formatter
+        self.sort_key = sort_key
+        self.reverse = reverse
+        self._rows = []
+        self._ids = array("q")
+        self._by_id = {}
+        self._text = {}
+        self._listeners = []
+        self.accepts = lambda row: True
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, task_id):
+        return task_id in self._by_id
+
+    def subscribe(self, callback):
+        """Register callback(kind, index); kind is reset/insert/update/delete/extend"""
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+
+    def _notify(self, kind, index=None):
+        for callback in self._listeners:
+            callback(kind, index)
+
+    def _position(self, key):
+        lo, hi = 0, len(self._rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = self.sort_key(self._rows[mid])
+            if (mid_key > key) if self.reverse else (mid_key < key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def load(self, rows):
+        self._rows = sorted(rows, key=self.sort_key, reverse=self.reverse)
+        self._ids = array("q", [row.id for row in self._rows])
+        self._by_id = dict(zip(self._ids, self._rows))
+        self._text = {}
+        self._notify("reset")
+
+    def ensure_loaded(self, count):
+        """Make at least ``count`` rows available, for models that fetch lazily"""
+
+    def row(self, index):
+        return self._rows[index]
+
+    def id_at(self, index):
+        return self._ids[index]
+
+    def ids(self, start=0, end=None):
+        """Task ids of the rows from ``start`` up to ``end``, in list order"""
+        return self._ids[start:end]
+
+    def get(self, task_id):
+        return self._by_id.get(task_id)
+
+    def text(self, index):
+        row = self._rows[index]
+        text = self._text.get(row.id)
+        if text is None:
+            text = self._text[row.id] = self.formatter(row)
+        return text
+
+    def index_of(self, task_id):
+        row = self._by_id.get(task_id)
+        if row is None:
+            return None
+        return self._position(self.sort_key(row))
+
+    def upsert(self, row):
+        if not self.accepts(row):
+            self.remove(row.id)
+            return None
+        old_index = self.index_of(row.id)
+        self._text.pop(row.id, None)
+        if old_index is not None:
+            old = self._rows[old_index]
+            if self.sort_key(old) == self.sort_key(row):
+                self._rows[old_index] = row
+                self._by_id[row.id] = row
+                self._notify("update", old_index)
+                return old_index
+            del self._rows[old_index]
+            del self._ids[old_index]
+            self._notify("delete", old_index)
+        index = self._position(self.sort_key(row))
+        self._rows.insert(index, row)
+        self._ids.insert(index, row.id)
+        self._by_id[row.id] = row
+        self._notify("insert", index)
+        return index
+
+    def remove(self, task_id):
+        index = self.index_of(task_id)
+        if index is None:
+            return None
+        del self._rows[index]
+        del self._ids[index]
+        del self._by_id[task_id]
+        self._text.pop(task_id, None)
+        self._notify("delete", index)
+        return index
+
+
+class PagedTaskListModel(TaskListModel):
+    """Task list filled a page at a time from ``fetch_page(after_row, limit)``.
+
+    Only rows up to the last one fetched are held. A changed row that now sorts
+    past it is dropped; a later page brings it back if it still belongs.
+    """
+
+    def __init__(self, formatter, sort_key, fetch_page, reverse=False, page_size=200):
+        super().__init__(formatter, sort_key, reverse)
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.has_more = True
+        self._last = None
+
+    def _fetch(self):
+        rows = self.fetch_page(self._last, self.page_size)
+        self.has_more = len(rows) == self.page_size
+        if rows:
+            self._last = rows[-1]
+        return rows
+
+    def _beyond_last(self, row):
+        if not self.has_more:
+            return False
+        if self._last is None:
+            return True
+        key, last = self.sort_key(row), self.sort_key(self._last)
+        return key < last if self.reverse else key > last
+
+    def reload(self):
+        """Drop every row and fetch the first page again"""
+        self._last = None
+        self.has_more = True
+        self.load(self._fetch())
+
+    def load_more(self):
+        if not self.has_more:
+            return
+        # Each page sorts after everything already held, so it is appended
+        rows = [row for row in self._fetch() if row.id not in self._by_id]
+        if rows:
+            index = len(self._rows)
+            self._rows.extend(rows)
+            self._ids.extend(row.id for row in rows)
+            self._by_id.update((row.id, row) for row in rows)
+            self._notify("extend", index)
+
+    def ensure_loaded(self, count):
+        while self.has_more and len(self._rows) < count:
+            self.load_more()
+
+    def upsert(self, row):
+        if self._beyond_last(row):
+            self.remove(row.id)
+            return None
+        return super().upsert(row)
+
+
+class RankedTaskListModel(TaskListModel):
+    """Search results, kept in the order they were loaded (best match first)"""
+
+    def __init__(self, formatter):
+        super().__init__(formatter, self._rank_key)
+        self._ranks = {}
+
+    def _rank_key(self, row):
+        return (self._ranks.get(row.id, len(self._ranks)), row.id)
+
+    def load(self, rows):
+        rows = list(rows)
+        self._ranks = {row.id: rank for rank, row in enumerate(rows)}
+        super().load(rows)
+
+
+class TaskSelection:
+    """Ids of the selected rows of a task list, and the anchor row.
+
+    The anchor is the row clicked last: shift-click ranges start from it, and
+    single-task actions such as editing use it. The cursor is the other end
+    of the range, which Shift+Up/Down move. Ids are kept rather than indices,
+    so the selection survives rows moving around the list.
+    """
+
+    def __init__(self):
+        self.ids = set()
+        self.anchor = None
+        self.cursor = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, task_id):
+        return task_id in self.ids
+
+    def set(self, task_id):
+        self.ids = {task_id}
+        self.anchor = self.cursor = task_id
+
+    def toggle(self, task_id):
+        if task_id in self.ids:
+            self.ids.discard(task_id)
+        else:
+            self.ids.add(task_id)
+        self.anchor = self.cursor = task_id
+
+    def extend(self, model, index):
+        """Select the rows from the anchor to ``index``, keeping the anchor"""
+        start = None if self.anchor is None else model.index_of(self.anchor)
+        if start is None:
+            self.set(model.id_at(index))
+            return
+        first, last = sorted((start, index))
+        self.ids = set(model.ids(first, last + 1))
+        self.cursor = model.id_at(index)
+
+    def select_all(self, model):
+        self.ids = set(model.ids())
+        if self.anchor not in self.ids:
+            self.anchor = self.cursor = model.id_at(0) if len(model) else None
+
+    def clear(self):
+        self.ids = set()
+        self.anchor = self.cursor = None
+
+    def prune(self, model):
+        """Forget ids no longer in the model"""
+        self.ids = {task_id for task_id in self.ids if task_id in model}
+        if self.anchor not in model:
+            self.anchor = None
+        if self.cursor not in model:
+            self.cursor = self.anchor
+
+
+class VirtualListView(ttk.Frame):
+    """Listbox look-alike that only materializes the rows currently in view.
+
+    Exposes the subset of the tk.Listbox API the app uses (size, get,
+    curselection, selection_clear, bind) in terms of model indices. Several
+    rows can be selected with Ctrl+click, Shift+click, Shift+Up/Down and
+    Ctrl+A; clicks are handled here, since the listbox only holds the rows
+    on screen.
+    """
+
+    def __init__(self, master, model, **listbox_options):
+        super().__init__(master)
+        self.model = model
+        self._top = 0
+        self.selection = TaskSelection()
+
+        self.listbox = tk.Listbox(self, exportselection=False, **listbox_options)
+        self.scrollbar = ttk.Scrollbar(
+            self, orient="vertical", command=self._on_scrollbar
+        )
+        self.scrollbar.pack(side="right", fill="y")
+        self.listbox.pack(side="left", fill="both", expand=True)
+        self._visible = int(self.listbox.cget("height")) or 10
+
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<Button-1>", self._on_click)
+        self.listbox.bind("<Control-Button-1>", self._on_control_click)
+        self.listbox.bind("<Shift-Button-1>", self._on_shift_click)
+        self.listbox.bind("<B1-Motion>", lambda event: "break")
+        self.listbox.bind("<Control-a>", self._select_all)
+        self.listbox.bind("<MouseWheel>", self._on_mousewheel)
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(3))
+        self.listbox.bind("<Up>", lambda event: self._move_selection(-1))
+        self.listbox.bind("<Down>", lambda event: self._move_selection(1))
+        self.listbox.bind("<Prior>", lambda event: self._move_selection(-self._visible))
+        self.listbox.bind("<Next>", lambda event: self._move_selection(self._visible))
+        self.listbox.bind("<Shift-Up>", lambda event: self._move_selection(-1, True))
+        self.listbox.bind("<Shift-Down>", lambda event: self._move_selection(1, True))
+
+        model.subscribe(self._on_model_change)
+        self.render()
+
+    def set_model(self, model):
+        if model is self.model:
+            return
+        self.model.unsubscribe(self._on_model_change)
+        self.model = model
+        model.subscribe(self._on_model_change)
+        self._on_model_change("reset", None)
+
+    # Listbox-compatible API, expressed in model indices
+
+    def size(self):
+        return len(self.model)
+
+    def get(self, index):
+        return self.model.text(index)
+
+    def curselection(self):
+        """Index of the anchor row, as a tuple like Listbox.curselection()"""
+        if self.selection.anchor is None:
+            return ()
+        index = self.model.index_of(self.selection.anchor)
+        return () if index is None else (index,)
+
+    def selection_clear(self, first=0, last=None):
+        self.selection.clear()
+        self.listbox.selection_clear(0, tk.END)
+
+    def selection_set(self, index):
+        self.selection.set(self.model.id_at(index))
+        self.see(index)
+        self.render()
+
+    def selected_id(self):
+        """Id of the anchor row, the one single-task actions apply to"""
+        anchor = self.selection.anchor
+        return anchor if anchor in self.model else None
+
+    def selected_row(self):
+        """The already-loaded TaskRow under the anchor, or None"""
+        if self.selection.anchor is None:
+            return None
+        return self.model.get(self.selection.anchor)
+
+    def selected_ids(self):
+        """Ids of every selected row still in the list"""
+        return [task_id for task_id in self.selection.ids if task_id in self.model]
+
+    def selected_rows(self):
+        return [self.model.get(task_id) for task_id in self.selected_ids()]
+
+    def bind(self, sequence=None, func=None, add=None):
+        return self.listbox.bind(sequence, func, add)
+
+    def see(self, index):
+        if index < self._top:
+            self._top = index
+        elif index >= self._top + self._visible:
+            self._top = index - self._visible + 1
+        self.render()
+
+    # Rendering
+
+    def _max_top(self):
+        return max(0, len(self.model) - self._visible)
+
+    @traced("listview.render")
+    def render(self):
+        # Paged models fetch a screenful ahead of what is shown
+        self.model.ensure_loaded(self._top + 2 * self._visible)
+        self._top = min(max(0, self._top), self._max_top())
+        end = min(len(self.model), self._top + self._visible)
+        self.listbox.delete(0, tk.END)
+        texts = [self.model.text(i) for i in range(self._top, end)]
+        if texts:
+            self.listbox.insert(tk.END, *texts)
+        selection = self.selection
+        if selection:
+            for index, task_id in enumerate(self.model.ids(self._top, end)):
+                if task_id in selection:
+                    self.listbox.selection_set(index)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self.model)
+        if total <= self._visible:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self._top / total, (self._top + self._visible) / total)
+
+    def scroll(self, delta):
+        top = min(max(0, self._top + delta), self._max_top())
+        if top != self._top:
+            self._top = top
+            self.render()
+        return "break"
+
+    def _on_model_change(self, kind, index):
+        if kind == "reset":
+            self._top = 0
+            self.selection.prune(self.model)
+            self.render()
+            return
+        if kind == "extend":
+            if index < self._top + self._visible:
+                self.render()
+            else:
+                self._update_scrollbar()
+            return
+        if index < self._top and kind in ("insert", "delete"):
+            # Keep the rows on screen steady when something above them moves
+            self._top += 1 if kind == "insert" else -1
+            self._update_scrollbar()
+        elif index < self._top + self._visible:
+            if kind == "update":
+                row = index - self._top
+                self.listbox.delete(row)
+                self.listbox.insert(row, self.model.text(index))
+                if self.model.id_at(index) in self.selection:
+                    self.listbox.selection_set(row)
+            else:
+                self.render()
+        else:
+            self._update_scrollbar()
+
+    def _on_resize(self, event):
+        linespace = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace")
+        border = 2 * (
+            int(self.listbox.cget("borderwidth"))
+            + int(self.listbox.cget("highlightthickness"))
+        )
+        visible = max(1, (event.height - border) // max(1, linespace))
+        if visible != self._visible:
+            self._visible = visible
+            self.render()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._top = int(float(amount) * len(self.model))
+            self.render()
+        elif action == "scroll":
+            step = self._visible if unit == "pages" else 1
+            self.scroll(int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        return self.scroll(-1 if event.delta > 0 else 1)
+
+    def _index_at(self, event):
+        """Model index of the row under the pointer, or None below the last row"""
+        index = self._top + self.listbox.nearest(event.y)
+        bbox = self.listbox.bbox(index - self._top)
+        if index >= len(self.model) or not bbox or event.y > bbox[1] + bbox[3]:
+            return None
+        return index
+
+    def _clicked(self, event, select):
+        self.listbox.focus_set()
+        index = self._index_at(event)
+        if index is None:
+            return "break"
+        select(index)
+        self.render()
+        self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    def _on_click(self, event):
+        return self._clicked(
+            event, lambda index: self.selection.set(self.model.id_at(index))
+        )
+
+    def _on_control_click(self, event):
+        return self._clicked(
+            event, lambda index: self.selection.toggle(self.model.id_at(index))
+        )
+
+    def _on_shift_click(self, event):
+        return self._clicked(
+            event, lambda index: self.selection.extend(self.model, index)
+        )
+
+    def _select_all(self, event=None):
+        self.selection.select_all(self.model)
+        self.render()
+        self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    def _move_selection(self, delta, extend=False):
+        if not len(self.model):
+            return "break"
+        cursor = self.selection.cursor
+        current = None if cursor is None else self.model.index_of(cursor)
+        index = self._top if current is None else current + delta
+        index = min(max(0, index), len(self.model) - 1)
+        if extend and current is not None:
+            self.selection.extend(self.model, index)
+            self.see(index)
+        else:
+            self.selection_set(index)
+        self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
+
+
+class SearchController:
+    """Search box that swaps a list view onto ranked results as the user types.
+
+    ``search(text)`` returns TaskRows best match first. Keystrokes are
+    debounced so a burst of typing runs a single query.
+    """
+
+    def __init__(self, entry, view, model, search, schedule, cancel, delay_ms=150):
+        self.entry = entry
+        self.view = view
+        self.model = model
+        self.search = search
+        self.schedule = schedule
+        self.cancel = cancel
+        self.delay_ms = delay_ms
+        self.results = RankedTaskListModel(model.formatter)
+        self._after_id = None
+        entry.bind("<KeyRelease>", self._on_key)
+        entry.bind("<Escape>", self.clear)
+
+    @property
+    def active(self):
+        return self.view.model is self.results
+
+    def _on_key(self, event):
+        if self._after_id is not None:
+            self.cancel(self._after_id)
+        self._after_id = self.schedule(self.delay_ms, self.run)
+
+    @traced("search")
+    def run(self):
+        self._after_id = None
+        text = self.entry.get().strip()
+        if not text:
+            self.view.set_model(self.model)
+            return
+        self.results.load(self.search(text))
+        self.view.set_model(self.results)
+
+    def refresh(self):
+        """Re-run the current search after the underlying tasks changed"""
+        if self.active:
+            self.run()
+
+    def clear(self, event=None):
+        self.entry.delete(0, tk.END)
+        self.run()
@@ -1,11 +1,29 @@
 import os
+import re
 import sys
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Index
+from sqlalchemy import ForeignKey, MetaData
+from sqlalchemy import column, delete, func, insert, literal, literal_column, or_
+from sqlalchemy import inspect, select, table, tuple_, update
+from sqlalchemy import text as sql_text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session as OrmSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
 
 Base = declarative_base()
 
+ACTIVE_STATUSES = ["todo", "in-progress", "blocked", "testing", "verify"]
+DONE_STATUSES = ["done", "cancelled"]
+STATUSES = ACTIVE_STATUSES + DONE_STATUSES
+
+# Bump when adding an entry to MIGRATIONS; stored in PRAGMA user_version
+SCHEMA_VERSION = 8
+
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -19,12 +37,134 @@ class Task(Base):
     completed_at = Column(DateTime)
     last_updated = Column(DateTime)
 
+    __table_args__ = (
+        # Active list: status IN (...) ORDER BY id
+        Index("ix_tasks_status_id", "status", "id"),
+        # Done list: status IN (...) ORDER BY completed_at DESC
+        Index("ix_tasks_status_completed_at", "status", "completed_at"),
+        # Reports: created_at range, optionally narrowed by status
+        Index("ix_tasks_created_at_status", "created_at", "status"),
+        # Done history pages: ORDER BY completed_at DESC, id DESC across statuses
+        Index("ix_tasks_completed_at", "completed_at"),
+        # AUTOINCREMENT: ids of archived and deleted tasks are never reused, so
+        # archived_tasks and task_changes always point at the task they meant
+        {"sqlite_autoincrement": True},
+    )
+
     def __repr__(self):
         return f"<Task(id={self.id}, title='{self.title}', status='{self.status}')>"
 
 
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(collation="NOCASE"), nullable=False, unique=True)
+
+
+class TaskTag(Base):
+    """Links a task to each tag named in its tag text, kept in step on every flush"""
+
+    __tablename__ = "task_tags"
+
+    task_id = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+
+    __table_args__ = (
+        # Tag filters and per-tag counts: tag_id = ? -> task ids
+        Index("ix_task_tags_tag_id_task_id", "tag_id", "task_id"),
+    )
+
+
+class ArchivedTask(Base):
+    """Completed tasks moved out of tasks by archive_tasks(), keeping their ids"""
+
+    __tablename__ = "archived_tasks"
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    notes = Column(String)
+    tag = Column(String)
+    status = Column(String)
+    created_at = Column(DateTime)
+    completed_at = Column(DateTime, index=True)
+    last_updated = Column(DateTime)
+    archived_at = Column(DateTime)
+
+
+class TaskChange(Base):
+    """Append-only log of task inserts, updates and deletes, written by triggers
+
+    ``fields`` is a JSON object of the new values of the columns that changed
+    (all of them for an insert, none for a delete).
+    """
+
+    __tablename__ = "task_changes"
+    # AUTOINCREMENT: sequence numbers are never reused, even for deleted rows
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)
+    fields = Column(String)
+    changed_at = Column(DateTime)
+
+
+class PomodoroSession(Base):
+    __tablename__ = "pomodoro_sessions"
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"))
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=False, index=True)
+    seconds = Column(Integer, nullable=False)
+
+
+class Recurrence(Base):
+    """A rule that adds a copy of a task each time it fires (see recurrence.py)"""
+
+    __tablename__ = "recurrences"
+    # AUTOINCREMENT: schedulers find new rules by id, so ids are never reused
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    notes = Column(String)
+    tag = Column(String)
+    status = Column(String, default="todo")
+    rule = Column(String, nullable=False)
+    next_fire_at = Column(DateTime, nullable=False)
+    last_fired_at = Column(DateTime)
+    created_at = Column(DateTime)
+
+
+class DailyRollup(Base):
+    """Status transitions per day x tag x status, maintained by triggers"""
+
+    __tablename__ = "daily_rollups"
+
+    day = Column(String, primary_key=True)
+    tag = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    transitions = Column(Integer, nullable=False, default=0)
+    cycle_seconds = Column(Integer, nullable=False, default=0)
+
+
+class CycleTimeRollup(Base):
+    """Histogram of created -> done durations per day x tag (CYCLE_TIME_BUCKETS)"""
+
+    __tablename__ = "cycle_time_rollups"
+
+    day = Column(String, primary_key=True)
+    tag = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    tasks = Column(Integer, nullable=False, default=0)
+
+
 def get_database_path():
     """Get the database path, adjusting for PyInstaller bundling"""
+    if os.environ.get("PYTASKY_DB"):
+        return os.environ["PYTASKY_DB"]
     if hasattr(sys, "_MEIPASS"):
         # When bundled, place the database next to the executable
         return os.path.join(os.path.dirname(sys.executable), "pytasky_tasks.db")
@@ -34,14 +174,741 @@ def get_database_path():
     )
 
 
+# PRAGMAs applied to every new connection. "local" suits a database on the
+# user's own disk; WAL needs shared memory between processes, so databases on
+# a network share should use "shared" and rely on the busy timeout instead.
+STORAGE_PROFILES = {
+    "default": {},
+    "local": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -32768,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+    "shared": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 15000,
+        "cache_size": -32768,
+    },
+}
+
+
+def create_storage_engine(path, profile="local"):
+    """Create an engine whose connections are tuned by a STORAGE_PROFILES entry"""
+    pragmas = STORAGE_PROFILES[profile]
+    engine = create_engine(
+        f"sqlite:///{path}",
+        echo=False,
+        # Keep more prepared statements per pooled connection than the default
+        connect_args={"cached_statements": 256},
+    )
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return engine
+
+
 DATABASE_PATH = get_database_path()
-engine = create_engine(f"sqlite:///{DATABASE_PATH}", echo=False)
+STORAGE_PROFILE = os.environ.get("PYTASKY_STORAGE_PROFILE", "local")
+engine = create_storage_engine(DATABASE_PATH, STORAGE_PROFILE)
 Session = sessionmaker(bind=engine)
 
 
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def ensure_schema():
+    """Create missing tables and run migrations once, on first database use"""
+    global _schema_ready
+    with _schema_lock:
+        if not _schema_ready:
+            Base.metadata.create_all(engine)
+            upgrade_schema(engine)
+            _schema_ready = True
+
+
 def get_session():
+    if not _schema_ready:
+        ensure_schema()
     return Session()
 
 
-# Create the tables if they don't exist
-Base.metadata.create_all(engine)
+@contextmanager
+def session_scope():
+    """Unit of work on a pooled connection: commit on success, roll back on error"""
+    session = get_session()
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def parse_tags(text):
+    """Tag names in a task's comma-separated tag text, first spelling winning"""
+    names = {}
+    for name in (text or "").split(","):
+        name = name.strip()
+        if name:
+            names.setdefault(name.lower(), name)
+    return list(names.values())
+
+
+def has_tag(text, name):
+    return name.lower() in (tag.lower() for tag in parse_tags(text))
+
+
+def _chunks(values, size=500):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+def _tag_ids(connection, names):
+    ids = {}
+    for chunk in _chunks(names):
+        for tag_id, name in connection.execute(
+            select(Tag.id, Tag.name).where(Tag.name.in_(chunk))
+        ):
+            ids[name.lower()] = tag_id
+    return ids
+
+
+def link_tags(connection, tags_by_task):
+    """Replace the task_tags of each task id with links to the named tags,
+    creating tags that don't exist yet"""
+    wanted = {}
+    for names in tags_by_task.values():
+        for name in names:
+            wanted.setdefault(name.lower(), name)
+    tag_ids = _tag_ids(connection, wanted.values())
+    missing = [name for key, name in wanted.items() if key not in tag_ids]
+    if missing:
+        connection.execute(insert(Tag), [{"name": name} for name in missing])
+        tag_ids.update(_tag_ids(connection, missing))
+    for chunk in _chunks(tags_by_task):
+        connection.execute(delete(TaskTag).where(TaskTag.task_id.in_(chunk)))
+    links = [
+        {"task_id": task_id, "tag_id": tag_ids[name.lower()]}
+        for task_id, names in tags_by_task.items()
+        for name in names
+    ]
+    if links:
+        connection.execute(insert(TaskTag), links)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _link_flushed_tags(session, flush_context):
+    tags_by_task = {}
+    for task in session.new:
+        if isinstance(task, Task) and task.tag:
+            tags_by_task[task.id] = parse_tags(task.tag)
+    for task in session.dirty:
+        if isinstance(task, Task) and inspect(task).attrs.tag.history.has_changes():
+            tags_by_task[task.id] = parse_tags(task.tag)
+    for task in session.deleted:
+        if isinstance(task, Task):
+            tags_by_task[task.id] = []
+    if tags_by_task:
+        link_tags(session.connection(), tags_by_task)
+
+
+def link_tags_after(session, last_id):
+    """Link the tags of tasks inserted with ids above ``last_id`` in bulk"""
+    rows = session.query(Task.id, Task.tag).filter(
+        Task.id > last_id, Task.tag.isnot(None), Task.tag != ""
+    )
+    link_tags(session.connection(), {task_id: parse_tags(tag) for task_id, tag in rows})
+
+
+def tag_members(name):
+    """Select of the ids of tasks tagged ``name``, read from the tag index alone"""
+    return (
+        select(TaskTag.task_id)
+        .join(Tag, Tag.id == TaskTag.tag_id)
+        .where(Tag.name == name)
+    )
+
+
+def tagged(name):
+    """Filter on tasks tagged ``name``, resolved through ix_task_tags_tag_id_task_id"""
+    return Task.id.in_(tag_members(name))
+
+
+def tag_counts(session, statuses=None):
+    """[(tag, task count)] of tags in use, most used first"""
+    query = session.query(Tag.name, func.count(TaskTag.task_id)).join(
+        TaskTag, TaskTag.tag_id == Tag.id
+    )
+    if statuses:
+        query = query.join(Task, Task.id == TaskTag.task_id).filter(
+            Task.status.in_(statuses)
+        )
+    return (
+        query.group_by(Tag.id)
+        .order_by(func.count(TaskTag.task_id).desc(), Tag.name)
+        .all()
+    )
+
+
+def active_tasks_query(session):
+    return (
+        session.query(Task).filter(Task.status.in_(ACTIVE_STATUSES)).order_by(Task.id)
+    )
+
+
+def done_tasks_query(session):
+    return (
+        session.query(Task)
+        .filter(Task.status.in_(DONE_STATUSES))
+        .order_by(Task.completed_at.desc())
+    )
+
+
+DONE_PAGE_SIZE = 200
+
+
+def done_tasks_page(
+    session,
+    after=None,
+    limit=DONE_PAGE_SIZE,
+    since=None,
+    until=None,
+    columns=None,
+    tag=None,
+):
+    """One page of done history, newest first, keyset-paginated on (completed_at, id).
+
+    ``after`` is the (completed_at, id) of the last row of the previous page.
+    Tasks without a completion time come last, and only when no range is given.
+    """
+    # Unary + keeps SQLite on ix_tasks_completed_at, which already yields rows
+    # in page order, instead of sorting every done task per page
+    query = session.query(*(columns or (Task,))).filter(
+        literal_column("+tasks.status").in_(DONE_STATUSES)
+    )
+    if tag:
+        query = query.filter(tagged(tag))
+    rows = []
+    if after is None or after[0] is not None:
+        dated = query.filter(Task.completed_at.isnot(None))
+        if since is not None:
+            dated = dated.filter(Task.completed_at >= since)
+        if until is not None:
+            dated = dated.filter(Task.completed_at < until)
+        if after is not None:
+            dated = dated.filter(tuple_(Task.completed_at, Task.id) < tuple_(*after))
+        rows = (
+            dated.order_by(Task.completed_at.desc(), Task.id.desc()).limit(limit).all()
+        )
+        if len(rows) == limit or since is not None or until is not None:
+            return rows
+        after = None
+    undated = query.filter(Task.completed_at.is_(None))
+    if after is not None:
+        undated = undated.filter(Task.id < after[1])
+    return rows + undated.order_by(Task.id.desc()).limit(limit - len(rows)).all()
+
+
+DONE_BUCKETS = ["All", "Today", "Earlier this week", "Older"]
+
+
+def done_bucket_bounds(bucket, now=None):
+    """(since, until) completion range of a DONE_BUCKETS entry; None is unbounded"""
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week = today - timedelta(days=today.weekday())
+    return {
+        "All": (None, None),
+        "Today": (today, None),
+        "Earlier this week": (week, today),
+        "Older": (None, week),
+    }[bucket]
+
+
+def archive_tasks(session, before):
+    """Move done tasks completed before ``before`` to archived_tasks; returns the count"""
+    old = (Task.status.in_(DONE_STATUSES), Task.completed_at < before)
+    session.execute(
+        delete(TaskTag).where(TaskTag.task_id.in_(select(Task.id).where(*old)))
+    )
+    columns = [
+        "id",
+        "title",
+        "notes",
+        "tag",
+        "status",
+        "created_at",
+        "completed_at",
+        "last_updated",
+    ]
+    session.execute(
+        insert(ArchivedTask).from_select(
+            columns + ["archived_at"],
+            select(
+                *(getattr(Task, name) for name in columns),
+                literal(datetime.now(), DateTime),
+            ).where(*old),
+        )
+    )
+    return session.execute(delete(Task).where(*old)).rowcount
+
+
+def update_tasks(session, task_ids, status=None, tag=None, columns=None):
+    """Set the status and/or tag of many tasks at once, the way update_task()
+    sets them on one; returns the updated rows of ``columns`` (Task.id by
+    default, which ``columns`` must include).
+
+    Runs one UPDATE ... WHERE id IN (...) RETURNING per chunk of ids, so the
+    caller's transaction covers the whole set and nothing is read back.
+    """
+    now = datetime.now()
+    values = {"last_updated": now}
+    if status is not None:
+        values["status"] = status
+        values["completed_at"] = now if status in DONE_STATUSES else None
+    if tag is not None:
+        values["tag"] = tag
+    updated = []
+    for chunk in _chunks(task_ids):
+        statement = (
+            update(Task)
+            .where(Task.id.in_(chunk))
+            .values(values)
+            .returning(*(columns or [Task.id]))
+            .execution_options(synchronize_session=False)
+        )
+        updated += session.execute(statement).all()
+    if tag is not None:
+        # Bulk updates bypass the flush that links tags otherwise
+        names = parse_tags(tag)
+        link_tags(session.connection(), {row.id: names for row in updated})
+    return updated
+
+
+def delete_tasks(session, task_ids):
+    """Delete tasks and their tag links, a chunk of ids per statement; returns
+    the number of tasks deleted"""
+    count = 0
+    for chunk in _chunks(task_ids):
+        session.execute(delete(TaskTag).where(TaskTag.task_id.in_(chunk)))
+        statement = (
+            delete(Task)
+            .where(Task.id.in_(chunk))
+            .execution_options(synchronize_session=False)
+        )
+        count += session.execute(statement).rowcount
+    return count
+
+
+def report_query(session, start_dt, end_dt, statuses=None, columns=None, tag=None):
+    query = session.query(*(columns or (Task,))).filter(
+        Task.created_at >= start_dt, Task.created_at <= end_dt
+    )
+    if statuses:
+        query = query.filter(Task.status.in_(statuses))
+    if tag:
+        query = query.filter(tagged(tag))
+    return query
+
+
+# External-content FTS5 index over the text columns of tasks. The triggers
+# keep it in step with every insert, delete and text edit; status changes
+# leave it alone.
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, notes, tag,
+        content='tasks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, notes, tag)
+        VALUES (new.id, new.title, new.notes, new.tag);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, notes, tag)
+        VALUES ('delete', old.id, old.title, old.notes, old.tag);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_update
+    AFTER UPDATE OF title, notes, tag ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, notes, tag)
+        VALUES ('delete', old.id, old.title, old.notes, old.tag);
+        INSERT INTO tasks_fts(rowid, title, notes, tag)
+        VALUES (new.id, new.title, new.notes, new.tag);
+    END""",
+    "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')",
+]
+
+tasks_fts = table("tasks_fts", column("rowid"))
+
+# bm25 weights for title, notes and tag
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+# Above this many matches bm25 costs more than it is worth (the words are too
+# short or common to discriminate), so results come back newest first instead
+RANKED_SEARCH_LIMIT = 2000
+
+
+def search_tasks(
+    session, text, statuses=None, limit=200, tag=None, since=None, until=None
+):
+    """Best matches for text among tasks with the given statuses, best first.
+
+    ``tag`` and the completion range ``since``/``until`` narrow the matches
+    before the limit, as done_tasks_page() does. Falls back to LIKE filters
+    if this SQLite build lacks FTS5.
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+    query = session.query(Task)
+    if statuses:
+        query = query.filter(Task.status.in_(statuses))
+    if tag:
+        query = query.filter(tagged(tag))
+    if since is not None:
+        query = query.filter(Task.completed_at >= since)
+    if until is not None:
+        query = query.filter(Task.completed_at < until)
+    fts = literal_column("tasks_fts")
+    try:
+        matches = session.execute(
+            sql_text(
+                "SELECT count(*) FROM (SELECT 1 FROM tasks_fts "
+                "WHERE tasks_fts MATCH :match LIMIT :cap)"
+            ),
+            {"match": match, "cap": RANKED_SEARCH_LIMIT + 1},
+        ).scalar()
+    except OperationalError:
+        session.rollback()
+    else:
+        if matches > RANKED_SEARCH_LIMIT:
+            order = tasks_fts.c.rowid.desc()
+        else:
+            order = func.bm25(fts, *SEARCH_WEIGHTS)
+        return (
+            query.join(tasks_fts, tasks_fts.c.rowid == Task.id)
+            .filter(fts.op("MATCH")(match))
+            .order_by(order)
+            .limit(limit)
+            .all()
+        )
+    for word in re.findall(r"\w+", text):
+        pattern = f"%{word}%"
+        query = query.filter(
+            or_(
+                Task.title.like(pattern),
+                Task.notes.like(pattern),
+                Task.tag.like(pattern),
+            )
+        )
+    return query.order_by(Task.id.desc()).limit(limit).all()
+
+
+def _create_search_index(connection):
+    options = {row[0] for row in connection.exec_driver_sql("PRAGMA compile_options")}
+    if "ENABLE_FTS5" not in options:
+        # search_tasks() falls back to LIKE filters on this SQLite build
+        return
+    for statement in SEARCH_INDEX_DDL:
+        connection.exec_driver_sql(statement)
+
+
+# Upper bounds in seconds of the cycle time histogram buckets: from one minute
+# growing by half each step to past a year, so estimates stay within ~25%
+CYCLE_TIME_BUCKETS = [round(60 * 1.5**k) for k in range(34)]
+
+# Rollup tag under which every task is counted once, whatever its tags. Tags
+# are split on commas, so no tag name can be this
+ALL_TASKS_TAG = ","
+
+
+def _strip(value):
+    """SQL for ``value`` without surrounding whitespace, like str.strip()"""
+    return f"trim({value}, char(32, 9, 10, 13))"
+
+
+def _tag_parts(row):
+    """json_each() over the comma-separated parts of ``row``.tag; json_quote()
+    escapes everything but the commas, so they can become array separators"""
+    return (
+        "json_each('[' || replace(json_quote(COALESCE("
+        f"{row}.tag, '')), ',', '\",\"') || ']')"
+    )
+
+
+def _transitions(row, source=""):
+    """SELECT yielding day, tag, status and cycle time (done only) for ``row``:
+    a row per tag in its tag text, as parse_tags() splits it, spelled as in
+    the tags table ('' when untagged), plus one under ALL_TASKS_TAG"""
+    day = (
+        f"date(COALESCE(CASE WHEN {row}.status = 'done' THEN {row}.completed_at END,"
+        f" {row}.last_updated, {row}.created_at, datetime('now', 'localtime')))"
+    )
+    cycle = (
+        f"CASE WHEN {row}.status = 'done' THEN CAST("
+        f"(julianday({row}.completed_at) - julianday({row}.created_at)) * 86400"
+        " AS INTEGER) END"
+    )
+    name = _strip("part.value")
+    # The first spelling of each name counts, once; a task with no names at
+    # all counts under ''
+    first = (
+        f"NOT EXISTS (SELECT 1 FROM {_tag_parts(row)} AS prev"
+        f" WHERE prev.key < part.key AND lower({_strip('prev.value')}) = lower({name}))"
+    )
+    untagged = _strip(f"replace(COALESCE({row}.tag, ''), ',', '')") + " = ''"
+    tag = f"COALESCE((SELECT name FROM tags WHERE name = {name}), {name})"
+    tables = f"{source}, " if source else "FROM "
+    return (
+        f"SELECT {day} AS day, {tag} AS tag, {row}.status AS status,"
+        f" {cycle} AS cycle {tables}{_tag_parts(row)} AS part"
+        f" WHERE ({name} != '' AND {first}) OR (part.key = 0 AND {untagged})"
+        f" UNION ALL SELECT {day}, '{ALL_TASKS_TAG}', {row}.status, {cycle} {source}"
+    )
+
+
+def _rollup_sql(transitions):
+    """Upserts adding the rows of a _transitions() SELECT to the rollups"""
+    bucket = " ".join(
+        f"WHEN cycle < {bound} THEN {i}" for i, bound in enumerate(CYCLE_TIME_BUCKETS)
+    )
+    return [
+        f"""INSERT INTO daily_rollups (day, tag, status, transitions, cycle_seconds)
+        SELECT day, tag, status, count(*), COALESCE(sum(cycle), 0)
+        FROM ({transitions}) WHERE true GROUP BY day, tag, status
+        ON CONFLICT (day, tag, status) DO UPDATE SET
+            transitions = transitions + excluded.transitions,
+            cycle_seconds = cycle_seconds + excluded.cycle_seconds""",
+        f"""INSERT INTO cycle_time_rollups (day, tag, bucket, tasks)
+        SELECT day, tag, bucket, count(*) FROM (
+            SELECT day, tag, CASE {bucket} ELSE {len(CYCLE_TIME_BUCKETS)} END
+                AS bucket
+            FROM ({transitions}) WHERE cycle IS NOT NULL
+        ) WHERE true GROUP BY day, tag, bucket
+        ON CONFLICT (day, tag, bucket) DO UPDATE SET
+            tasks = tasks + excluded.tasks""",
+    ]
+
+
+def _create_rollup_triggers(connection):
+    body = ";\n".join(_rollup_sql(_transitions("new")))
+    connection.exec_driver_sql(f"""CREATE TRIGGER IF NOT EXISTS tasks_rollup_insert
+        AFTER INSERT ON tasks BEGIN {body}; END""")
+    connection.exec_driver_sql(f"""CREATE TRIGGER IF NOT EXISTS tasks_rollup_status
+        AFTER UPDATE OF status ON tasks
+        WHEN new.status IS NOT old.status BEGIN {body}; END""")
+
+
+def _create_rollups(connection):
+    _create_rollup_triggers(connection)
+    # Backfill: the only history an existing task has is its current status
+    for statement in _rollup_sql(_transitions("t", "FROM tasks AS t")):
+        connection.exec_driver_sql(statement)
+
+
+CHANGES_PAGE_SIZE = 1000
+
+
+def changes_since(session, seq=0, limit=CHANGES_PAGE_SIZE):
+    """Change log entries after sequence number ``seq``, oldest first"""
+    return (
+        session.query(TaskChange)
+        .filter(TaskChange.seq > seq)
+        .order_by(TaskChange.seq)
+        .limit(limit)
+        .all()
+    )
+
+
+def last_change_seq(session):
+    """Sequence number of the latest change, 0 for an empty log"""
+    return session.query(func.max(TaskChange.seq)).scalar() or 0
+
+
+def _change_log_ddl():
+    fields = [column.name for column in Task.__table__.columns if column.name != "id"]
+    values = ", ".join(f"'{field}', new.{field}" for field in fields)
+    changed = " UNION ALL ".join(
+        f"SELECT '{field}' AS key, new.{field} AS value"
+        f" WHERE new.{field} IS NOT old.{field}"
+        for field in fields
+    )
+    any_changed = " OR ".join(f"new.{field} IS NOT old.{field}" for field in fields)
+    log = (
+        "INSERT INTO task_changes (task_id, op, fields, changed_at)"
+        " VALUES ({row}.id, '{op}', {fields}, datetime('now', 'localtime'))"
+    )
+    inserted = log.format(row="new", op="insert", fields=f"json_object({values})")
+    updated = log.format(
+        row="new",
+        op="update",
+        fields=f"(SELECT json_group_object(key, value) FROM ({changed}))",
+    )
+    deleted = log.format(row="old", op="delete", fields="NULL")
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS tasks_log_insert
+        AFTER INSERT ON tasks BEGIN {inserted}; END""",
+        f"""CREATE TRIGGER IF NOT EXISTS tasks_log_update
+        AFTER UPDATE ON tasks WHEN {any_changed} BEGIN {updated}; END""",
+        f"""CREATE TRIGGER IF NOT EXISTS tasks_log_delete
+        AFTER DELETE ON tasks BEGIN {deleted}; END""",
+    ]
+
+
+def _create_change_log(connection):
+    # Existing tasks have no history: clients start from the current rows
+    TaskChange.__table__.create(connection, checkfirst=True)
+    for statement in _change_log_ddl():
+        connection.exec_driver_sql(statement)
+
+
+def _split_tags(connection):
+    Tag.__table__.create(connection, checkfirst=True)
+    TaskTag.__table__.create(connection, checkfirst=True)
+    rows = connection.execute(
+        select(Task.id, Task.tag).where(Task.tag.isnot(None), Task.tag != "")
+    ).fetchall()
+    for chunk in _chunks(rows, 5000):
+        link_tags(connection, {task_id: parse_tags(tag) for task_id, tag in chunk})
+
+
+def _autoincrement_task_ids(connection):
+    """Rebuild tasks with AUTOINCREMENT ids, keeping its rows, indexes and
+    triggers, and start new ids after every id archived or logged so far"""
+    ddl = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'"
+    ).scalar()
+    if "AUTOINCREMENT" not in ddl.upper():
+        dependents = (
+            connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE tbl_name = 'tasks'"
+                " AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+            )
+            .scalars()
+            .all()
+        )
+        existing = {
+            row[1] for row in connection.exec_driver_sql("PRAGMA table_info(tasks)")
+        }
+        columns = ", ".join(
+            c.name for c in Task.__table__.columns if c.name in existing
+        )
+        rebuilt = Task.__table__.to_metadata(MetaData(), name="tasks_new")
+        connection.exec_driver_sql("DROP TABLE IF EXISTS tasks_new")
+        connection.execute(CreateTable(rebuilt))
+        connection.exec_driver_sql(
+            f"INSERT INTO tasks_new ({columns}) SELECT {columns} FROM tasks"
+        )
+        # Dropping tasks drops its indexes and triggers, recreated below
+        connection.exec_driver_sql("DROP TABLE tasks")
+        connection.exec_driver_sql("ALTER TABLE tasks_new RENAME TO tasks")
+        for statement in dependents:
+            connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+    connection.exec_driver_sql(
+        """INSERT INTO sqlite_sequence (name, seq) SELECT 'tasks', coalesce(max(id), 0)
+        FROM (SELECT max(id) AS id FROM tasks
+              UNION ALL SELECT max(id) FROM archived_tasks
+              UNION ALL SELECT max(task_id) FROM task_changes)"""
+    )
+
+
+def _split_rollup_tags(connection):
+    """Re-key rollups kept by the raw tag text, like "docs, urgent", per tag.
+
+    Each old row counted every task once, so its counts go to each of its
+    tags, and summed per day into the ALL_TASKS_TAG rows. Rows already kept
+    per tag are only merged under the tags table spelling: _create_rollups
+    backfills before _split_tags fills that table, so on an upgraded
+    database "docs" and "Docs" would otherwise stay apart.
+    """
+    trigger = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE name = 'tasks_rollup_insert'"
+    ).scalar()
+    per_tag = "json_each" in trigger
+    spelled = {name.lower(): name for (name,) in connection.execute(select(Tag.name))}
+
+    def keys(text):
+        if per_tag:
+            return [spelled.get(text.lower(), text)]
+        names = [spelled.get(n.lower(), n) for n in parse_tags(text)] or [""]
+        return names + [ALL_TASKS_TAG]
+
+    for rollup, key, counts in (
+        (DailyRollup.__table__, "status", ("transitions", "cycle_seconds")),
+        (CycleTimeRollup.__table__, "bucket", ("tasks",)),
+    ):
+        totals = {}
+        for row in connection.execute(select(rollup)).mappings():
+            for tag in keys(row["tag"]):
+                values = totals.setdefault(
+                    (row["day"], tag, row[key]), [0] * len(counts)
+                )
+                for i, field in enumerate(counts):
+                    values[i] += row[field]
+        connection.execute(delete(rollup))
+        rows = [
+            {"day": day, "tag": tag, key: value, **dict(zip(counts, values))}
+            for (day, tag, value), values in totals.items()
+        ]
+        for chunk in _chunks(rows, 5000):
+            connection.execute(insert(rollup), chunk)
+    if not per_tag:
+        for name in ("tasks_rollup_insert", "tasks_rollup_status"):
+            connection.exec_driver_sql(f"DROP TRIGGER {name}")
+        _create_rollup_triggers(connection)
+
+
+def _create_task_indexes(*names):
+    def migrate(connection):
+        for index in Task.__table__.indexes:
+            if index.name in names:
+                index.create(connection, checkfirst=True)
+
+    return migrate
+
+
+# Schema version -> upgrade step applied to databases below that version
+MIGRATIONS = {
+    1: _create_task_indexes(
+        "ix_tasks_status_id",
+        "ix_tasks_status_completed_at",
+        "ix_tasks_created_at_status",
+    ),
+    2: _create_search_index,
+    3: _create_rollups,
+    4: _create_task_indexes("ix_tasks_completed_at"),
+    5: _create_change_log,
+    6: _split_tags,
+    7: _autoincrement_task_ids,
+    8: _split_rollup_tags,
+}
+
+
+def upgrade_schema(engine):
+    """Apply pending migrations to an existing database, one version at a time"""
+    with engine.begin() as connection:
+        version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[target](connection)
+            connection.exec_driver_sql(f"PRAGMA user_version = {target}")
@@ -1,12 +1,57 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
+import queue
 import time
 from datetime import datetime, timedelta
 import os
 import sys
-import json
-import csv
-from models import Task, get_session
+from functools import partial
+from models import (
+    ACTIVE_STATUSES,
+    DATABASE_PATH,
+    DONE_BUCKETS,
+    DONE_PAGE_SIZE,
+    DONE_STATUSES,
+    done_bucket_bounds,
+    has_tag,
+)
+from assets import ICON_SIZES, cache_dir, find_variant, render_all
+from instrument import enable_from_environment, traced, tracer
+from recurrence import RecurrenceScheduler
+from refresh import RefreshScheduler
+from store import StaleTaskError, open_store
+from timer import PomodoroTimer
+from worker import BackgroundWorker
+from listview import (
+    PagedTaskListModel,
+    SearchController,
+    TaskListModel,
+    VirtualListView,
+    active_sort_key,
+    done_sort_key,
+    format_active_row,
+    format_done_row,
+)
+
+# How often tasks changed by other processes are picked up from the change
+# log, and how many changes are patched in before reloading the lists instead
+CHANGE_POLL_MS = 1000
+MAX_PATCHED_CHANGES = 500
+
+# Longest wait between recurrence ticks, which picks up rules added elsewhere
+RECURRENCE_TICK_MS = 60000
+
+ALL_TAGS = "All tags"
+
+DIAGNOSTICS_REFRESH_MS = 1000
+
+
+def archive_done_tasks(job, store, before):
+    return store.archive(before)
+
+
+def render_image_assets(job, source_dir, out_dir):
+    return render_all(source_dir, out_dir, job.raise_if_cancelled)
 
 
 def resource_path(relative_path):
@@ -23,28 +68,86 @@ class PyTaskyApp:
         self.root.title("PyTasky")
         self.root.geometry("1200x800")
 
-        # Set app icon
-        icon_path = resource_path("../icon.png")
-        if os.path.exists(icon_path):
-            try:
-                icon = tk.PhotoImage(file=icon_path)
-                self.root.iconphoto(True, icon)
-            except tk.TclError as e:
-                print(f"Error setting icon: {e}")
-
         # Load version
         version_path = resource_path("version.txt")
         with open(version_path, "r") as f:
             self.version = f.read().strip()
 
         # Timer variables
-        self.running = False
         self.custom_pomodoro = 25
-        self.time_left = self.custom_pomodoro * 60
         self.pomodoro_count = 0
+        self.on_break = False
+        self.timer = PomodoroTimer(
+            self.custom_pomodoro * 60,
+            self.root.after,
+            self.root.after_cancel,
+            on_tick=self.display_time,
+            on_finish=self.on_timer_finished,
+        )
+
+        # Reports run off the Tk thread so the timer keeps ticking
+        self.worker = BackgroundWorker(self.root.after)
+        self.report_job = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Pre-scaled logo and icon variants: bundled by the build, or
+        # rendered into a cache next to the database on first launch
+        self.asset_dirs = [resource_path("../build/assets"), cache_dir(DATABASE_PATH)]
+        # Rendering takes seconds of CPU, so it gets its own thread rather
+        # than holding up reports queued on self.worker
+        self.asset_worker = None
+        self.set_icon()
+        # Hidden diagnostics window with span timings (see instrument.py)
+        self.diagnostics_window = None
+        self.root.bind_all("<Control-Shift-D>", self.toggle_diagnostics)
+
+        # Task rows are cached in the store; the list models are patched per
+        # task instead of rebuilt. With PYTASKY_SERVER set they come from a
+        # sync server, which also pushes other clients' changes
+        self.store = open_store()
+        # Mark the end of the change log before loading anything, so changes
+        # made elsewhere from here on are replayed into the lists
+        self.store.sync()
+        self.pushed_changes = queue.Queue()
+        self.active_model = TaskListModel(format_active_row, active_sort_key)
+        self.active_tag = None
+        # Done history only grows, so it is fetched a page at a time
+        self.done_bucket = "All"
+        self.done_tag = None
+        self.done_model = PagedTaskListModel(
+            format_done_row,
+            done_sort_key,
+            self.fetch_done_page,
+            reverse=True,
+            page_size=DONE_PAGE_SIZE,
+        )
+
+        # List reloads and search refreshes are coalesced into one pass when
+        # Tk goes idle, and wait while their tab is hidden
+        self.refresher = RefreshScheduler(self.root.after_idle, self.root.after_cancel)
 
         # GUI Setup
         self.create_widgets()
+        for name, frame, refresh in (
+            ("active", self.active_frame, self.update_task_list),
+            ("done", self.done_frame, self.update_done_list),
+        ):
+            visible = partial(self.tab_visible, frame)
+            self.refresher.register(name, refresh, visible)
+            self.refresher.register(
+                name + ".search", partial(self.refresh_search, name), visible
+            )
+        if not self.store.listen(self.pushed_changes.put):
+            self.pushed_changes = None
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+
+        # Recurring tasks are added by the process owning the database: this
+        # one, or the sync server. Either way the new tasks come in through
+        # the change log. The first tick catches up on missed fire times
+        self.recurrences = None
+        if self.store.local:
+            self.recurrences = RecurrenceScheduler(self.store.session_factory)
+            self.root.after_idle(self.tick_recurrences)
 
     def create_widgets(self):
         main_frame = ttk.Frame(self.root)
@@ -54,7 +157,7 @@ class PyTaskyApp:
         self.notebook.pack(fill="both", expand=True)
 
         # Timer Tab (Active Tasks)
-        timer_frame = ttk.Frame(self.notebook, padding="10")
+        timer_frame = self.active_frame = ttk.Frame(self.notebook, padding="10")
         self.notebook.add(timer_frame, text="Active Tasks")
 
         self.time_label = ttk.Label(
@@ -116,6 +219,7 @@ class PyTaskyApp:
                 "done",
                 "cancelled",
             ],
+            state="readonly",
         )
         self.status_combo.set("todo")
         self.status_combo.grid(row=3, column=1, sticky="ew", pady=2)
@@ -129,23 +233,257 @@ class PyTaskyApp:
         )
         tasks_frame.pack(fill="both", expand=True)
 
-        self.task_list = tk.Listbox(tasks_frame)
+        self.searches = {}
+        search_entry, self.active_tag_combo = self.create_search_box(
+            tasks_frame, ACTIVE_STATUSES, self.set_active_tag
+        )
+        self.task_list = VirtualListView(tasks_frame, self.active_model)
         self.task_list.pack(fill="both", expand=True)
         self.task_list.bind("<Double-1>", self.open_edit_window)
+        self.create_bulk_bar(tasks_frame, self.task_list, ACTIVE_STATUSES)
+        self.add_search(
+            "active", search_entry, self.task_list, self.active_model, ACTIVE_STATUSES
+        )
         self.update_task_list()
 
-        # Done Tasks Tab
-        done_frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(done_frame, text="Done Tasks")
+        # The other tabs are only built when first selected
+        self.lazy_tabs = {}
+        self.done_frame = self.add_lazy_tab("Done Tasks", self.build_done_tab)
+        self.add_lazy_tab("Reports", self.build_reports_tab)
+        self.add_lazy_tab("About", self.build_about_tab)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+    def add_lazy_tab(self, text, builder):
+        frame = ttk.Frame(self.notebook, padding="10")
+        self.notebook.add(frame, text=text)
+        self.lazy_tabs[str(frame)] = (frame, builder)
+        return frame
+
+    def build_tab(self, tab_id):
+        entry = self.lazy_tabs.pop(str(tab_id), None)
+        if entry:
+            frame, builder = entry
+            builder(frame)
+
+    def on_tab_changed(self, event):
+        self.build_tab(self.notebook.select())
+        # Refreshes deferred while the tab was hidden
+        self.refresher.flush()
+
+    def tab_visible(self, frame):
+        return self.notebook.select() == str(frame)
+
+    @property
+    def done_list(self):
+        self.build_tab(self.done_frame)
+        return self._done_list
+
+    def build_done_tab(self, done_frame):
+        toolbar = ttk.Frame(done_frame)
+        toolbar.pack(fill="x", pady=(0, 5))
+        ttk.Label(toolbar, text="Completed:").pack(side="left")
+        self.done_bucket_combo = ttk.Combobox(
+            toolbar, values=DONE_BUCKETS, state="readonly", width=18
+        )
+        self.done_bucket_combo.set(self.done_bucket)
+        self.done_bucket_combo.pack(side="left", padx=5)
+        self.done_bucket_combo.bind("<<ComboboxSelected>>", self.set_done_filter)
+        self.archive_button = ttk.Button(
+            toolbar, text="Archive Old Tasks...", command=self.archive_old_tasks
+        )
+        self.archive_button.pack(side="right")
 
-        self.done_list = tk.Listbox(done_frame)
-        self.done_list.pack(fill="both", expand=True)
+        search_entry, self.done_tag_combo = self.create_search_box(
+            done_frame, DONE_STATUSES, self.set_done_filter
+        )
+        self._done_list = VirtualListView(done_frame, self.done_model)
+        self._done_list.pack(fill="both", expand=True)
+        self.create_bulk_bar(done_frame, self._done_list, DONE_STATUSES)
+        self.add_search(
+            "done", search_entry, self._done_list, self.done_model, DONE_STATUSES
+        )
         self.update_done_list()
 
-        # Report Tab
-        report_frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(report_frame, text="Reports")
+    def fetch_done_page(self, after, limit):
+        since, until = done_bucket_bounds(self.done_bucket)
+        key = after and (after.completed_at, after.id)
+        return self.store.done_page(key, limit, since, until, self.done_tag)
+
+    def set_done_filter(self, event=None):
+        self.done_bucket = self.done_bucket_combo.get()
+        self.done_tag = self.selected_tag(self.done_tag_combo)
+        since, until = done_bucket_bounds(self.done_bucket)
+        tag = self.done_tag
+
+        def in_filter(row):
+            if tag and not has_tag(row.tag, tag):
+                return False
+            if row.completed_at is None:
+                return since is None and until is None
+            return (since is None or row.completed_at >= since) and (
+                until is None or row.completed_at < until
+            )
+
+        self.done_model.accepts = in_filter
+        self.refresher.request("done")
+
+    def set_active_tag(self, event=None):
+        tag = self.active_tag = self.selected_tag(self.active_tag_combo)
+        self.active_model.accepts = lambda row: not tag or has_tag(row.tag, tag)
+        self.refresher.request("active")
+
+    def archive_old_tasks(self):
+        days = simpledialog.askinteger(
+            "Archive",
+            "Archive tasks completed more than how many days ago?",
+            initialvalue=365,
+            minvalue=1,
+            parent=self.root,
+        )
+        if days is None:
+            return
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        before = today - timedelta(days=days)
+        if not messagebox.askyesno(
+            "Archive",
+            f"Move tasks completed before {before:%Y-%m-%d} to the archive?",
+        ):
+            return
+        self.archive_button.config(state="disabled")
+        self.worker.submit(
+            archive_done_tasks,
+            self.store,
+            before,
+            on_done=self.on_archive_done,
+            on_error=self.on_archive_error,
+        )
+
+    def on_archive_done(self, count):
+        self.archive_button.config(state="normal")
+        self.refresher.request("done")
+        messagebox.showinfo("Archive", f"Archived {count:,} tasks")
+
+    def on_archive_error(self, error):
+        self.archive_button.config(state="normal")
+        messagebox.showerror("Archive", f"Archive failed: {error}")
+
+    def create_search_box(self, parent, statuses, on_tag):
+        """Search entry and tag filter combobox above a task list"""
+        search_frame = ttk.Frame(parent)
+        search_frame.pack(fill="x", pady=(0, 5))
+        ttk.Label(search_frame, text="Search:").pack(side="left")
+        entry = tk.Entry(search_frame)
+        entry.pack(side="left", fill="x", expand=True, padx=5)
+        tag_combo = self.create_tag_filter(search_frame, statuses)
+        tag_combo.pack(side="right")
+        tag_combo.bind("<<ComboboxSelected>>", on_tag)
+        ttk.Label(search_frame, text="Tag:").pack(side="right", padx=(5, 0))
+        return entry, tag_combo
+
+    def create_tag_filter(self, parent, statuses):
+        # Tags in use are listed from the tag index each time it drops down
+        combo = ttk.Combobox(parent, state="readonly", width=18)
+        combo.config(
+            postcommand=lambda: combo.config(
+                values=[ALL_TAGS]
+                + [name for name, _ in self.store.tag_counts(statuses)]
+            )
+        )
+        combo.set(ALL_TAGS)
+        return combo
+
+    def selected_tag(self, combo):
+        tag = combo.get()
+        return None if tag == ALL_TAGS else tag
+
+    def create_bulk_bar(self, parent, view, statuses):
+        """Buttons acting on every task selected in view (Ctrl/Shift+click)"""
+        bar = ttk.Frame(parent)
+        bar.pack(fill="x", pady=(5, 0))
+        ttk.Label(bar, text="Selected:").pack(side="left")
+        if statuses is ACTIVE_STATUSES:
+            ttk.Button(
+                bar,
+                text="Mark Done",
+                command=lambda: self.bulk_update(view, status="done"),
+            ).pack(side="left", padx=5)
+        status_combo = ttk.Combobox(
+            bar, values=ACTIVE_STATUSES + DONE_STATUSES, state="readonly", width=12
+        )
+        status_combo.set(statuses[0])
+        status_combo.pack(side="left", padx=(5, 0))
+        ttk.Button(
+            bar,
+            text="Set Status",
+            command=lambda: self.bulk_update(view, status=status_combo.get()),
+        ).pack(side="left", padx=5)
+        ttk.Button(bar, text="Retag...", command=lambda: self.bulk_retag(view)).pack(
+            side="left", padx=5
+        )
+        ttk.Button(bar, text="Delete...", command=lambda: self.bulk_delete(view)).pack(
+            side="left", padx=5
+        )
+        view.bind("<Delete>", lambda event: self.bulk_delete(view))
+        return bar
+
+    def bulk_update(self, view, status=None, tag=None):
+        """Set the status and/or tag of the tasks selected in view, as one write"""
+        task_ids = view.selected_ids()
+        if not task_ids:
+            return
+        rows = self.store.update_many(task_ids, status=status, tag=tag)
+        view.selection_clear()
+        self.apply_task_changes(rows)
 
+    def bulk_retag(self, view):
+        rows = view.selected_rows()
+        if not rows:
+            return
+        tag = simpledialog.askstring(
+            "Retag",
+            f"Tags for the {len(rows):,} selected tasks (comma-separated):",
+            initialvalue=(view.selected_row() or rows[0]).tag or "",
+            parent=self.root,
+        )
+        if tag is not None:
+            self.bulk_update(view, tag=tag.strip())
+
+    def bulk_delete(self, view):
+        task_ids = view.selected_ids()
+        if not task_ids:
+            return
+        if not messagebox.askyesno(
+            "Delete", f"Delete the {len(task_ids):,} selected tasks for good?"
+        ):
+            return
+        self.store.delete(task_ids)
+        view.selection_clear()
+        self.apply_task_changes([], task_ids)
+
+    def add_search(self, name, entry, view, model, statuses):
+        self.searches[name] = SearchController(
+            entry,
+            view,
+            model,
+            lambda text: self.search_rows(text, statuses),
+            self.root.after,
+            self.root.after_cancel,
+        )
+
+    def refresh_search(self, name):
+        search = self.searches.get(name)
+        if search is not None:
+            search.refresh()
+
+    def search_rows(self, text, statuses):
+        # Results respect the list's tag and bucket filters, applied in the
+        # query so they don't eat into its result limit
+        if statuses is DONE_STATUSES:
+            since, until = done_bucket_bounds(self.done_bucket)
+            return self.store.search(text, statuses, self.done_tag, since, until)
+        return self.store.search(text, statuses, self.active_tag)
+
+    def build_reports_tab(self, report_frame):
         filter_frame = ttk.LabelFrame(report_frame, text="Report Filters", padding="10")
         filter_frame.pack(fill="x", pady=5)
 
@@ -192,33 +530,131 @@ class PyTaskyApp:
         scrollbar.pack(side=tk.RIGHT, fill="y")
         self.status_filter.config(yscrollcommand=scrollbar.set)
 
+        ttk.Label(filter_frame, text="Tag:").grid(row=3, column=0, sticky="w", pady=2)
+        self.report_tag_combo = self.create_tag_filter(filter_frame, None)
+        self.report_tag_combo.grid(row=3, column=1, sticky="w", padx=5)
+
+        self.report_buttons = [
+            ttk.Button(
+                filter_frame,
+                text="Generate JSON Report",
+                command=lambda: self.generate_report("json"),
+            ),
+            ttk.Button(
+                filter_frame,
+                text="Generate CSV Report",
+                command=lambda: self.generate_report("csv"),
+            ),
+            ttk.Button(
+                filter_frame,
+                text="Generate NDJSON Report",
+                command=lambda: self.generate_report("ndjson"),
+            ),
+            ttk.Button(
+                filter_frame,
+                text="Generate Columnar Report",
+                command=lambda: self.generate_report("ptc"),
+            ),
+        ]
+        self.report_buttons[0].grid(row=4, column=0, pady=5)
+        self.report_buttons[1].grid(row=4, column=1, pady=5)
+        self.report_buttons[2].grid(row=5, column=0, pady=5)
+        self.report_buttons[3].grid(row=5, column=1, pady=5)
+
+        progress_frame = ttk.LabelFrame(report_frame, text="Progress", padding="10")
+        progress_frame.pack(fill="x", pady=5)
+        self.report_progress = ttk.Progressbar(progress_frame, mode="determinate")
+        self.report_progress.pack(side="left", fill="x", expand=True)
+        self.cancel_report_button = ttk.Button(
+            progress_frame,
+            text="Cancel",
+            command=self.cancel_report,
+            state="disabled",
+        )
+        self.cancel_report_button.pack(side="left", padx=5)
+        self.report_status_label = ttk.Label(report_frame, text="")
+        self.report_status_label.pack(fill="x")
+
+        analytics_frame = ttk.LabelFrame(report_frame, text="Analytics", padding="10")
+        analytics_frame.pack(fill="both", expand=True, pady=5)
         ttk.Button(
-            filter_frame,
-            text="Generate JSON Report",
-            command=lambda: self.generate_report("json"),
-        ).grid(row=3, column=0, pady=5)
-        ttk.Button(
-            filter_frame,
-            text="Generate CSV Report",
-            command=lambda: self.generate_report("csv"),
-        ).grid(row=3, column=1, pady=5)
+            analytics_frame, text="Show Analytics", command=self.show_analytics
+        ).pack(anchor="w")
+        columns = ("tag", "done", "cancelled", "median", "mean")
+        self.analytics_tree = ttk.Treeview(
+            analytics_frame, columns=columns, show="headings", height=8
+        )
+        for column, heading in zip(
+            columns,
+            ["Tag", "Done", "Cancelled", "Median cycle (h)", "Mean cycle (h)"],
+        ):
+            self.analytics_tree.heading(column, text=heading)
+        self.analytics_tree.pack(fill="both", expand=True, pady=5)
+        self.analytics_label = ttk.Label(analytics_frame, text="")
+        self.analytics_label.pack(anchor="w")
+
+        breakdown_frame = ttk.Frame(analytics_frame)
+        breakdown_frame.pack(fill="both", expand=True, pady=5)
+        self.per_day_tree = ttk.Treeview(
+            breakdown_frame, columns=("day", "tag", "done"), show="headings", height=6
+        )
+        for column, heading in zip(("day", "tag", "done"), ["Day", "Tag", "Done"]):
+            self.per_day_tree.heading(column, text=heading)
+        self.per_day_tree.pack(side="left", fill="both", expand=True, padx=(0, 5))
+        self.per_task_tree = ttk.Treeview(
+            breakdown_frame, columns=("task", "pomodoros"), show="headings", height=6
+        )
+        for column, heading in zip(("task", "pomodoros"), ["Task", "Pomodoros"]):
+            self.per_task_tree.heading(column, text=heading)
+        self.per_task_tree.pack(side="left", fill="both", expand=True)
 
-        # About Tab
-        about_frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(about_frame, text="About")
+    def set_icon(self):
+        icon_path = resource_path("../icon.png")
+        if not os.path.exists(icon_path):
+            return
+        variants = {
+            find_variant(icon_path, size, self.asset_dirs) for size in ICON_SIZES
+        }
+        variants.discard(None)
+        try:
+            if variants:
+                self.icons = [tk.PhotoImage(file=path) for path in sorted(variants)]
+            else:
+                self.icons = [tk.PhotoImage(file=icon_path)]
+                self.render_assets()
+            self.root.iconphoto(True, *self.icons)
+        except tk.TclError as e:
+            print(f"Error setting icon: {e}")
+
+    def render_assets(self):
+        """Render the image variants in the background, for the next launch.
+        Builds that bundle them never need to"""
+        if os.path.isdir(self.asset_dirs[0]) or self.asset_worker:
+            return
+        self.asset_worker = BackgroundWorker(self.root.after)
+        self.asset_worker.submit(
+            render_image_assets,
+            os.path.dirname(resource_path("../icon.png")),
+            self.asset_dirs[-1],
+            on_error=lambda error: print(f"Error rendering image assets: {error}"),
+        )
 
+    def build_about_tab(self, about_frame):
         logo_path = resource_path("../logo.png")
         if os.path.exists(logo_path):
-            logo = tk.PhotoImage(file=logo_path)
-            self.root.update()
+            # The window is mapped once a tab is shown, so its width is known
+            # without forcing a layout pass
             window_width = self.root.winfo_width()
-            logo_width = int(window_width * 0.2)
-            original_width = logo.width()
-            original_height = logo.height()
-            logo_height = int(logo_width * original_height / original_width)
-            logo = logo.subsample(
-                int(original_width / logo_width), int(original_height / logo_height)
-            )
+            if window_width <= 1:
+                window_width = 1200
+            logo_width = window_width // 5
+            variant = find_variant(logo_path, logo_width, self.asset_dirs)
+            if variant:
+                logo = tk.PhotoImage(file=variant)
+            else:
+                logo = tk.PhotoImage(file=logo_path)
+                factor = max(1, logo.width() // logo_width)
+                logo = logo.subsample(factor, factor)
             ttk.Label(about_frame, image=logo).pack(pady=10)
             about_frame.image = logo
 
@@ -235,40 +671,56 @@ https://github.com/elephantatech/pyTasky
             minutes = int(self.custom_entry.get())
             if minutes > 0:
                 self.custom_pomodoro = minutes
-                self.time_left = minutes * 60
-                self.time_label.config(text=f"{minutes:02d}:00")
+                self.on_break = False
+                self.timer.reset(minutes * 60)
             else:
                 messagebox.showwarning("Input Error", "Please enter a positive number!")
         except ValueError:
             messagebox.showwarning("Input Error", "Please enter a valid number!")
 
-    def update_timer(self):
-        if self.running and self.time_left > 0:
-            self.time_left -= 1
-            minutes = self.time_left // 60
-            seconds = self.time_left % 60
-            self.time_label.config(text=f"{minutes:02d}:{seconds:02d}")
-            self.root.after(1000, self.update_timer)
-        elif self.running and self.time_left == 0:
-            self.running = False
-            self.pomodoro_count += 1
-            messagebox.showinfo("PyTasky", "Time's up! Take a break.")
-            self.update_status_to_done()
+    @property
+    def running(self):
+        return self.timer.running
+
+    @running.setter
+    def running(self, value):
+        if value:
+            self.timer.start()
+        else:
+            self.timer.pause()
+
+    @property
+    def time_left(self):
+        return self.timer.remaining_seconds
+
+    def display_time(self, seconds_left):
+        minutes = seconds_left // 60
+        seconds = seconds_left % 60
+        self.time_label.config(text=f"{minutes:02d}:{seconds:02d}")
+
+    def on_timer_finished(self):
+        self.pomodoro_count += 1
+        if not self.on_break:
+            self.record_pomodoro()
+        messagebox.showinfo("PyTasky", "Time's up! Take a break.")
+        self.update_status_to_done()
 
     def start_timer(self):
-        if not self.running:
-            self.running = True
-            self.update_timer()
+        self.timer.start()
 
     def stop_timer(self):
-        self.running = False
+        self.timer.pause()
 
     def set_break(self, minutes):
-        self.running = False
-        self.time_left = minutes * 60
-        minutes = self.time_left // 60
-        seconds = self.time_left % 60
-        self.time_label.config(text=f"{minutes:02d}:{seconds:02d}")
+        self.on_break = True
+        self.timer.reset(minutes * 60)
+
+    def record_pomodoro(self):
+        """Persist the finished pomodoro against the selected task, if any"""
+        task_id = self.task_list.selected_id()
+        ended = datetime.now()
+        started = ended - timedelta(seconds=self.timer.duration)
+        self.store.record_pomodoro(task_id, started, ended)
 
     def add_task(self):
         title = self.title_entry.get().strip()
@@ -279,41 +731,23 @@ https://github.com/elephantatech/pyTasky
         notes = self.notes_entry.get().strip()
         tag = self.tag_entry.get().strip()
         status = self.status_combo.get()
-        now = datetime.now()
-
-        session = get_session()
-        task = Task(
-            title=title,
-            notes=notes,
-            tag=tag,
-            status=status,
-            created_at=now,
-            last_updated=now,
-        )
-        if status in ["done", "cancelled"]:
-            task.completed_at = now
-        session.add(task)
-        session.commit()
-        session.close()
+        try:
+            row = self.store.add(title, notes, tag, status)
+        except ValueError as error:
+            messagebox.showwarning("Input Error", str(error))
+            return
 
         self.clear_input_fields()
-        self.update_task_list()
-        self.update_done_list()
+        self.apply_task_change(row)
 
     def open_edit_window(self, event):
-        selected = self.task_list.curselection()
-        if not selected:
-            return
-
-        task_index = selected[0]
-        task_text = self.task_list.get(task_index)
-        task_id = int(task_text.split(".")[0])
-
-        session = get_session()
-        task = session.query(Task).filter(Task.id == task_id).first()
+        # The dialog edits a detached snapshot of the row the list already
+        # holds: no session stays open while it is up, and saving is one
+        # short transaction that checks the task is unchanged since
+        task = self.task_list.selected_row()
         if not task:
-            session.close()
             return
+        task_id = task.id
 
         edit_window = tk.Toplevel(self.root)
         edit_window.title(f"Edit Task {task_id}")
@@ -346,6 +780,7 @@ https://github.com/elephantatech/pyTasky
                 "done",
                 "cancelled",
             ],
+            state="readonly",
         )
         status_combo.set(task.status)
         status_combo.pack(fill="x", padx=10)
@@ -378,51 +813,51 @@ https://github.com/elephantatech/pyTasky
                 messagebox.showwarning("Input Error", "Title is required!")
                 return
 
-            new_notes = notes_entry.get().strip()
-            new_tag = tag_entry.get().strip()
-            new_status = status_combo.get()
-            now = datetime.now()
-
-            task.title = new_title
-            task.notes = new_notes
-            task.tag = new_tag
-            task.status = new_status
-            task.last_updated = now
-            if new_status in ["done", "cancelled"]:
-                task.completed_at = now
+            fields = {
+                "title": new_title,
+                "notes": notes_entry.get().strip(),
+                "tag": tag_entry.get().strip(),
+                "status": status_combo.get(),
+            }
+            try:
+                # Saved only if nobody changed the task since the snapshot
+                row = self.store.update(
+                    task_id, expected_updated=task.last_updated, **fields
+                )
+            except StaleTaskError:
+                if messagebox.askyesno(
+                    "Edit Conflict",
+                    f"Task {task_id} was changed elsewhere after you opened it.\n"
+                    "Save your changes over the other ones?",
+                    parent=edit_window,
+                ):
+                    row = self.store.update(task_id, **fields)
+                else:
+                    row = self.store.invalidate(task_id)
+            except ValueError as error:
+                # A status the store does not know, e.g. one kept from
+                # before statuses were checked; the dialog stays open
+                messagebox.showwarning("Input Error", str(error), parent=edit_window)
+                return
+            if row:
+                self.apply_task_change(row)
             else:
-                task.completed_at = None
-
-            session.commit()
-            session.close()
-
-            self.update_task_list()
-            self.update_done_list()
+                # Deleted elsewhere meanwhile
+                self.apply_task_changes([], [task_id])
             edit_window.destroy()
 
         ttk.Button(edit_window, text="Save", command=save_changes).pack(pady=10)
 
     def update_status_to_done(self):
-        selected = self.task_list.curselection()
-        if selected:
-            task_index = selected[0]
-            task_text = self.task_list.get(task_index)
-            task_id = int(task_text.split(".")[0])
-
-            session = get_session()
-            task = session.query(Task).filter(Task.id == task_id).first()
-            if task:
-                now = datetime.now()
-                task.status = "done"
-                task.completed_at = now
-                task.last_updated = now
-                session.commit()
-            session.close()
+        """Complete the task the finished pomodoro was recorded against"""
+        task_id = self.task_list.selected_id()
+        if task_id is not None:
+            row = self.store.update(task_id, status="done")
 
             self.clear_input_fields()
             self.task_list.selection_clear(0, tk.END)
-            self.update_task_list()
-            self.update_done_list()
+            if row:
+                self.apply_task_change(row)
 
     def clear_input_fields(self):
         self.title_entry.delete(0, tk.END)
@@ -430,46 +865,93 @@ https://github.com/elephantatech/pyTasky
         self.tag_entry.delete(0, tk.END)
         self.status_combo.set("todo")
 
-    def update_task_list(self):
-        self.task_list.delete(0, tk.END)
-        session = get_session()
-        tasks = (
-            session.query(Task)
-            .filter(
-                Task.status.in_(["todo", "in-progress", "blocked", "testing", "verify"])
-            )
-            .order_by(Task.id)
-            .all()
-        )
-        for task in tasks:
-            task_text = f"{task.id}. {task.title} [{task.status} - Created: {task.created_at.strftime('%Y-%m-%d %H:%M:%S') if task.created_at else 'N/A'} - Updated: {task.last_updated.strftime('%Y-%m-%d %H:%M:%S') if task.last_updated else 'N/A'}]"
-            if task.tag:
-                task_text += f" - {task.tag}"
-            self.task_list.insert(tk.END, task_text)
-        session.close()
+    def apply_task_change(self, row):
+        """Patch both lists with a single changed task instead of reloading them"""
+        self.apply_task_changes([row])
 
+    def apply_task_changes(self, rows, deleted_ids=()):
+        """Patch both lists with changed and deleted tasks, and schedule one
+        search refresh; more than MAX_PATCHED_CHANGES reload the lists instead"""
+        if len(rows) + len(deleted_ids) > MAX_PATCHED_CHANGES:
+            self.refresher.request("active", "done")
+        else:
+            deleted_ids = list(deleted_ids)
+            for row in rows:
+                if row.status in ACTIVE_STATUSES:
+                    self.done_model.remove(row.id)
+                    self.active_model.upsert(row)
+                elif row.status in DONE_STATUSES:
+                    self.active_model.remove(row.id)
+                    self.done_model.upsert(row)
+                else:
+                    deleted_ids.append(row.id)
+            for task_id in deleted_ids:
+                self.active_model.remove(task_id)
+                self.done_model.remove(task_id)
+        self.refresher.request("active.search", "done.search")
+
+    @traced("poll_changes")
+    def poll_changes(self):
+        """Patch the lists with tasks changed elsewhere, then poll again"""
+        if self.pushed_changes is None:
+            changes = self.store.sync()
+        else:
+            changes = []
+            while True:
+                try:
+                    changes += self.pushed_changes.get_nowait()
+                except queue.Empty:
+                    break
+        if len(changes) > MAX_PATCHED_CHANGES:
+            self.refresher.request("active", "done")
+        elif changes:
+            # Only the latest state of each task matters
+            ops = {change.task_id: change.op for change in changes}
+            rows, deleted_ids = [], []
+            for task_id, op in ops.items():
+                row = self.store.get(task_id) if op != "delete" else None
+                if row is None:
+                    deleted_ids.append(task_id)
+                else:
+                    rows.append(row)
+            self.apply_task_changes(rows, deleted_ids)
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+
+    @traced("tick_recurrences")
+    def tick_recurrences(self):
+        """Add due recurring tasks, then tick again when the next one is due"""
+        try:
+            self.recurrences.tick()
+        finally:
+            delay = RECURRENCE_TICK_MS
+            next_fire_at = self.recurrences.next_fire_at()
+            if next_fire_at is not None:
+                due_in = (next_fire_at - datetime.now()).total_seconds()
+                delay = max(0, min(delay, int(due_in * 1000) + 1))
+            self.root.after(delay, self.tick_recurrences)
+
+    @traced("update_task_list")
+    def update_task_list(self):
+        rows = self.store.rows(ACTIVE_STATUSES)
+        if self.active_tag:
+            tagged = self.store.tagged_ids(self.active_tag)
+            rows = [row for row in rows if row.id in tagged]
+        self.active_model.load(rows)
+        self.refresher.mark_clean("active")
+
+    @traced("update_done_list")
     def update_done_list(self):
-        self.done_list.delete(0, tk.END)
-        session = get_session()
-        tasks = (
-            session.query(Task)
-            .filter(Task.status.in_(["done", "cancelled"]))
-            .order_by(Task.completed_at.desc())
-            .all()
-        )
-        for task in tasks:
-            task_text = f"{task.id}. {task.title} [{task.status} - Created: {task.created_at.strftime('%Y-%m-%d %H:%M:%S') if task.created_at else 'N/A'} - Completed: {task.completed_at.strftime('%Y-%m-%d %H:%M:%S') if task.completed_at else 'N/A'} - Updated: {task.last_updated.strftime('%Y-%m-%d %H:%M:%S') if task.last_updated else 'N/A'}]"
-            if task.tag:
-                task_text += f" - {task.tag}"
-            self.done_list.insert(tk.END, task_text)
-        session.close()
+        self.done_model.reload()
+        self.refresher.mark_clean("done")
 
+    @traced("generate_report")
     def generate_report(self, format_type):
         start_date = self.start_date_entry.get().strip()
         end_date = self.end_date_entry.get().strip()
         selected_statuses = [
             self.status_filter.get(i) for i in self.status_filter.curselection()
         ]
+        tag = self.selected_tag(self.report_tag_combo)
 
         try:
             start_dt = datetime.strptime(start_date, "%Y-%m-%d")
@@ -480,110 +962,213 @@ https://github.com/elephantatech/pyTasky
             )
             return
 
-        session = get_session()
-        if not selected_statuses:
-            tasks = (
-                session.query(Task)
-                .filter(Task.created_at >= start_dt, Task.created_at <= end_dt)
-                .all()
-            )
-        else:
-            tasks = (
-                session.query(Task)
-                .filter(
-                    Task.created_at >= start_dt,
-                    Task.created_at <= end_dt,
-                    Task.status.in_(selected_statuses),
-                )
-                .all()
-            )
-
-        if not tasks:
+        if not self.store.has_report_rows(start_dt, end_dt, selected_statuses, tag):
             messagebox.showinfo("Report", "No tasks match the selected filters!")
-            session.close()
             return
 
-        task_data = [
-            (
-                t.id,
-                t.title,
-                t.notes,
-                t.tag,
-                t.status,
-                t.created_at.strftime("%Y-%m-%d %H:%M:%S") if t.created_at else None,
-                (
-                    t.completed_at.strftime("%Y-%m-%d %H:%M:%S")
-                    if t.completed_at
-                    else None
-                ),
-                (
-                    t.last_updated.strftime("%Y-%m-%d %H:%M:%S")
-                    if t.last_updated
-                    else None
-                ),
-            )
-            for t in tasks
-        ]
-
         filename = filedialog.asksaveasfilename(
             defaultextension=f".{format_type}",
             filetypes=[(f"{format_type.upper()} files", f"*.{format_type}")],
             initialfile=f"pytasky_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
         )
         if not filename:
-            session.close()
             return
 
-        if format_type == "json":
-            report = [
-                {
-                    "id": t.id,
-                    "title": t.title,
-                    "notes": t.notes,
-                    "tag": t.tag,
-                    "status": t.status,
-                    "created_at": (
-                        t.created_at.strftime("%Y-%m-%d %H:%M:%S")
-                        if t.created_at
-                        else None
-                    ),
-                    "completed_at": (
-                        t.completed_at.strftime("%Y-%m-%d %H:%M:%S")
-                        if t.completed_at
-                        else None
-                    ),
-                    "last_updated": (
-                        t.last_updated.strftime("%Y-%m-%d %H:%M:%S")
-                        if t.last_updated
-                        else None
-                    ),
-                }
-                for t in tasks
-            ]
-            with open(filename, "w") as f:
-                json.dump(report, f, indent=2)
-        elif format_type == "csv":
-            with open(filename, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    [
-                        "ID",
-                        "Title",
-                        "Notes",
-                        "Tag",
-                        "Status",
-                        "Created At",
-                        "Completed At",
-                        "Last Updated",
-                    ]
-                )
-                writer.writerows(task_data)
+        self.set_report_running(True)
+        self.report_status_label.config(text="Counting tasks...")
+        self.report_job = self.worker.submit(
+            self.store.export,
+            filename,
+            format_type,
+            start_dt,
+            end_dt,
+            selected_statuses,
+            tag,
+            on_progress=self.on_report_progress,
+            on_done=lambda count: self.on_report_done(filename, count),
+            on_error=self.on_report_error,
+            on_cancel=self.on_report_cancelled,
+        )
+
+    def show_analytics(self):
+        try:
+            start_dt = datetime.strptime(
+                self.start_date_entry.get().strip(), "%Y-%m-%d"
+            )
+            end_dt = datetime.strptime(self.end_date_entry.get().strip(), "%Y-%m-%d")
+        except ValueError:
+            messagebox.showwarning(
+                "Filter Error", "Dates must be in YYYY-MM-DD format!"
+            )
+            return
+
+        stats = self.store.stats(start_dt, end_dt)
+        summary, median = stats["tags"], stats["median_cycle_s"]
+        pomodoros, totals = stats["pomodoros"], stats["totals"]
+        per_day, per_task = stats["completed_per_day"], stats["pomodoros_per_task"]
+
+        def hours(seconds):
+            return f"{seconds / 3600:.1f}" if seconds is not None else "N/A"
+
+        self.analytics_tree.delete(*self.analytics_tree.get_children())
+        for tag in sorted(summary):
+            stats = summary[tag]
+            self.analytics_tree.insert(
+                "",
+                tk.END,
+                values=(
+                    tag or "(no tag)",
+                    stats["done"],
+                    stats["cancelled"],
+                    hours(stats["median_cycle_s"]),
+                    hours(stats["mean_cycle_s"]),
+                ),
+            )
+        done = totals.get("done", 0)
+        text = (
+            f"{done} tasks done, median cycle time {hours(median)} h - "
+            f"{pomodoros['pomodoros']} pomodoros"
+        )
+        if pomodoros["per_task"]:
+            text += (
+                f" ({pomodoros['focus_hours']:.1f} h focus, "
+                f"{pomodoros['per_task']:.1f} per task)"
+            )
+        self.analytics_label.config(text=text)
+
+        self.per_day_tree.delete(*self.per_day_tree.get_children())
+        for row in per_day:
+            self.per_day_tree.insert(
+                "", tk.END, values=(row["day"], row["tag"] or "(no tag)", row["done"])
+            )
+        self.per_task_tree.delete(*self.per_task_tree.get_children())
+        for row in per_task:
+            self.per_task_tree.insert(
+                "", tk.END, values=(f"{row['id']}. {row['title']}", row["pomodoros"])
+            )
 
+    def set_report_running(self, running):
+        state = "disabled" if running else "normal"
+        for button in self.report_buttons:
+            button.config(state=state)
+        self.cancel_report_button.config(state="normal" if running else "disabled")
+        if not running:
+            self.report_job = None
+
+    def cancel_report(self):
+        if self.report_job:
+            self.report_job.cancel()
+            self.report_status_label.config(text="Cancelling...")
+
+    def on_report_progress(self, done, total):
+        self.report_progress.config(maximum=max(total, 1), value=done)
+        self.report_status_label.config(text=f"Exported {done:,} of {total:,} tasks")
+
+    def on_report_done(self, filename, count):
+        self.set_report_running(False)
+        self.report_status_label.config(text=f"Exported {count:,} tasks")
         messagebox.showinfo("Report", f"Report saved as {filename}")
-        session.close()
+
+    def on_report_cancelled(self):
+        self.set_report_running(False)
+        self.report_progress.config(value=0)
+        self.report_status_label.config(text="Report cancelled")
+
+    def on_report_error(self, error):
+        self.set_report_running(False)
+        self.report_progress.config(value=0)
+        self.report_status_label.config(text="Report failed")
+        messagebox.showerror("Report", f"Report failed: {error}")
+
+    def toggle_diagnostics(self, event=None):
+        if self.diagnostics_window is not None:
+            self.diagnostics_window.destroy()
+            self.diagnostics_window = None
+            return
+        window = self.diagnostics_window = tk.Toplevel(self.root)
+        window.title("Diagnostics")
+        window.geometry("560x400")
+        window.protocol("WM_DELETE_WINDOW", self.toggle_diagnostics)
+
+        toolbar = ttk.Frame(window, padding="5")
+        toolbar.pack(fill="x")
+        recording = tk.BooleanVar(value=tracer.enabled)
+
+        def set_recording():
+            if not recording.get():
+                tracer.disable()
+            elif not enable_from_environment():
+                tracer.enable()
+
+        ttk.Checkbutton(
+            toolbar, text="Record", variable=recording, command=set_recording
+        ).pack(side="left")
+        ttk.Button(toolbar, text="Reset", command=tracer.reset).pack(
+            side="left", padx=5
+        )
+        self.diagnostics_label = ttk.Label(toolbar, text="")
+        self.diagnostics_label.pack(side="left", padx=5)
+
+        columns = ("span", "count", "total", "mean", "max")
+        self.diagnostics_tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, heading in zip(
+            columns, ["Span", "Count", "Total (ms)", "Mean (ms)", "Max (ms)"]
+        ):
+            self.diagnostics_tree.heading(column, text=heading)
+            self.diagnostics_tree.column(column, width=80, anchor="e")
+        self.diagnostics_tree.column("span", width=200, anchor="w")
+        self.diagnostics_tree.pack(fill="both", expand=True, padx=5, pady=5)
+        self.refresh_diagnostics(window)
+
+    def refresh_diagnostics(self, window):
+        """Show the span totals, then refresh again while the window is open"""
+        if window is not self.diagnostics_window:
+            return
+        if tracer.trace_path:
+            status = f"Tracing to {tracer.trace_path}"
+        else:
+            status = "Recording" if tracer.enabled else "Not recording"
+        counters = self.refresher.counters()
+        status += (
+            f" | List refreshes: {counters['ran']} run,"
+            f" {counters['avoided']} avoided ({counters['coalesced']} coalesced,"
+            f" {counters['deferred']} deferred while hidden)"
+        )
+        self.diagnostics_label.config(text=status)
+        tree = self.diagnostics_tree
+        tree.delete(*tree.get_children())
+        for name, stats in tracer.summary():
+            tree.insert(
+                "",
+                "end",
+                values=(
+                    name,
+                    stats.count,
+                    f"{stats.total_s * 1000:.1f}",
+                    f"{stats.mean_s * 1000:.2f}",
+                    f"{stats.max_s * 1000:.2f}",
+                ),
+            )
+        self.root.after(DIAGNOSTICS_REFRESH_MS, self.refresh_diagnostics, window)
+
+    def on_close(self):
+        self.refresher.close()
+        self.worker.shutdown()
+        if self.asset_worker:
+            self.asset_worker.shutdown()
+        self.store.close()
+        tracer.disable()
+        self.root.destroy()
 
 
 def main():
+    if len(sys.argv) > 1:
+        # Any arguments select the headless command line interface
+        from cli import main as cli_main
+
+        sys.exit(cli_main(sys.argv[1:]))
+
+    enable_from_environment()
     root = tk.Tk()
     app = PyTaskyApp(root)
     root.mainloop()
@@ -0,0 +1,318 @@
+"""Recurring tasks: rules that add a fresh copy of a task each time they fire.
+
+A rule is one of
+
+    daily 09:00
+    weekdays 09:30
+    weekly mon,thu 14:00
+    monthly 1 08:00             (day of the month)
+    cron 30 9 * * 1-5           (minute hour day-of-month month day-of-week)
+
+Rules live in the recurrences table with the next time each one fires. A
+RecurrenceScheduler keeps those times in a min-heap, so a tick only looks at
+the rules that are due, and adds all of their tasks with one INSERT. Fire
+times missed while nothing was running are caught up from the stored time,
+each as its own task created at that time.
+"""
+
+import heapq
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from models import (
+    ACTIVE_STATUSES,
+    Recurrence,
+    Task,
+    get_session,
+    link_tags_after,
+)
+
+DAY_NAMES = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+MONTH_NAMES = [
+    "jan",
+    "feb",
+    "mar",
+    "apr",
+    "may",
+    "jun",
+    "jul",
+    "aug",
+    "sep",
+    "oct",
+    "nov",
+    "dec",
+]
+
+# Missed fire times caught up per rule and tick; the rest follow next tick
+CATCH_UP_LIMIT = 100
+
+# Long enough for a rule that only fires on 29 February
+SEARCH_DAYS = 8 * 366
+
+
+def _parse_field(text, name, low, high, names=()):
+    """Set of the values a cron field matches, e.g. "1-5", "*/15", "mon,thu" """
+
+    def value(token):
+        if token in names:
+            return names.index(token) + low
+        return int(token)
+
+    values = set()
+    try:
+        for part in text.lower().split(","):
+            part, _, step = part.partition("/")
+            if part == "*":
+                start, end = low, high
+            else:
+                start, _, end = part.partition("-")
+                start = value(start)
+                end = value(end) if end else (high if step else start)
+            step = int(step) if step else 1
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError
+            values.update(range(start, end + 1, step))
+    except ValueError:
+        raise ValueError(f"bad {name} field {text!r}") from None
+    return values
+
+
+class Schedule:
+    """The fire times of a rule, as the cron fields it stands for"""
+
+    def __init__(self, minute, hour, day, month, weekday):
+        minutes = _parse_field(minute, "minute", 0, 59)
+        hours = _parse_field(hour, "hour", 0, 23)
+        self.days = _parse_field(day, "day of month", 1, 31)
+        self.months = _parse_field(month, "month", 1, 12, MONTH_NAMES)
+        # Cron counts weekdays from Sunday (0 or 7), Python from Monday
+        self.weekdays = {
+            (value - 1) % 7
+            for value in _parse_field(weekday, "day of week", 0, 7, DAY_NAMES)
+        }
+        # As in cron, a day matches either field when both are restricted
+        self.any_day = day == "*"
+        self.any_weekday = weekday == "*"
+        self.times = sorted((h, m) for h in hours for m in minutes)
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        by_day = day.day in self.days
+        by_weekday = day.weekday() in self.weekdays
+        if self.any_day or self.any_weekday:
+            return by_day and by_weekday
+        return by_day or by_weekday
+
+    def next_after(self, after):
+        """The first fire time later than ``after``"""
+        start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        first = bisect_left(self.times, (start.hour, start.minute))
+        for _ in range(SEARCH_DAYS):
+            if self._day_matches(day) and first < len(self.times):
+                return datetime.combine(day, time(*self.times[first]))
+            day += timedelta(days=1)
+            first = 0
+        raise ValueError("rule never fires")
+
+
+def _clock(text):
+    hour, sep, minute = text.partition(":")
+    if not sep or not hour.isdigit() or not minute.isdigit():
+        raise ValueError(f"bad time {text!r}, expected HH:MM")
+    return str(int(minute)), str(int(hour))
+
+
+def parse_rule(rule):
+    """Schedule of a rule in one of the forms listed in the module docstring"""
+    kind, *args = rule.lower().split() or [""]
+    if kind == "cron" and len(args) == 5:
+        schedule = Schedule(*args)
+    elif kind == "daily" and len(args) == 1:
+        schedule = Schedule(*_clock(args[0]), "*", "*", "*")
+    elif kind == "weekdays" and len(args) == 1:
+        schedule = Schedule(*_clock(args[0]), "*", "*", "1-5")
+    elif kind == "weekly" and len(args) == 2:
+        schedule = Schedule(*_clock(args[1]), "*", "*", args[0])
+    elif kind == "monthly" and len(args) == 2:
+        schedule = Schedule(*_clock(args[1]), args[0], "*", "*")
+    else:
+        raise ValueError(f"unknown recurrence rule {rule!r}")
+    return schedule
+
+
+class RecurrenceScheduler:
+    """Adds the tasks of due recurrences, one transaction per tick.
+
+    The next fire time of every rule sits in a min-heap, so a tick costs a
+    heap pop per due rule (and a primary key lookup for rules added since the
+    last one) rather than a scan of them all. Rules deleted meanwhile leave
+    their heap entry behind until it comes up.
+
+    Advancing a rule's next_fire_at is conditional on the value read in the
+    same transaction, so two schedulers on one database (the window and a
+    ``recur run`` from the command line, say) never add the same task twice.
+    """
+
+    def __init__(self, session_factory=None, catch_up_limit=CATCH_UP_LIMIT):
+        self.session_factory = session_factory
+        self.catch_up_limit = catch_up_limit
+        self._heap = []
+        # Rules up to this id are in the heap; ids are never reused
+        self._loaded_id = 0
+        self.created = 0
+
+    @contextmanager
+    def _session(self):
+        session = (self.session_factory or get_session)()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def _load_new(self, session):
+        rows = session.execute(
+            select(Recurrence.id, Recurrence.next_fire_at).where(
+                Recurrence.id > self._loaded_id
+            )
+        )
+        for rule_id, fire_at in rows:
+            heapq.heappush(self._heap, (fire_at, rule_id))
+            self._loaded_id = max(self._loaded_id, rule_id)
+
+    def add(self, title, rule, notes="", tag="", status="todo", after=None):
+        """Store a rule firing from after ``after`` (default now); returns it"""
+        if not title:
+            raise ValueError("title is required")
+        if status not in ACTIVE_STATUSES:
+            raise ValueError(f"recurring tasks need an active status, not {status!r}")
+        now = datetime.now()
+        recurrence = Recurrence(
+            title=title,
+            notes=notes,
+            tag=tag,
+            status=status,
+            rule=rule,
+            next_fire_at=parse_rule(rule).next_after(after or now),
+            created_at=now,
+        )
+        with self._session() as session:
+            session.add(recurrence)
+            session.commit()
+            session.refresh(recurrence)
+            session.expunge(recurrence)
+        return recurrence
+
+    def remove(self, rule_id):
+        """Delete a rule; returns whether it existed"""
+        with self._session() as session:
+            count = session.execute(
+                delete(Recurrence).where(Recurrence.id == rule_id)
+            ).rowcount
+            session.commit()
+        return count > 0
+
+    def rules(self):
+        """Every rule, soonest first"""
+        with self._session() as session:
+            rules = session.scalars(
+                select(Recurrence).order_by(Recurrence.next_fire_at, Recurrence.id)
+            ).all()
+            session.expunge_all()
+        return rules
+
+    def next_fire_at(self):
+        """When the next known rule fires, or None without any"""
+        return self._heap[0][0] if self._heap else None
+
+    def tick(self, now=None):
+        """Add the tasks of every rule due by ``now``; returns how many"""
+        now = now or datetime.now()
+        due = []
+        with self._session() as session:
+            self._load_new(session)
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+            if not due:
+                return 0
+            try:
+                result = self._materialize(session, due, now)
+                if result is None:
+                    # Another scheduler fired some of these first; the next
+                    # tick rereads their stored times
+                    session.rollback()
+                    result = 0, due
+                else:
+                    session.commit()
+            except BaseException:
+                self._push(due)
+                raise
+        count, requeue = result
+        self._push(requeue)
+        self.created += count
+        return count
+
+    def _push(self, entries):
+        for entry in entries:
+            heapq.heappush(self._heap, entry)
+
+    def _materialize(self, session, due, now):
+        """Add the tasks of the due heap entries in ``session``; returns their
+        count and the entries to push back, or None if a rule was claimed
+        by another scheduler"""
+        ids = [rule_id for _, rule_id in due]
+        rules = session.scalars(select(Recurrence).where(Recurrence.id.in_(ids)))
+        tasks, claims, requeue = [], [], []
+        for rule in rules:
+            # The stored time wins over the heap's: another scheduler may
+            # have fired the rule already
+            fired_at, fire_at = rule.next_fire_at, rule.next_fire_at
+            if fire_at <= now:
+                schedule = parse_rule(rule.rule)
+                fired = []
+                while fire_at <= now and len(fired) < self.catch_up_limit:
+                    fired.append(fire_at)
+                    fire_at = schedule.next_after(fire_at)
+                tasks += [
+                    {
+                        "title": rule.title,
+                        "notes": rule.notes,
+                        "tag": rule.tag,
+                        "status": rule.status,
+                        "created_at": created_at,
+                        "completed_at": None,
+                        "last_updated": now,
+                    }
+                    for created_at in fired
+                ]
+                claims.append(
+                    {
+                        "rule_id": rule.id,
+                        "fired_at": fired_at,
+                        "next_at": fire_at,
+                        "last_at": fired[-1],
+                    }
+                )
+            requeue.append((fire_at, rule.id))
+        if claims:
+            table = Recurrence.__table__
+            claimed = session.execute(
+                update(table)
+                .where(
+                    table.c.id == bindparam("rule_id"),
+                    table.c.next_fire_at == bindparam("fired_at"),
+                )
+                .values(
+                    next_fire_at=bindparam("next_at"),
+                    last_fired_at=bindparam("last_at"),
+                ),
+                claims,
+            ).rowcount
+            if claimed != len(claims):
+                return None
+            last_id = session.scalar(select(func.max(Task.id))) or 0
+            session.execute(insert(Task).execution_options(render_nulls=True), tasks)
+            link_tags_after(session, last_id)
+        return len(tasks), requeue
@@ -0,0 +1,89 @@
+class RefreshScheduler:
+    """Coalesces view refreshes into one pass when the Tk event loop goes idle.
+
+    request() only marks views dirty; the first request schedules a flush with
+    ``schedule(callback)``, normally ``root.after_idle``, and later requests
+    before it runs are folded into it. A view whose ``visible()`` is false,
+    such as one on a hidden notebook tab, stays dirty through the flush and
+    is refreshed by the first flush after it is shown.
+
+    The counters record how many refreshes were requested, how many of those
+    were coalesced into an already pending one, how many views were deferred
+    while hidden (once each until refreshed, however many flushes pass them
+    over), and how many actually ran.
+    """
+
+    def __init__(self, schedule, cancel):
+        self.schedule = schedule
+        self.cancel = cancel
+        self._views = {}
+        self._dirty = set()
+        # Dirty views already counted as deferred
+        self._deferred = set()
+        self._after_id = None
+        self.requested = 0
+        self.coalesced = 0
+        self.deferred = 0
+        self.ran = 0
+
+    @property
+    def avoided(self):
+        """Requested refreshes that did not run (yet)"""
+        return self.requested - self.ran
+
+    @property
+    def pending(self):
+        return set(self._dirty)
+
+    def register(self, name, refresh, visible=None):
+        self._views[name] = (refresh, visible)
+
+    def request(self, *names):
+        for name in names:
+            if name not in self._views:
+                raise KeyError(f"unknown view {name!r}")
+            self.requested += 1
+            if name in self._dirty:
+                self.coalesced += 1
+            self._dirty.add(name)
+        if self._dirty and self._after_id is None:
+            self._after_id = self.schedule(self._run)
+
+    def mark_clean(self, *names):
+        """Note that views were just refreshed outside the scheduler"""
+        self._dirty.difference_update(names)
+        self._deferred.difference_update(names)
+
+    def _run(self):
+        self._after_id = None
+        self.flush()
+
+    def flush(self):
+        """Refresh every dirty, visible view once, in registration order"""
+        self.close()
+        for name, (refresh, visible) in self._views.items():
+            if name not in self._dirty:
+                continue
+            if visible is not None and not visible():
+                if name not in self._deferred:
+                    self._deferred.add(name)
+                    self.deferred += 1
+                continue
+            self._dirty.discard(name)
+            self._deferred.discard(name)
+            self.ran += 1
+            refresh()
+
+    def counters(self):
+        return {
+            "requested": self.requested,
+            "ran": self.ran,
+            "avoided": self.avoided,
+            "coalesced": self.coalesced,
+            "deferred": self.deferred,
+        }
+
+    def close(self):
+        if self._after_id is not None:
+            self.cancel(self._after_id)
+            self._after_id = None
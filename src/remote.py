@@ -0,0 +1,214 @@
+"""Client side of the sync server: a TaskStore that talks HTTP instead of SQLite"""
+
+import json
+import threading
+from datetime import datetime
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from store import StaleTaskError, TaskStore, decode_change, decode_row
+
+
+def _query(**params):
+    values = {}
+    for name, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, (list, tuple)):
+            value = ",".join(value)
+        values[name] = value
+    return "?" + urlencode(values) if values else ""
+
+
+class RemoteTaskStore(TaskStore):
+    """TaskStore backed by a SyncServer instead of a local database.
+
+    Rows are cached the same way. Change log entries the server pushes,
+    including other clients' edits, update the cache and are passed on to
+    listen() callbacks.
+    """
+
+    local = False
+
+    def __init__(self, url, cache=True, timeout=30, retry_s=2):
+        super().__init__(cache=cache)
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.retry_s = retry_s
+        self._closed = threading.Event()
+
+    def _open(self, method, path, body=None, timeout=None):
+        data = None if body is None else json.dumps(body).encode()
+        request = Request(
+            self.url + path,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            return urlopen(request, timeout=timeout or self.timeout)
+        except HTTPError as e:
+            if e.code == 400:
+                raise ValueError(json.load(e).get("error", "bad request")) from None
+            if e.code == 409:
+                raise StaleTaskError(json.load(e)["id"]) from None
+            raise
+
+    def _request(self, method, path, body=None):
+        """Decoded JSON response, or None for 404"""
+        try:
+            with self._open(method, path, body) as response:
+                return json.load(response)
+        except HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def _tasks(self, path):
+        return [decode_row(data) for data in self._request("GET", path)["tasks"]]
+
+    # Storage
+
+    def _load_rows(self, statuses):
+        return self._tasks("/tasks" + _query(status=statuses))
+
+    def _load_done_page(self, after, limit, since, until, tag):
+        after_completed_at, after_id = after or (None, None)
+        return self._tasks(
+            "/tasks/done"
+            + _query(
+                after_completed_at=after_completed_at,
+                after_id=after_id,
+                limit=limit,
+                since=since,
+                until=until,
+                tag=tag,
+            )
+        )
+
+    def _load_row(self, task_id):
+        data = self._request("GET", f"/tasks/{task_id}")
+        return data and decode_row(data)
+
+    def _apply(self, ops):
+        # The server batches concurrent writes from every client itself
+        rows = []
+        for op, task_id, fields in ops:
+            if op == "add":
+                data = self._request("POST", "/tasks", fields)
+            else:
+                fields = {
+                    k: v.isoformat() if isinstance(v, datetime) else v
+                    for k, v in fields.items()
+                    if v is not None
+                }
+                data = self._request("PATCH", f"/tasks/{task_id}", fields)
+            rows.append(data and decode_row(data))
+        return rows
+
+    def _update_many(self, task_ids, status, tag):
+        fields = {"ids": task_ids, "status": status, "tag": tag}
+        data = self._request("PATCH", "/tasks", fields)
+        return [decode_row(row) for row in data["tasks"]]
+
+    def _delete(self, task_ids):
+        return self._request("DELETE", "/tasks", {"ids": task_ids})["deleted"]
+
+    def _archive(self, before):
+        data = self._request("POST", "/archive", {"before": before.isoformat()})
+        return data["archived"]
+
+    def _load_changes(self, since, limit):
+        data = self._request("GET", "/changes" + _query(since=since, limit=limit))
+        return [decode_change(change) for change in data["changes"]]
+
+    def _load_change_seq(self):
+        return self._request("GET", "/changes" + _query(limit=0))["seq"]
+
+    def search(self, text, statuses=None, tag=None, since=None, until=None):
+        return self._tasks(
+            "/search"
+            + _query(q=text, status=statuses, tag=tag, since=since, until=until)
+        )
+
+    def tagged_ids(self, name):
+        return set(self._request("GET", "/tags/tasks" + _query(name=name))["ids"])
+
+    def tag_counts(self, statuses=None):
+        data = self._request("GET", "/tags" + _query(status=statuses))
+        return [tuple(count) for count in data["tags"]]
+
+    # Reports and analytics
+
+    def has_report_rows(self, start_dt, end_dt, statuses=None, tag=None):
+        return self.report_count(start_dt, end_dt, statuses, tag) > 0
+
+    def report_count(self, start_dt, end_dt, statuses=None, tag=None):
+        query = _query(start=start_dt, end=end_dt, status=statuses, tag=tag)
+        return self._request("GET", "/report/count" + query)["count"]
+
+    def report_rows(self, start_dt, end_dt, statuses=None, epoch=False, tag=None):
+        # Timestamps always arrive as text; the columnar writer converts them
+        query = _query(start=start_dt, end=end_dt, status=statuses, tag=tag)
+        with self._open("GET", "/report" + query) as response:
+            for line in response:
+                yield tuple(json.loads(line))
+
+    def stats(self, start, end):
+        return self._request("GET", "/stats" + _query(start=start, end=end))
+
+    def record_pomodoro(self, task_id, started_at, ended_at):
+        self._request(
+            "POST",
+            "/pomodoros",
+            {
+                "task_id": task_id,
+                "started_at": started_at.isoformat(),
+                "ended_at": ended_at.isoformat(),
+            },
+        )
+
+    # Change notifications
+
+    def listen(self, callback):
+        """Apply pushed changes to the cache, then call callback(changes) with
+        the list of Changes from a background thread. After a reconnect, the
+        changes missed in between are fetched from the change log first."""
+        thread = threading.Thread(
+            target=self._listen, args=(callback,), name="pytasky-events", daemon=True
+        )
+        thread.start()
+        return True
+
+    def _listen(self, callback):
+        while not self._closed.is_set():
+            try:
+                # The server sends a keepalive every few seconds, so a silent
+                # connection means the server is gone
+                with self._open("GET", "/events", timeout=self.timeout) as response:
+                    # Subscribed: anything logged since the last sync is either
+                    # in the log now or on its way down the stream
+                    changes = self.sync()
+                    if changes:
+                        callback(changes)
+                    for line in response:
+                        if self._closed.is_set():
+                            return
+                        if not line.startswith(b"data: "):
+                            continue
+                        data = json.loads(line[6:])
+                        changes = self.apply_changes(
+                            [decode_change(change) for change in data["changes"]]
+                        )
+                        if changes:
+                            callback(changes)
+            except (OSError, ValueError):
+                pass
+            self._closed.wait(self.retry_s)
+
+    def close(self):
+        # The listener stops at the next line the server sends; it runs as a
+        # daemon thread, so it never holds up exit meanwhile
+        self._closed.set()
@@ -0,0 +1,304 @@
+import csv
+import json
+import os
+from contextlib import suppress
+from datetime import datetime
+from sqlalchemy import Integer, cast, func
+from columnar import write_columnar
+from models import Task, changes_since, last_change_seq, report_query
+
+REPORT_FORMATS = ["json", "csv", "ndjson", "ptc"]
+
+# Written in binary, from rows with timestamps as seconds since the epoch
+BINARY_FORMATS = ["ptc"]
+
+# Formats that can be appended to a part at a time
+INCREMENTAL_FORMATS = ["ndjson", "csv"]
+
+MANIFEST_NAME = "manifest.json"
+
+REPORT_FIELDS = [
+    "id",
+    "title",
+    "notes",
+    "tag",
+    "status",
+    "created_at",
+    "completed_at",
+    "last_updated",
+]
+
+CSV_HEADER = [
+    "ID",
+    "Title",
+    "Notes",
+    "Tag",
+    "Status",
+    "Created At",
+    "Completed At",
+    "Last Updated",
+]
+
+REPORT_COLUMNS = tuple(getattr(Task, field) for field in REPORT_FIELDS)
+
+# SQLite converts the stored timestamp text, so no datetimes are built
+EPOCH_REPORT_COLUMNS = REPORT_COLUMNS[:5] + tuple(
+    cast(func.strftime("%s", column), Integer) for column in REPORT_COLUMNS[5:]
+)
+
+
+def format_report_timestamp(value):
+    # Same text as strftime("%Y-%m-%d %H:%M:%S"), without the format parsing
+    return value.isoformat(" ", "seconds") if value else None
+
+
+def has_report_rows(session, start_dt, end_dt, statuses=None, tag=None):
+    query = report_query(
+        session, start_dt, end_dt, statuses, columns=(Task.id,), tag=tag
+    )
+    return query.first() is not None
+
+
+def count_report_rows(session, start_dt, end_dt, statuses=None, tag=None):
+    query = report_query(
+        session, start_dt, end_dt, statuses, columns=(func.count(Task.id),), tag=tag
+    )
+    return query.scalar()
+
+
+def iter_report_rows(
+    session, start_dt, end_dt, statuses=None, batch_size=1000, epoch=False, tag=None
+):
+    """Yield report rows as tuples, fetching only report columns in batches.
+
+    Timestamps are report text, or seconds since the epoch with ``epoch``.
+    ``tag`` limits the rows to tasks with that tag.
+    """
+    if epoch:
+        query = report_query(
+            session, start_dt, end_dt, statuses, EPOCH_REPORT_COLUMNS, tag
+        )
+        return (tuple(row) for row in query.yield_per(batch_size))
+    query = report_query(session, start_dt, end_dt, statuses, REPORT_COLUMNS, tag)
+    return _report_rows(query.yield_per(batch_size))
+
+
+def iter_task_rows(session, task_ids=None, batch_size=1000):
+    """Yield report rows of the given tasks, or of all tasks, in id order"""
+    if task_ids is None:
+        query = session.query(*REPORT_COLUMNS).order_by(Task.id)
+        yield from _report_rows(query.yield_per(batch_size))
+        return
+    task_ids = sorted(task_ids)
+    # Chunked to stay under SQLite's limit on bound parameters
+    for i in range(0, len(task_ids), batch_size):
+        chunk = task_ids[i : i + batch_size]
+        query = session.query(*REPORT_COLUMNS).filter(Task.id.in_(chunk))
+        yield from _report_rows(query.order_by(Task.id))
+
+
+def _report_rows(values):
+    for (
+        task_id,
+        title,
+        notes,
+        tag,
+        status,
+        created,
+        completed,
+        updated,
+    ) in values:
+        yield (
+            task_id,
+            title,
+            notes,
+            tag,
+            status,
+            format_report_timestamp(created),
+            format_report_timestamp(completed),
+            format_report_timestamp(updated),
+        )
+
+
+def write_csv(rows, f):
+    writer = csv.writer(f)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_json(rows, f):
+    """Write a JSON array one record at a time, matching json.dump(indent=2)"""
+    count = 0
+    for row in rows:
+        f.write(",\n  " if count else "[\n  ")
+        record = json.dumps(dict(zip(REPORT_FIELDS, row)), indent=2)
+        f.write(record.replace("\n", "\n  "))
+        count += 1
+    f.write("\n]" if count else "[]")
+    return count
+
+
+def write_ndjson(rows, f):
+    count = 0
+    for row in rows:
+        f.write(json.dumps(dict(zip(REPORT_FIELDS, row))))
+        f.write("\n")
+        count += 1
+    return count
+
+
+WRITERS = {
+    "json": write_json,
+    "csv": write_csv,
+    "ndjson": write_ndjson,
+    "ptc": write_columnar,
+}
+
+
+def _with_progress(rows, progress, every):
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % every == 0:
+            progress(count)
+    progress(count)
+
+
+def export_report(
+    session,
+    filename,
+    format_type,
+    start_dt,
+    end_dt,
+    statuses=None,
+    batch_size=1000,
+    progress=None,
+    progress_every=1000,
+    tag=None,
+):
+    """Stream matching tasks straight into filename, returning the row count.
+
+    ``progress(count)`` is called every ``progress_every`` rows; if it raises,
+    the export stops and the partial file is removed.
+    """
+    rows = iter_report_rows(
+        session,
+        start_dt,
+        end_dt,
+        statuses,
+        batch_size,
+        epoch=format_type in BINARY_FORMATS,
+        tag=tag,
+    )
+    return write_report(rows, filename, format_type, progress, progress_every)
+
+
+def write_report(rows, filename, format_type, progress=None, progress_every=1000):
+    """Write report row tuples to filename in format_type, returning the count"""
+    writer = WRITERS[format_type]
+    if progress:
+        rows = _with_progress(rows, progress, progress_every)
+    if format_type in BINARY_FORMATS:
+        mode, newline = "wb", None
+    else:
+        mode, newline = "w", "" if format_type == "csv" else None
+    try:
+        with open(filename, mode, newline=newline) as f:
+            return writer(rows, f)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(filename)
+        raise
+
+
+def read_manifest(directory):
+    """An incremental export target's manifest, or None before its first export"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _changed_task_ids(session, since, until):
+    """Ids of tasks changed after change ``since`` up to ``until``: (live, deleted)"""
+    last_op = {}
+    while since < until:
+        changes = changes_since(session, since)
+        if not changes:
+            break
+        for change in changes:
+            if change.seq > until:
+                break
+            last_op[change.task_id] = change.op
+        since = changes[-1].seq
+    live = [task_id for task_id, op in last_op.items() if op != "delete"]
+    deleted = sorted(task_id for task_id, op in last_op.items() if op == "delete")
+    return live, deleted
+
+
+def export_incremental(
+    session, directory, format_type="ndjson", progress=None, progress_every=1000
+):
+    """Append tasks changed since the last export to directory as a part file.
+
+    The first export of a target writes every task. Later ones write the
+    current rows of tasks added or updated since the manifest's watermark, a
+    task_changes sequence number, and list deleted (or archived) task ids in
+    the manifest. Parts are written under a temporary name and the manifest is
+    replaced last, so an interrupted export is simply redone by the next run.
+    A task changed while the export runs may be written again next time.
+
+    Returns the new part's manifest entry, or None if no task changed.
+    """
+    if format_type not in INCREMENTAL_FORMATS:
+        raise ValueError(f"incremental exports are written as {INCREMENTAL_FORMATS}")
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory) or {
+        "format": format_type,
+        "watermark": None,
+        "parts": [],
+    }
+    if manifest["format"] != format_type:
+        raise ValueError(f"{directory} holds {manifest['format']} exports")
+
+    since = manifest["watermark"]
+    watermark = last_change_seq(session)
+    if since is None:
+        rows, deleted = iter_task_rows(session), []
+    elif watermark < since:
+        raise ValueError(f"{directory} has changes this database does not")
+    else:
+        live, deleted = _changed_task_ids(session, since, watermark)
+        if not live and not deleted:
+            return None
+        rows = iter_task_rows(session, live)
+
+    name = f"part-{len(manifest['parts']) + 1:05d}.{format_type}"
+    path = os.path.join(directory, name)
+    count = write_report(rows, path + ".tmp", format_type, progress, progress_every)
+    os.replace(path + ".tmp", path)
+    part = {
+        "file": name,
+        "rows": count,
+        "deleted": deleted,
+        "since": since or 0,
+        "watermark": watermark,
+        "exported_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    manifest["watermark"] = watermark
+    manifest["parts"].append(part)
+    _write_manifest(directory, manifest)
+    return part
@@ -0,0 +1,495 @@
+"""Sync server: one task database shared by many PyTasky clients over HTTP/JSON.
+
+    python src/pytasky.py serve [--host 127.0.0.1] [--port 8765]
+
+Clients point PYTASKY_SERVER at it instead of opening the database file, so
+only this process ever touches SQLite. Writes queued while a commit is running
+are committed together in the next transaction. Every entry added to the task
+change log is pushed to clients listening on /events (server-sent events), and
+/changes serves the log to clients catching up after being offline.
+"""
+
+import asyncio
+import itertools
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+from models import CHANGES_PAGE_SIZE
+from recurrence import RecurrenceScheduler
+from store import StaleTaskError, TaskStore, encode_change, encode_row
+
+DEFAULT_PORT = 8765
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, path, params, body, writer, args=()):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.body = body
+        self.writer = writer
+        self.args = args
+
+    def param(self, name, parse=str, default=None):
+        values = self.params.get(name)
+        if not values or values[0] == "":
+            return default
+        try:
+            return parse(values[0])
+        except ValueError:
+            raise HTTPError(400, f"bad {name}: {values[0]!r}")
+
+    def statuses(self):
+        value = self.param("status")
+        return value.split(",") if value else None
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        return data
+
+
+def _head(status, content_type, length=None):
+    lines = [
+        f"HTTP/1.1 {status} {REASONS[status]}",
+        f"Content-Type: {content_type}",
+        "Cache-Control: no-cache",
+        "Connection: close",
+    ]
+    if length is not None:
+        lines.append(f"Content-Length: {length}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+class SyncServer:
+    """Serves a TaskStore over HTTP/JSON and pushes its changes to listeners"""
+
+    def __init__(
+        self,
+        store=None,
+        host="127.0.0.1",
+        port=DEFAULT_PORT,
+        max_batch=500,
+        heartbeat_s=15,
+        poll_s=1.0,
+    ):
+        self.store = store or TaskStore()
+        # Clients leave recurring tasks to the server, as it owns the database
+        self.recurrences = RecurrenceScheduler(self.store.session_factory)
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.heartbeat_s = heartbeat_s
+        self.poll_s = poll_s
+        self.batches = 0
+        self._server = None
+        self._write_queue = None
+        self._tasks = []
+        self._handlers = set()
+        # One thread commits, so SQLite never sees competing writers
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="pytasky-writer")
+        self._subscribers = set()
+        self._routes = [
+            ("GET", "/tasks", self.list_tasks),
+            ("POST", "/tasks", self.add_task),
+            ("PATCH", "/tasks", self.update_tasks),
+            ("DELETE", "/tasks", self.delete_tasks),
+            ("GET", "/tasks/done", self.done_page),
+            ("GET", r"/tasks/(\d+)", self.get_task),
+            ("PATCH", r"/tasks/(\d+)", self.update_task),
+            ("GET", "/changes", self.changes),
+            ("GET", "/search", self.search),
+            ("GET", "/tags", self.tag_counts),
+            ("GET", "/tags/tasks", self.tagged_ids),
+            ("POST", "/archive", self.archive),
+            ("GET", "/report/count", self.report_count),
+            ("GET", "/report", self.report),
+            ("GET", "/stats", self.stats),
+            ("POST", "/pomodoros", self.record_pomodoro),
+            ("GET", "/events", self.events),
+        ]
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        await self._run(self.store.sync, executor=self._writer)
+        self._write_queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._write_loop()),
+            asyncio.create_task(self._poll_loop()),
+        ]
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        # Open connections, event streams included, are not closed for us
+        tasks = self._tasks + list(self._handlers)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+        self._writer.shutdown(wait=True)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    # Plumbing
+
+    async def _run(self, func, *args, executor=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(func, *args))
+
+    async def _handle(self, reader, writer):
+        self._handlers.add(asyncio.current_task())
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            if not request_line.strip():
+                return
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            url = urlsplit(target)
+            request = Request(method, url.path, parse_qs(url.query), body, writer)
+            await self._dispatch(request)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+            self._handlers.discard(asyncio.current_task())
+
+    async def _dispatch(self, request):
+        status, payload = 200, None
+        try:
+            handler = self._route(request)
+            result = await handler(request)
+            if result is None:
+                return  # the handler streamed its own response
+            status, payload = result
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except StaleTaskError as e:
+            status, payload = 409, {"error": str(e), "id": e.task_id}
+        except (KeyError, ValueError, TypeError) as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        body = json.dumps(payload).encode()
+        request.writer.write(_head(status, "application/json", len(body)) + body)
+        await request.writer.drain()
+
+    def _route(self, request):
+        allowed = False
+        for method, pattern, handler in self._routes:
+            match = re.fullmatch(pattern, request.path)
+            if match:
+                if method == request.method:
+                    request.args = tuple(int(arg) for arg in match.groups())
+                    return handler
+                allowed = True
+        if allowed:
+            raise HTTPError(405, f"{request.method} not allowed on {request.path}")
+        raise HTTPError(404, f"no route for {request.path}")
+
+    def publish(self, event):
+        """Push an event to every /events listener"""
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind: end its stream so it reconnects and reloads
+                self._subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def _write(self, op, task_id, fields):
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put(((op, task_id, fields), future))
+        return await future
+
+    async def _write_loop(self):
+        """Commit queued writes, batching whatever queued up during the last commit"""
+        while True:
+            batch = [await self._write_queue.get()]
+            while len(batch) < self.max_batch and not self._write_queue.empty():
+                batch.append(self._write_queue.get_nowait())
+            ops = [op for op, _ in batch]
+            try:
+                results = await self._run(
+                    self.store.write_batch, ops, executor=self._writer
+                )
+            except Exception:
+                # Don't let one bad write fail the others: retry them one by one
+                results = []
+                for op in ops:
+                    try:
+                        rows = await self._run(
+                            self.store.write_batch, [op], executor=self._writer
+                        )
+                        results.append(rows[0])
+                    except Exception as e:
+                        results.append(e)
+            self.batches += 1
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            await self._publish_changes()
+
+    async def _publish_changes(self):
+        """Push change log entries added since the last call to listeners"""
+        changes = await self._run(self.store.sync, executor=self._writer)
+        if changes:
+            self.publish({"changes": [encode_change(change) for change in changes]})
+
+    async def _poll_loop(self):
+        # Adds due recurring tasks, and picks up changes other processes,
+        # like the command line, commit
+        while True:
+            await asyncio.sleep(self.poll_s)
+            await self._run(self.recurrences.tick, executor=self._writer)
+            await self._publish_changes()
+
+    # Tasks
+
+    async def list_tasks(self, request):
+        statuses = request.statuses()
+        if not statuses:
+            raise HTTPError(400, "status is required")
+        rows = await self._run(self.store.rows, statuses)
+        return 200, {"tasks": [encode_row(row) for row in rows]}
+
+    async def done_page(self, request):
+        after_id = request.param("after_id", int)
+        after = None
+        if after_id is not None:
+            after = (
+                request.param("after_completed_at", datetime.fromisoformat),
+                after_id,
+            )
+        rows = await self._run(
+            self.store.done_page,
+            after,
+            request.param("limit", int, 200),
+            request.param("since", datetime.fromisoformat),
+            request.param("until", datetime.fromisoformat),
+            request.param("tag"),
+        )
+        return 200, {"tasks": [encode_row(row) for row in rows]}
+
+    async def get_task(self, request):
+        row = await self._run(self.store.get, request.args[0])
+        if row is None:
+            raise HTTPError(404, f"task {request.args[0]} not found")
+        return 200, encode_row(row)
+
+    async def add_task(self, request):
+        row = await self._write("add", None, request.json())
+        return 201, encode_row(row)
+
+    async def update_task(self, request):
+        fields = request.json()
+        if fields.get("expected_updated"):
+            fields["expected_updated"] = datetime.fromisoformat(
+                fields["expected_updated"]
+            )
+        row = await self._write("update", request.args[0], fields)
+        if row is None:
+            raise HTTPError(404, f"task {request.args[0]} not found")
+        return 200, encode_row(row)
+
+    def _task_ids(self, data):
+        ids = data.get("ids")
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise HTTPError(400, "ids must be a list of task ids")
+        return ids
+
+    async def update_tasks(self, request):
+        data = request.json()
+        rows = await self._run(
+            self.store.update_many,
+            self._task_ids(data),
+            data.get("status"),
+            data.get("tag"),
+            executor=self._writer,
+        )
+        await self._publish_changes()
+        return 200, {"tasks": [encode_row(row) for row in rows]}
+
+    async def delete_tasks(self, request):
+        ids = self._task_ids(request.json())
+        count = await self._run(self.store.delete, ids, executor=self._writer)
+        await self._publish_changes()
+        return 200, {"deleted": count}
+
+    async def search(self, request):
+        rows = await self._run(
+            self.store.search,
+            request.param("q", default=""),
+            request.statuses(),
+            request.param("tag"),
+            request.param("since", datetime.fromisoformat),
+            request.param("until", datetime.fromisoformat),
+        )
+        return 200, {"tasks": [encode_row(row) for row in rows]}
+
+    async def tag_counts(self, request):
+        counts = await self._run(self.store.tag_counts, request.statuses())
+        return 200, {"tags": counts}
+
+    async def tagged_ids(self, request):
+        name = request.param("name")
+        if not name:
+            raise HTTPError(400, "name is required")
+        ids = await self._run(self.store.tagged_ids, name)
+        return 200, {"ids": sorted(ids)}
+
+    async def archive(self, request):
+        before = request.json().get("before")
+        if not before:
+            raise HTTPError(400, "before is required")
+        before = datetime.fromisoformat(before)
+        count = await self._run(self.store.archive, before, executor=self._writer)
+        await self._publish_changes()
+        return 200, {"archived": count}
+
+    async def changes(self, request):
+        since = request.param("since", int, 0)
+        limit = request.param("limit", int, CHANGES_PAGE_SIZE)
+        changes = await self._run(self.store.changes_since, since, limit)
+        seq = await self._run(self.store.change_seq)
+        return 200, {
+            "changes": [encode_change(change) for change in changes],
+            "seq": seq,
+        }
+
+    # Reports and analytics
+
+    def _report_range(self, request):
+        start = request.param("start", datetime.fromisoformat)
+        end = request.param("end", datetime.fromisoformat)
+        if start is None or end is None:
+            raise HTTPError(400, "start and end are required")
+        return start, end, request.statuses()
+
+    async def report_count(self, request):
+        count = await self._run(
+            self.store.report_count,
+            *self._report_range(request),
+            request.param("tag"),
+        )
+        return 200, {"count": count}
+
+    async def report(self, request):
+        """Stream report rows as NDJSON arrays, in REPORT_FIELDS order"""
+        rows = self.store.report_rows(
+            *self._report_range(request), tag=request.param("tag")
+        )
+        writer = request.writer
+        writer.write(_head(200, "application/x-ndjson"))
+        # The rows share one session, so they are always read on the same thread
+        with ThreadPoolExecutor(1) as executor:
+            try:
+                while True:
+                    chunk = await self._run(
+                        lambda: list(itertools.islice(rows, 1000)), executor=executor
+                    )
+                    if not chunk:
+                        break
+                    writer.write(
+                        "".join(json.dumps(row) + "\n" for row in chunk).encode()
+                    )
+                    await writer.drain()
+            finally:
+                await self._run(rows.close, executor=executor)
+
+    async def stats(self, request):
+        start = request.param("start", datetime.fromisoformat)
+        end = request.param("end", datetime.fromisoformat)
+        if start is None or end is None:
+            raise HTTPError(400, "start and end are required")
+        return 200, await self._run(self.store.stats, start, end)
+
+    async def record_pomodoro(self, request):
+        data = request.json()
+        await self._run(
+            self.store.record_pomodoro,
+            data.get("task_id"),
+            datetime.fromisoformat(data["started_at"]),
+            datetime.fromisoformat(data["ended_at"]),
+            executor=self._writer,
+        )
+        return 201, {}
+
+    # Change notifications
+
+    async def events(self, request):
+        writer = request.writer
+        # Subscribe before answering, so nothing committed after the client
+        # sees the response headers can be missed
+        queue = asyncio.Queue(maxsize=10000)
+        self._subscribers.add(queue)
+        writer.write(_head(200, "text/event-stream"))
+        await writer.drain()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.heartbeat_s)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                else:
+                    if event is None:
+                        break
+                    writer.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+                await writer.drain()
+        finally:
+            self._subscribers.discard(queue)
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT):
+    """Run a SyncServer on the local database until interrupted"""
+    server = SyncServer(host=host, port=port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,598 @@
+"""Task data access for the window and the CLI, with a write-through row cache"""
+
+import json
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import update
+from models import (
+    CHANGES_PAGE_SIZE,
+    DONE_PAGE_SIZE,
+    DONE_STATUSES,
+    STATUSES,
+    Task,
+    archive_tasks,
+    changes_since,
+    delete_tasks,
+    done_tasks_page,
+    get_session,
+    last_change_seq,
+    search_tasks,
+    tag_counts,
+    tag_members,
+    update_tasks,
+)
+from instrument import tracer
+from listview import TaskRow, row_from_task
+
+# Selected instead of Task so rows load without building ORM objects
+ROW_COLUMNS = [getattr(Task, field) for field in TaskRow._fields]
+
+TIMESTAMP_FIELDS = ("created_at", "completed_at", "last_updated")
+
+# One task_changes entry; fields maps changed TaskRow fields to new values
+Change = namedtuple("Change", ["seq", "op", "task_id", "fields"])
+
+
+def encode_row(row):
+    """TaskRow as a JSON-ready dict, timestamps in ISO 8601"""
+    data = row._asdict()
+    for field in TIMESTAMP_FIELDS:
+        if data[field] is not None:
+            data[field] = data[field].isoformat()
+    return data
+
+
+def decode_fields(data):
+    return {
+        field: (
+            datetime.fromisoformat(value)
+            if field in TIMESTAMP_FIELDS and value is not None
+            else value
+        )
+        for field, value in data.items()
+    }
+
+
+def decode_row(data):
+    return TaskRow(**decode_fields({field: data[field] for field in TaskRow._fields}))
+
+
+def encode_change(change):
+    data = change._asdict()
+    if change.fields is not None:
+        data["fields"] = {
+            field: value.isoformat() if isinstance(value, datetime) else value
+            for field, value in change.fields.items()
+        }
+    return data
+
+
+def decode_change(data):
+    fields = data["fields"]
+    return Change(
+        data["seq"],
+        data["op"],
+        data["task_id"],
+        None if fields is None else decode_fields(fields),
+    )
+
+
+class StaleTaskError(Exception):
+    """A task was changed by someone else after an edit of it started"""
+
+    def __init__(self, task_id):
+        super().__init__(f"task {task_id} was changed since it was read")
+        self.task_id = task_id
+
+
+def _check_status(status):
+    if status not in STATUSES:
+        raise ValueError(f"unknown status {status!r}")
+
+
+def add_task(session, title, notes="", tag="", status="todo"):
+    if not title:
+        raise ValueError("title is required")
+    _check_status(status)
+    now = datetime.now()
+    task = Task(
+        title=title,
+        notes=notes,
+        tag=tag,
+        status=status,
+        created_at=now,
+        last_updated=now,
+    )
+    if status in DONE_STATUSES:
+        task.completed_at = now
+    session.add(task)
+    return task
+
+
+def update_task(
+    session,
+    task_id,
+    title=None,
+    notes=None,
+    tag=None,
+    status=None,
+    expected_updated=None,
+):
+    """Apply the given fields to a task; returns it, or None if it is missing.
+
+    With ``expected_updated``, the last_updated of the row the edit started
+    from, raises StaleTaskError instead if the task has changed since. The
+    check is the WHERE clause of an UPDATE, which also takes the write lock
+    before the task is read, so no other writer can commit in between and no
+    lock has to be held while the user edits.
+    """
+    if title == "":
+        raise ValueError("title is required")
+    if status is not None:
+        _check_status(status)
+    now = datetime.now()
+    if expected_updated is not None:
+        claimed = session.execute(
+            update(Task)
+            .where(Task.id == task_id, Task.last_updated.is_(expected_updated))
+            .values(last_updated=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            if session.get(Task, task_id) is None:
+                return None
+            raise StaleTaskError(task_id)
+    task = session.get(Task, task_id)
+    if task is None:
+        return None
+    for field, value in (("title", title), ("notes", notes), ("tag", tag)):
+        if value is not None:
+            setattr(task, field, value)
+    if status is not None:
+        task.status = status
+        task.completed_at = now if status in DONE_STATUSES else None
+    task.last_updated = now
+    return task
+
+
+class TaskStore:
+    """Reads and writes tasks as TaskRows, caching them by id and by status.
+
+    A status is served from memory once it has been loaded in full. Writes made
+    through the store update the cache in place, so only rows changed outside
+    the store ever need to be invalidated. With ``cache=False`` every read goes
+    to the database.
+
+    Changes made elsewhere, by other processes or sync clients, are read from
+    the task_changes log by sync(), which patches the cache with just them.
+
+    Subclasses swap the storage by overriding the ``_load_*``, ``_apply``,
+    ``_update_many``, ``_delete`` and ``_archive`` methods; the cache logic
+    stays here.
+    """
+
+    # Whether the database is opened in this process, rather than by a server
+    local = True
+
+    def __init__(self, session_factory=None, cache=True):
+        self.session_factory = session_factory
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._by_status = {}
+        self._loaded = set()
+        # Write counter per id, so a load racing with a write can't undo it
+        self._writes = 0
+        self._written = {}
+        # Sequence number of the last change log entry applied by sync()
+        self.synced_seq = None
+
+    @contextmanager
+    def _session(self):
+        session = (self.session_factory or get_session)()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def _put(self, row):
+        old = self._rows.get(row.id)
+        if old is not None and old.status != row.status:
+            self._by_status[old.status].discard(row.id)
+        self._rows[row.id] = row
+        self._by_status.setdefault(row.status, set()).add(row.id)
+
+    def _merge(self, loaded, started):
+        """Cache rows read since write number ``started``, unless written since"""
+        for row in loaded:
+            if self._written.get(row.id, 0) <= started:
+                self._put(row)
+
+    def _write(self, row):
+        with self._lock:
+            self._writes += 1
+            self._written[row.id] = self._writes
+            if self.cache:
+                self._put(row)
+        return row
+
+    def _drop(self, task_id):
+        row = self._rows.pop(task_id, None)
+        if row is not None:
+            self._by_status[row.status].discard(task_id)
+
+    def _evict_completed_before(self, before):
+        with self._lock:
+            for row in list(self._rows.values()):
+                if (
+                    row.status in DONE_STATUSES
+                    and row.completed_at is not None
+                    and row.completed_at < before
+                ):
+                    del self._rows[row.id]
+                    self._by_status[row.status].discard(row.id)
+
+    def invalidate(self, task_id=None):
+        """Re-read one task changed outside the store, or drop the whole cache.
+
+        Returns the task's fresh row, or None if it no longer exists.
+        """
+        with self._lock:
+            if task_id is None:
+                self._rows, self._by_status, self._loaded = {}, {}, set()
+                return None
+            self._drop(task_id)
+        return self.get(task_id)
+
+    def listen(self, callback):
+        """Call callback(changes) from another thread for changes made elsewhere.
+
+        Returns False when changes are not pushed, and sync() has to be polled.
+        """
+        return False
+
+    def close(self):
+        pass
+
+    # Storage
+
+    def _load_rows(self, statuses):
+        with self._session() as session:
+            return [
+                TaskRow._make(values)
+                for values in session.query(*ROW_COLUMNS).filter(
+                    Task.status.in_(statuses)
+                )
+            ]
+
+    def _load_done_page(self, after, limit, since, until, tag):
+        with self._session() as session:
+            return [
+                TaskRow._make(values)
+                for values in done_tasks_page(
+                    session, after, limit, since, until, ROW_COLUMNS, tag
+                )
+            ]
+
+    def _load_row(self, task_id):
+        with self._session() as session:
+            values = session.query(*ROW_COLUMNS).filter(Task.id == task_id).first()
+        return values and TaskRow._make(values)
+
+    def _apply(self, ops):
+        with self._session() as session:
+            tasks = [
+                (
+                    add_task(session, **fields)
+                    if op == "add"
+                    else update_task(session, task_id, **fields)
+                )
+                for op, task_id, fields in ops
+            ]
+            session.flush()
+            # Snapshot before commit expires the objects
+            rows = [task and row_from_task(task) for task in tasks]
+            session.commit()
+        return rows
+
+    def _update_many(self, task_ids, status, tag):
+        with self._session() as session:
+            rows = [
+                TaskRow._make(values)
+                for values in update_tasks(session, task_ids, status, tag, ROW_COLUMNS)
+            ]
+            session.commit()
+        return rows
+
+    def _delete(self, task_ids):
+        with self._session() as session:
+            count = delete_tasks(session, task_ids)
+            session.commit()
+        return count
+
+    def _archive(self, before):
+        with self._session() as session:
+            count = archive_tasks(session, before)
+            session.commit()
+        return count
+
+    def _load_changes(self, since, limit):
+        with self._session() as session:
+            return [
+                Change(
+                    change.seq,
+                    change.op,
+                    change.task_id,
+                    change.fields and decode_fields(json.loads(change.fields)),
+                )
+                for change in changes_since(session, since, limit)
+            ]
+
+    def _load_change_seq(self):
+        with self._session() as session:
+            return last_change_seq(session)
+
+    # Reads
+
+    def rows(self, statuses):
+        """All tasks with the given statuses, in no particular order"""
+        missing = [s for s in statuses if not self.cache or s not in self._loaded]
+        if missing:
+            started = self._writes
+            loaded = self._load_rows(missing)
+            if not self.cache:
+                return loaded
+            with self._lock:
+                self._merge(loaded, started)
+                self._loaded.update(missing)
+        with self._lock:
+            return [
+                self._rows[task_id]
+                for status in statuses
+                for task_id in self._by_status.get(status, ())
+            ]
+
+    def done_page(
+        self, after=None, limit=DONE_PAGE_SIZE, since=None, until=None, tag=None
+    ):
+        """One done_tasks_page() as TaskRows; ``after`` is (completed_at, id)"""
+        started = self._writes
+        page = self._load_done_page(after, limit, since, until, tag)
+        if self.cache:
+            with self._lock:
+                self._merge(page, started)
+        return page
+
+    def get(self, task_id):
+        row = self._rows.get(task_id) if self.cache else None
+        if row is None:
+            row = self._load_row(task_id)
+            if row is not None and self.cache:
+                with self._lock:
+                    self._put(row)
+        return row
+
+    def search(self, text, statuses=None, tag=None, since=None, until=None):
+        """Ranked search_tasks() results as TaskRows, best match first"""
+        with self._session() as session:
+            tasks = search_tasks(
+                session, text, statuses, tag=tag, since=since, until=until
+            )
+            return [row_from_task(task) for task in tasks]
+
+    def tagged_ids(self, name):
+        """Ids of the tasks tagged ``name``, looked up in the tag index"""
+        with self._session() as session:
+            return set(session.execute(tag_members(name)).scalars())
+
+    def tag_counts(self, statuses=None):
+        """[(tag, task count)], most used first, over tasks with the given statuses"""
+        with self._session() as session:
+            return [tuple(row) for row in tag_counts(session, statuses)]
+
+    # Writes
+
+    def write_batch(self, ops):
+        """Apply ("add", None, fields) and ("update", task_id, fields) ops in one
+        transaction; returns a row per op, None for updates of missing tasks"""
+        rows = self._apply(ops)
+        for row in rows:
+            if row is not None:
+                self._write(row)
+        return rows
+
+    def add(self, title, notes="", tag="", status="todo"):
+        fields = {"title": title, "notes": notes, "tag": tag, "status": status}
+        return self.write_batch([("add", None, fields)])[0]
+
+    def update(
+        self,
+        task_id,
+        title=None,
+        notes=None,
+        tag=None,
+        status=None,
+        expected_updated=None,
+    ):
+        """Apply the given fields to a task; returns its new row, or None if missing.
+
+        Pass the ``last_updated`` of the row an edit started from as
+        ``expected_updated`` to get StaleTaskError if it changed meanwhile.
+        """
+        fields = {"title": title, "notes": notes, "tag": tag, "status": status}
+        if expected_updated is not None:
+            fields["expected_updated"] = expected_updated
+        return self.write_batch([("update", task_id, fields)])[0]
+
+    def update_many(self, task_ids, status=None, tag=None):
+        """Set the status and/or tag of the given tasks in one transaction;
+        returns the new rows of those that exist"""
+        if status is not None:
+            _check_status(status)
+        rows = self._update_many(list(task_ids), status, tag)
+        for row in rows:
+            self._write(row)
+        return rows
+
+    def delete(self, task_ids):
+        """Delete the given tasks in one transaction; returns the count"""
+        task_ids = list(task_ids)
+        count = self._delete(task_ids)
+        with self._lock:
+            for task_id in task_ids:
+                self._writes += 1
+                self._written[task_id] = self._writes
+                self._drop(task_id)
+        return count
+
+    def archive(self, before):
+        """Move tasks completed before ``before`` to the archive; returns the count"""
+        count = self._archive(before)
+        self._evict_completed_before(before)
+        return count
+
+    # Change log
+
+    def changes_since(self, seq, limit=CHANGES_PAGE_SIZE):
+        """Logged changes after sequence number ``seq``, oldest first"""
+        return self._load_changes(seq, limit)
+
+    def change_seq(self):
+        """Sequence number of the latest logged change"""
+        return self._load_change_seq()
+
+    def apply_changes(self, changes):
+        """Patch the cache with logged changes; returns the ones not applied before"""
+        applied, missing = [], set()
+        with self._lock:
+            for change in changes:
+                if change.seq <= self.synced_seq:
+                    continue
+                self.synced_seq = change.seq
+                applied.append(change)
+                if not self.cache:
+                    continue
+                self._writes += 1
+                self._written[change.task_id] = self._writes
+                old = self._rows.get(change.task_id)
+                if change.op == "delete":
+                    self._drop(change.task_id)
+                elif change.op == "insert":
+                    self._put(TaskRow(id=change.task_id, **change.fields))
+                elif old is not None:
+                    self._put(old._replace(**change.fields))
+                else:
+                    missing.add(change.task_id)
+        # Rows changed elsewhere that were never cached are read in full
+        for task_id in missing:
+            self.get(task_id)
+        return applied
+
+    def sync(self):
+        """Apply changes logged since the last sync and return them.
+
+        The first call only marks where the log ends, so call it before reading
+        anything through the store.
+        """
+        if self.synced_seq is None:
+            self.synced_seq = self.change_seq()
+            return []
+        applied = []
+        while True:
+            changes = self.changes_since(self.synced_seq)
+            applied += self.apply_changes(changes)
+            if len(changes) < CHANGES_PAGE_SIZE:
+                return applied
+
+    # Reports and analytics
+
+    def has_report_rows(self, start_dt, end_dt, statuses=None, tag=None):
+        from reports import has_report_rows
+
+        with self._session() as session:
+            return has_report_rows(session, start_dt, end_dt, statuses, tag)
+
+    def report_count(self, start_dt, end_dt, statuses=None, tag=None):
+        from reports import count_report_rows
+
+        with self._session() as session:
+            return count_report_rows(session, start_dt, end_dt, statuses, tag)
+
+    def report_rows(self, start_dt, end_dt, statuses=None, epoch=False, tag=None):
+        """Generator of report row tuples; close it to release its session"""
+        from reports import iter_report_rows
+
+        with self._session() as session:
+            yield from iter_report_rows(
+                session, start_dt, end_dt, statuses, epoch=epoch, tag=tag
+            )
+
+    def export(
+        self, job, filename, format_type, start_dt, end_dt, statuses=None, tag=None
+    ):
+        """BackgroundWorker job writing a report to filename; returns the row count"""
+        from reports import BINARY_FORMATS, write_report
+
+        total = self.report_count(start_dt, end_dt, statuses, tag)
+        job.report_progress(0, total)
+
+        def progress(count):
+            job.raise_if_cancelled()
+            job.report_progress(count, total)
+
+        epoch = format_type in BINARY_FORMATS
+        rows = self.report_rows(start_dt, end_dt, statuses, epoch=epoch, tag=tag)
+        try:
+            with tracer.span("report.export", format=format_type, rows=total):
+                return write_report(rows, filename, format_type, progress)
+        finally:
+            rows.close()
+
+    def stats(self, start, end):
+        from analytics import (
+            completed_per_day,
+            pomodoro_summary,
+            pomodoros_per_task,
+            status_totals,
+            tag_summary,
+        )
+
+        with self._session() as session:
+            tags, median = tag_summary(session, start, end)
+            totals = status_totals(session, start, end)
+            pomodoros = pomodoro_summary(session, start, end)
+            per_day = completed_per_day(session, start, end)
+            per_task = pomodoros_per_task(session, start, end)
+        return {
+            "median_cycle_s": median,
+            "tags": tags,
+            "totals": totals,
+            "pomodoros": pomodoros,
+            "completed_per_day": [
+                {"day": day, "tag": tag, "done": count} for day, tag, count in per_day
+            ],
+            "pomodoros_per_task": [
+                {"id": task_id, "title": title, "pomodoros": count}
+                for task_id, title, count in per_task
+            ],
+        }
+
+    def record_pomodoro(self, task_id, started_at, ended_at):
+        from analytics import record_pomodoro
+
+        with self._session() as session:
+            record_pomodoro(session, task_id, started_at, ended_at)
+            session.commit()
+
+
+def open_store():
+    """The store the app should use: a sync server when PYTASKY_SERVER is set"""
+    url = os.environ.get("PYTASKY_SERVER")
+    if url:
+        from remote import RemoteTaskStore
+
+        return RemoteTaskStore(url)
+    return TaskStore()
@@ -0,0 +1,92 @@
+import math
+import time
+
+
+class PomodoroTimer:
+    """Countdown that derives the time left from a monotonic deadline.
+
+    Nothing is decremented per tick, so late callbacks, a busy main loop or
+    pause/resume cannot make it drift. ``schedule(ms, callback)`` and
+    ``cancel(after_id)`` are normally ``root.after`` and ``root.after_cancel``;
+    ``clock`` can be swapped out to drive the timer headlessly.
+    """
+
+    def __init__(
+        self,
+        duration,
+        schedule,
+        cancel,
+        on_tick=None,
+        on_finish=None,
+        clock=time.monotonic,
+    ):
+        self.schedule = schedule
+        self.cancel = cancel
+        self.on_tick = on_tick
+        self.on_finish = on_finish
+        self.clock = clock
+        self.duration = duration
+        self._remaining = float(duration)
+        self._deadline = None
+        self._after_id = None
+        self._shown = None
+
+    @property
+    def running(self):
+        return self._deadline is not None
+
+    @property
+    def remaining(self):
+        if self._deadline is None:
+            return self._remaining
+        return max(0.0, self._deadline - self.clock())
+
+    @property
+    def remaining_seconds(self):
+        # Round away float noise from the subtraction before ceiling
+        return math.ceil(round(self.remaining, 6))
+
+    def start(self):
+        if self.running or self._remaining <= 0:
+            return
+        self._deadline = self.clock() + self._remaining
+        self._tick()
+
+    def pause(self):
+        if not self.running:
+            return
+        self._remaining = self.remaining
+        self._deadline = None
+        self._cancel_pending()
+
+    def reset(self, duration):
+        self.pause()
+        self.duration = duration
+        self._remaining = float(duration)
+        self._render()
+
+    def _cancel_pending(self):
+        if self._after_id is not None:
+            self.cancel(self._after_id)
+            self._after_id = None
+
+    def _render(self):
+        seconds = self.remaining_seconds
+        if seconds != self._shown:
+            self._shown = seconds
+            if self.on_tick:
+                self.on_tick(seconds)
+
+    def _tick(self):
+        self._after_id = None
+        remaining = self.remaining
+        self._render()
+        if remaining <= 0:
+            self._remaining = 0.0
+            self._deadline = None
+            if self.on_finish:
+                self.on_finish()
+            return
+        # Sleep until just after the displayed second changes
+        delay = remaining - (self.remaining_seconds - 1)
+        self._after_id = self.schedule(max(1, math.ceil(delay * 1000)), self._tick)
@@ -0,0 +1,112 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """Handle shared by a background job and the thread that submitted it"""
+
+    def __init__(self, events):
+        self._events = events
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def raise_if_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, *args):
+        self._events.put((self, "progress", args))
+
+
+class BackgroundWorker:
+    """Run jobs on a thread pool and deliver their events on the Tk thread.
+
+    Jobs never touch widgets; they post events to a queue that is drained
+    through ``schedule`` (normally ``root.after``) while any job is pending.
+    """
+
+    def __init__(self, schedule, poll_ms=50, max_workers=1):
+        self.schedule = schedule
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pytasky-worker"
+        )
+        self._events = queue.Queue()
+        self._callbacks = {}
+        self._polling = False
+
+    @property
+    def busy(self):
+        return bool(self._callbacks)
+
+    def submit(
+        self,
+        func,
+        *args,
+        on_progress=None,
+        on_done=None,
+        on_error=None,
+        on_cancel=None,
+    ):
+        """Run func(job, *args) in the background and return its Job"""
+        job = Job(self._events)
+        self._callbacks[job] = {
+            "progress": on_progress,
+            "done": on_done,
+            "error": on_error,
+            "cancelled": on_cancel,
+        }
+        self._executor.submit(self._run, job, func, args)
+        if not self._polling:
+            self._polling = True
+            self.schedule(self.poll_ms, self._poll)
+        return job
+
+    def _run(self, job, func, args):
+        try:
+            result = func(job, *args)
+        except JobCancelled:
+            self._events.put((job, "cancelled", ()))
+        except Exception as e:
+            self._events.put((job, "error", (e,)))
+        else:
+            self._events.put((job, "done", (result,)))
+
+    def drain(self):
+        """Dispatch queued job events to their callbacks"""
+        while True:
+            try:
+                job, kind, args = self._events.get_nowait()
+            except queue.Empty:
+                return
+            callbacks = self._callbacks.get(job)
+            if callbacks is None:
+                continue
+            if kind != "progress":
+                del self._callbacks[job]
+            callback = callbacks[kind]
+            if callback:
+                callback(*args)
+
+    def _poll(self):
+        self.drain()
+        if self._callbacks:
+            self.schedule(self.poll_ms, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        for job in list(self._callbacks):
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,218 @@
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from analytics import (
+    completed_per_day,
+    estimate_median,
+    pomodoro_summary,
+    pomodoros_per_task,
+    record_pomodoro,
+    status_totals,
+    tag_summary,
+)
+from models import (
+    ALL_TASKS_TAG,
+    CYCLE_TIME_BUCKETS,
+    Base,
+    CycleTimeRollup,
+    DailyRollup,
+    Task,
+    tag_counts,
+    upgrade_schema,
+)
+
+
+class TestAnalytics(unittest.TestCase):
+    def setUp(self):
+        self.engine = engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        self.addCleanup(engine.dispose)
+        self.session = sessionmaker(bind=engine)()
+        self.start = datetime(2025, 3, 1)
+        self.end = datetime(2025, 3, 31)
+
+    def tearDown(self):
+        self.session.close()
+
+    def add(self, tag, created, status="todo"):
+        task = Task(
+            title="t", tag=tag, status=status, created_at=created, last_updated=created
+        )
+        self.session.add(task)
+        self.session.commit()
+        return task
+
+    def finish(self, task, when, status="done"):
+        task.status = status
+        task.completed_at = when
+        task.last_updated = when
+        self.session.commit()
+
+    def test_status_transitions_update_rollups(self):
+        day = datetime(2025, 3, 3, 9)
+        a = self.add("work", day)
+        b = self.add("work", day)
+        c = self.add(None, day)
+        self.finish(a, day + timedelta(hours=2))
+        self.finish(b, day + timedelta(days=1, hours=8))
+        self.finish(c, day + timedelta(hours=1), status="cancelled")
+        # Saving without a status change must not count again
+        a.title = "renamed"
+        self.session.commit()
+
+        self.assertEqual(
+            completed_per_day(self.session, self.start, self.end),
+            [("2025-03-03", "work", 1), ("2025-03-04", "work", 1)],
+        )
+        summary, median = tag_summary(self.session, self.start, self.end)
+        self.assertEqual(summary["work"]["done"], 2)
+        self.assertEqual(summary[""]["cancelled"], 1)
+        self.assertEqual(summary["work"]["mean_cycle_s"], (2 + 32) * 3600 / 2)
+        self.assertLessEqual(2 * 3600, median)
+        self.assertLessEqual(median, 32 * 3600)
+        todo = self.session.get(DailyRollup, ("2025-03-03", "work", "todo"))
+        self.assertEqual(todo.transitions, 2)
+
+    def test_rollups_count_each_tag_of_a_task(self):
+        day = datetime(2025, 3, 3, 9)
+        tags = ["docs, urgent", "Docs", "urgent,URGENT", 'say "hi",a\\b', " , "]
+        for tag in tags:
+            self.finish(self.add(tag, day), day + timedelta(hours=1))
+
+        per_day = completed_per_day(self.session, self.start, self.end)
+        self.assertEqual(
+            per_day,
+            [
+                ("2025-03-03", "", 1),
+                ("2025-03-03", "a\\b", 1),
+                ("2025-03-03", "docs", 2),
+                ("2025-03-03", 'say "hi"', 1),
+                ("2025-03-03", "urgent", 2),
+            ],
+        )
+        # The same counts as the tag index
+        self.assertEqual(
+            sorted(tag_counts(self.session, ["done"])),
+            sorted((tag, count) for _, tag, count in per_day if tag),
+        )
+        summary, median = tag_summary(self.session, self.start, self.end)
+        self.assertEqual(summary["docs"]["done"], 2)
+        self.assertNotIn(ALL_TASKS_TAG, summary)
+        self.assertEqual(median, summary["docs"]["median_cycle_s"])
+        totals = status_totals(self.session, self.start, self.end)
+        self.assertEqual(totals, {"todo": 5, "done": 5})
+
+    def test_upgrade_splits_rollups_kept_by_tag_text(self):
+        with self.engine.begin() as conn:
+            for trigger in ("tasks_rollup_insert", "tasks_rollup_status"):
+                conn.exec_driver_sql(f"DROP TRIGGER {trigger}")
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER {trigger} AFTER DELETE ON tasks BEGIN SELECT 1; END"
+                )
+            conn.execute(
+                DailyRollup.__table__.insert(),
+                [
+                    {
+                        "day": "2025-03-03",
+                        "tag": tag,
+                        "status": "done",
+                        "transitions": n,
+                        "cycle_seconds": 60 * n,
+                    }
+                    for tag, n in (("docs, urgent", 2), ("urgent", 1), ("", 4))
+                ],
+            )
+            conn.execute(
+                CycleTimeRollup.__table__.insert(),
+                [{"day": "2025-03-03", "tag": "docs, urgent", "bucket": 1, "tasks": 2}],
+            )
+            conn.exec_driver_sql("PRAGMA user_version = 7")
+        upgrade_schema(self.engine)
+
+        self.assertEqual(
+            completed_per_day(self.session, self.start, self.end),
+            [
+                ("2025-03-03", "", 4),
+                ("2025-03-03", "docs", 2),
+                ("2025-03-03", "urgent", 3),
+            ],
+        )
+        self.assertEqual(status_totals(self.session, self.start, self.end), {"done": 7})
+        summary, median = tag_summary(self.session, self.start, self.end)
+        self.assertEqual(summary["urgent"]["mean_cycle_s"], 60)
+        # Two tasks tagged "docs, urgent", each counted once overall
+        self.assertEqual(median, estimate_median({1: 2}))
+
+        # New transitions go through the per-tag triggers
+        self.finish(self.add("docs", datetime(2025, 3, 3)), datetime(2025, 3, 3, 10))
+        self.assertEqual(
+            completed_per_day(self.session, self.start, self.end)[1],
+            ("2025-03-03", "docs", 3),
+        )
+
+    def test_upgrade_merges_tag_spellings_backfilled_before_tags_split(self):
+        engine = create_engine("sqlite://")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        # Tasks written before version 3, so without rollup triggers or tag links
+        with engine.begin() as conn:
+            conn.execute(
+                Task.__table__.insert(),
+                [
+                    {
+                        "title": "t",
+                        "tag": tag,
+                        "status": "done",
+                        "created_at": datetime(2025, 3, 3, 9),
+                        "completed_at": datetime(2025, 3, 3, 10),
+                        "last_updated": datetime(2025, 3, 3, 10),
+                    }
+                    for tag in ("docs", "Docs", "urgent, DOCS")
+                ],
+            )
+        upgrade_schema(engine)
+
+        session = sessionmaker(bind=engine)()
+        self.addCleanup(session.close)
+        self.assertEqual(
+            sorted(tag_counts(session, ["done"])), [("docs", 3), ("urgent", 1)]
+        )
+        self.assertEqual(
+            completed_per_day(session, self.start, self.end),
+            [("2025-03-03", "docs", 3), ("2025-03-03", "urgent", 1)],
+        )
+        summary, _ = tag_summary(session, self.start, self.end)
+        self.assertEqual(sorted(summary), ["docs", "urgent"])
+        self.assertEqual(summary["docs"]["done"], 3)
+        self.assertEqual(status_totals(session, self.start, self.end), {"done": 3})
+
+    def test_estimate_median_interpolates_within_bucket(self):
+        self.assertIsNone(estimate_median({}))
+        lower, upper = CYCLE_TIME_BUCKETS[9], CYCLE_TIME_BUCKETS[10]
+        self.assertEqual(estimate_median({10: 2}), (lower + upper) / 2)
+        self.assertEqual(estimate_median({0: 1, 10: 1}), CYCLE_TIME_BUCKETS[0])
+
+    def test_pomodoros(self):
+        task = self.add("work", datetime(2025, 3, 2))
+        for minute in (0, 30, 60):
+            ended = datetime(2025, 3, 5, 10, minute % 60) + timedelta(
+                hours=minute // 60
+            )
+            record_pomodoro(self.session, task.id, ended - timedelta(minutes=25), ended)
+        record_pomodoro(
+            self.session, None, datetime(2025, 3, 31, 9), datetime(2025, 3, 31, 9, 25)
+        )
+        self.session.commit()
+        stats = pomodoro_summary(self.session, self.start, self.end)
+        self.assertEqual(stats["pomodoros"], 4)
+        self.assertEqual(stats["tasks"], 1)
+        self.assertAlmostEqual(stats["focus_hours"], 100 / 60)
+        self.assertEqual(
+            pomodoros_per_task(self.session, self.start, self.end), [(task.id, "t", 3)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
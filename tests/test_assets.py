@@ -0,0 +1,129 @@
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+import assets
+from assets import (
+    PNG_SIGNATURE,
+    find_variant,
+    read_png,
+    render_variants,
+    scale,
+    variant_name,
+    write_png,
+)
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def filtered_png(path, width, rows, bpp=4):
+    """Write rows as a PNG using filter type y % 5 on row y"""
+    raw, prev = b"", bytes(width * bpp)
+    for y, line in enumerate(rows):
+        kind = y % 5
+        out = bytearray()
+        for i, x in enumerate(line):
+            a = line[i - bpp] if i >= bpp else 0
+            c = prev[i - bpp] if i >= bpp else 0
+            predictor = [0, a, prev[i], (a + prev[i]) >> 1, _paeth(a, prev[i], c)]
+            out.append((x - predictor[kind]) & 255)
+        raw += bytes([kind]) + bytes(out)
+        prev = line
+
+    def chunk(kind, body):
+        crc = struct.pack(">I", zlib.crc32(kind + body))
+        return struct.pack(">I", len(body)) + kind + body + crc
+
+    color = 6 if bpp == 4 else 2
+    header = struct.pack(">IIBBBBB", width, len(rows), 8, color, 0, 0, 0)
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE + chunk(b"IHDR", header))
+        f.write(chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+class TestAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_every_png_filter_type_decodes(self):
+        rows = [bytes((x * 37 + y * 11) % 256 for x in range(24)) for y in range(10)]
+        filtered_png(self.path("rgba.png"), 6, rows)
+        self.assertEqual(read_png(self.path("rgba.png")), (6, 10, rows))
+
+        filtered_png(self.path("rgb.png"), 8, [row[:24] for row in rows], bpp=3)
+        _, _, decoded = read_png(self.path("rgb.png"))
+        self.assertEqual(decoded[3][:8], rows[3][:3] + b"\xff" + rows[3][3:6] + b"\xff")
+
+        write_png(self.path("copy.png"), 6, 10, rows)
+        self.assertEqual(read_png(self.path("copy.png")), (6, 10, rows))
+
+    def test_scaling_averages_in_premultiplied_alpha(self):
+        red, clear = b"\xff\x00\x00\xff", b"\x00\x00\x00\x00"
+        blue = b"\x00\x00\xff\xff"
+        rows = [red + clear + blue * 2, clear + clear + blue * 2]
+        self.assertEqual(
+            scale(4, 2, rows, 2, 1),
+            # Transparent pixels add no black to the red edge
+            [bytearray(b"\xff\x00\x00\x40" + b"\x00\x00\xff\xff")],
+        )
+
+    def test_variants_are_rendered_once_and_found_by_width(self):
+        source = self.path("logo.png")
+        write_png(source, 600, 10, [bytes(range(240)) * 10] * 10)
+        out = self.path("assets")
+        paths = render_variants(source, (160, 240, 320, 480), out)
+        self.assertEqual(read_png(paths[1])[:2], (240, 4))
+        mtime = os.path.getmtime(paths[0])
+        render_variants(source, (160, 240, 320, 480), out)
+        self.assertEqual(os.path.getmtime(paths[0]), mtime)
+
+        dirs = [self.path("bundled"), out]
+        self.assertEqual(find_variant(source, 200, dirs), paths[1])
+        self.assertEqual(find_variant(source, 900, dirs), paths[3])
+        os.remove(paths[1])
+        self.assertEqual(find_variant(source, 200, dirs), paths[2])
+
+        # Each original is hashed once, until it changes
+        with mock.patch.object(
+            assets.hashlib, "sha1", wraps=assets.hashlib.sha1
+        ) as sha1:
+            for width in (16, 200, 900):
+                find_variant(source, width, dirs)
+            self.assertEqual(sha1.call_count, 0)
+
+            # A new original is never matched with the old variants
+            write_png(source, 600, 10, [bytes(range(240, 0, -1)) * 10] * 10)
+            later = os.stat(source).st_mtime_ns + 1_000_000_000
+            os.utime(source, ns=(later, later))
+            self.assertIsNone(find_variant(source, 200, dirs))
+            self.assertEqual(sha1.call_count, 1)
+        self.assertNotEqual(variant_name(source, 240), os.path.basename(paths[1]))
+
+    def test_rendering_stops_when_checked(self):
+        source = self.path("icon.png")
+        write_png(source, 64, 64, [bytes(256)] * 64)
+
+        def cancel():
+            raise InterruptedError
+
+        with self.assertRaises(InterruptedError):
+            render_variants(source, (16, 32), self.path("out"), check=cancel)
+        self.assertEqual(os.listdir(self.path("out")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from sqlalchemy import create_engine
+import models
+from models import Base, Task, upgrade_schema
+from cli import main
+from importer import import_tasks, iter_json_array
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine("sqlite:///" + self.path("tasks.db"))
+        Base.metadata.create_all(self.engine)
+        models.Session.configure(bind=self.engine)
+
+    def tearDown(self):
+        models.Session.configure(bind=models.engine)
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def run_cli(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            code = main(list(argv))
+        return code, out.getvalue()
+
+    def tasks(self):
+        session = models.get_session()
+        tasks = session.query(Task).order_by(Task.id).all()
+        session.close()
+        return tasks
+
+    def test_add_list_and_update(self):
+        code, out = self.run_cli("add", "Write docs", "--tag", "docs")
+        self.assertEqual((code, out.strip()), (0, "1"))
+        self.run_cli("add", "Ship it", "--status", "done")
+
+        code, out = self.run_cli("list")
+        self.assertEqual(len(out.splitlines()), 1)
+        self.assertTrue(out.startswith("1. Write docs [todo"))
+
+        self.assertEqual(self.run_cli("update", "1", "--status", "done")[0], 0)
+        self.assertEqual(self.run_cli("list")[1], "")
+        self.assertEqual(len(self.run_cli("list", "--done")[1].splitlines()), 2)
+        self.assertIsNotNone(self.tasks()[0].completed_at)
+        self.assertEqual(self.run_cli("update", "99", "--title", "x")[0], 1)
+
+        self.assertEqual(self.run_cli("update", "1", "2", "--status", "todo")[0], 0)
+        self.assertEqual(len(self.run_cli("list")[1].splitlines()), 2)
+        self.assertEqual(self.run_cli("update", "1", "2", "--title", "x")[0], 2)
+        self.assertEqual(self.run_cli("update", "1", "99", "--tag", "x")[0], 1)
+        self.assertEqual(self.tasks()[0].tag, "x")
+        self.assertEqual(self.run_cli("delete", "1", "2"), (0, "Deleted 2 tasks\n"))
+        self.assertEqual(self.tasks(), [])
+
+    def test_recurring_tasks(self):
+        code, out = self.run_cli(
+            "recur", "add", "Standup", "--rule", "daily 09:30", "--tag", "work"
+        )
+        self.assertEqual(code, 0)
+        self.assertTrue(out.startswith("1\tnext "))
+        self.assertEqual(self.run_cli("recur", "add", "Bad", "--rule", "hourly")[0], 1)
+        code, out = self.run_cli("recur", "list")
+        self.assertTrue(out.rstrip().endswith("\tdaily 09:30\tStandup"))
+
+        session = models.get_session()
+        session.query(models.Recurrence).update(
+            {"next_fire_at": datetime(2026, 10, 16, 9, 30)}
+        )
+        session.commit()
+        session.close()
+        code, out = self.run_cli("recur", "run")
+        self.assertGreaterEqual(len(self.tasks()), 2)
+        self.assertEqual(out, f"Added {len(self.tasks())} recurring tasks\n")
+        self.assertEqual(self.run_cli("recur", "run")[1], "Added 0 recurring tasks\n")
+
+        self.assertEqual(self.run_cli("recur", "delete", "1")[0], 0)
+        self.assertEqual(self.run_cli("recur", "delete", "1")[0], 1)
+        self.assertEqual(self.run_cli("recur", "list")[1], "")
+
+    def test_import_formats_and_export(self):
+        records = [
+            {"title": "From JSON", "status": "done", "tag": "a"},
+            {"title": "Second", "created_at": "2025-03-01 10:00:00"},
+        ]
+        with open(self.path("in.json"), "w") as f:
+            json.dump(records, f, indent=2)
+        with open(self.path("in.ndjson"), "w") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records))
+        with open(self.path("in.csv"), "w") as f:
+            f.write("Title,Status,Tag\nFrom CSV,blocked,b\n")
+
+        for name in ("in.json", "in.ndjson", "in.csv"):
+            self.assertEqual(self.run_cli("import", self.path(name))[0], 0)
+
+        tasks = self.tasks()
+        self.assertEqual(
+            [t.title for t in tasks],
+            ["From JSON", "Second", "From JSON", "Second", "From CSV"],
+        )
+        self.assertIsNotNone(tasks[0].completed_at)
+        self.assertEqual(tasks[4].status, "blocked")
+
+        code, _ = self.run_cli(
+            "export",
+            self.path("out.ndjson"),
+            "--format",
+            "ndjson",
+            "--start",
+            "2025-03-01",
+            "--end",
+            "2025-03-02",
+        )
+        with open(self.path("out.ndjson")) as f:
+            self.assertEqual([json.loads(line)["title"] for line in f], ["Second"] * 2)
+
+    def test_archive_moves_old_done_tasks(self):
+        with open(self.path("old.ndjson"), "w") as f:
+            for completed in ("2020-01-01 10:00:00", "2025-06-01 10:00:00"):
+                record = {"title": completed, "status": "done"}
+                record["completed_at"] = completed
+                f.write(json.dumps(record) + "\n")
+        self.run_cli("import", self.path("old.ndjson"))
+
+        code, out = self.run_cli("archive", "--before", "2021-01-01")
+        self.assertEqual((code, out.split()[1]), (0, "1"))
+        self.assertEqual([t.title for t in self.tasks()], ["2025-06-01 10:00:00"])
+
+    def test_changes_prints_the_log_after_a_sequence_number(self):
+        upgrade_schema(self.engine)
+        self.run_cli("add", "Write docs")
+        self.run_cli("update", "1", "--tag", "docs")
+
+        code, out = self.run_cli("changes", "--since", "1")
+        changes = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual(code, 0)
+        self.assertEqual([(c["seq"], c["op"]) for c in changes], [(2, "update")])
+        self.assertEqual(changes[0]["fields"]["tag"], "docs")
+
+    def test_tags_filter_lists_and_exports(self):
+        upgrade_schema(self.engine)
+        records = [
+            {"title": "Docs", "tag": "docs, urgent"},
+            {"title": "Bug", "tag": "bugs"},
+            {"title": "Release notes", "tag": "Docs", "status": "done"},
+        ]
+        with open(self.path("tasks.json"), "w") as f:
+            json.dump(records, f)
+        self.run_cli("import", self.path("tasks.json"))
+        self.run_cli("add", "Review", "--tag", "urgent")
+
+        code, out = self.run_cli("tags")
+        self.assertEqual(
+            (code, out.splitlines()), (0, ["2\tdocs", "2\turgent", "1\tbugs"])
+        )
+        self.assertEqual(self.run_cli("tags", "--status", "todo")[1].count("docs"), 1)
+        out = self.run_cli("list", "--tag", "urgent")[1]
+        self.assertEqual(
+            [line.split(" [")[0] for line in out.splitlines()], ["1. Docs", "4. Review"]
+        )
+
+        report = self.path("docs.json")
+        self.run_cli("export", report, "--tag", "DOCS", "--end", "2100-01-01")
+        with open(report) as f:
+            self.assertEqual(
+                [r["title"] for r in json.load(f)], ["Docs", "Release notes"]
+            )
+
+    def test_import_rejects_bad_records_atomically(self):
+        with open(self.path("bad.ndjson"), "w") as f:
+            f.write('{"title": "ok"}\n{"notes": "no title"}\n')
+        self.assertEqual(self.run_cli("import", self.path("bad.ndjson"))[0], 1)
+        self.assertEqual(self.tasks(), [])
+
+        # A status the lists don't show would hide the task for good
+        with open(self.path("status.csv"), "w") as f:
+            f.write("Title,Status\nFine,todo\nTypo,Done\n")
+        self.assertEqual(self.run_cli("import", self.path("status.csv"))[0], 1)
+        self.assertEqual(self.tasks(), [])
+
+    def test_import_names_the_record_of_a_malformed_one(self):
+        session = models.get_session()
+        self.addCleanup(session.close)
+        for records, message in (
+            ([1, 2], "Record 1: expected a task object, not 1"),
+            ([{"title": "ok"}, {"title": 123}], "Record 2: title must be text"),
+            ([{"title": "ok", "tag": ["a"]}], "Record 1: tag must be text"),
+            (
+                [{"title": "ok"}, {"title": "x", "created_at": "2025-13-01"}],
+                "Record 2: bad created_at '2025-13-01'",
+            ),
+            ([{"title": "x", "completed_at": [2025]}], "Record 1: bad completed_at"),
+        ):
+            with self.subTest(records=records):
+                with self.assertRaises(ValueError) as caught:
+                    import_tasks(session, records)
+                self.assertTrue(str(caught.exception).startswith(message))
+                session.rollback()
+
+        for name, text in (
+            ("numbers.json", "[1, 2]"),
+            ("title.json", '[{"title": 123}]'),
+            ("date.ndjson", '{"title": "x", "created_at": "2025-13-01"}\n'),
+            ("broken.ndjson", '{"title": "x"}\n{"title": \n'),
+        ):
+            with open(self.path(name), "w") as f:
+                f.write(text)
+            err = io.StringIO()
+            with contextlib.redirect_stderr(err):
+                self.assertEqual(main(["import", self.path(name)]), 1)
+            self.assertRegex(err.getvalue(), r"^pytasky: (Record|Line) [12]: ")
+        self.assertEqual(self.tasks(), [])
+
+    def test_json_array_streams_across_chunks(self):
+        records = [{"title": f"Task {i}", "notes": "x" * 50} for i in range(100)]
+        f = io.StringIO(json.dumps(records, indent=2))
+        self.assertEqual(list(iter_json_array(f, chunk_size=64)), records)
+
+
+if __name__ == "__main__":
+    unittest.main()
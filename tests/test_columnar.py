@@ -0,0 +1,67 @@
+import io
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from columnar import read_columnar, read_footer, write_columnar
+
+SCHEMA = [
+    ("id", "int64"),
+    ("title", "string"),
+    ("tag", "dictionary"),
+    ("created_at", "timestamp"),
+]
+
+
+class TestColumnar(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "tasks.ptc")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, rows, **kwargs):
+        with open(self.path, "wb") as f:
+            return write_columnar(rows, f, SCHEMA, **kwargs)
+
+    def test_round_trip_across_row_groups(self):
+        rows = [
+            (
+                i,
+                None if i % 5 == 0 else f"Tâche {i} ✓",
+                [None, "work", "home"][i % 3],
+                None if i % 4 == 0 else datetime(2025, 3, 1, 9, 30, i % 60),
+            )
+            for i in range(1, 101)
+        ]
+        self.assertEqual(self.write(rows, row_group_size=32), 100)
+
+        columns = read_columnar(self.path)
+        self.assertEqual(columns["id"], list(range(1, 101)))
+        self.assertEqual(columns["title"], [row[1] for row in rows])
+        self.assertEqual(columns["tag"], [row[2] for row in rows])
+        self.assertEqual(columns["created_at"][:2], [1740821401, 1740821402])
+        self.assertIsNone(columns["created_at"][3])
+        with open(self.path, "rb") as f:
+            footer = read_footer(f)
+        self.assertEqual([g["rows"] for g in footer["row_groups"]], [32, 32, 32, 4])
+        self.assertEqual(
+            footer["row_groups"][0]["columns"]["tag"]["dictionary"], ["work", "home"]
+        )
+
+    def test_report_text_and_datetimes_give_the_same_timestamps(self):
+        self.write([(1, "a", "x", "2025-03-01 09:30:01"), (2, "b", "x", 1740821401)])
+        self.assertEqual(
+            read_columnar(self.path, ["created_at"])["created_at"], [1740821401] * 2
+        )
+
+    def test_empty_and_foreign_files(self):
+        self.assertEqual(self.write([]), 0)
+        self.assertEqual(read_columnar(self.path), {name: [] for name, _ in SCHEMA})
+        with self.assertRaises(ValueError):
+            read_footer(io.BytesIO(b"id,title\n1,a\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
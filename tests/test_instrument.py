@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+import instrument
+from instrument import tracer, traced
+from models import Base, Task
+
+
+@traced("work")
+def work(fail=False):
+    if fail:
+        raise ValueError("failed")
+    return 42
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.sessions = sessionmaker(bind=self.engine)
+        tracer.reset()
+
+    def tearDown(self):
+        tracer.disable()
+        tracer.reset()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def counts(self):
+        return {name: stats.count for name, stats in tracer.summary()}
+
+    def add_task(self):
+        session = self.sessions()
+        session.add(Task(title="Task", status="todo"))
+        session.commit()
+        session.query(Task).count()
+        session.close()
+
+    def test_nothing_is_recorded_or_hooked_while_disabled(self):
+        self.assertIs(tracer.span("a"), tracer.span("b"))
+        self.assertEqual(work(), 42)
+        self.add_task()
+        self.assertEqual(self.counts(), {})
+        self.assertFalse(
+            event.contains(
+                Engine, "before_cursor_execute", instrument._before_cursor_execute
+            )
+        )
+
+    def test_spans_queries_and_commits_are_recorded(self):
+        tracer.enable()
+        self.assertEqual(work(), 42)
+        with self.assertRaises(ValueError):
+            work(fail=True)
+        with tracer.span("block"):
+            self.add_task()
+
+        counts = self.counts()
+        self.assertEqual(
+            (counts["work"], counts["block"], counts["session.commit"]), (2, 1, 1)
+        )
+        self.assertEqual((counts["sql.insert"], counts["sql.select"]), (1, 1))
+        stats = dict(tracer.summary())["block"]
+        self.assertGreaterEqual(stats.total_s, stats.max_s)
+        self.assertGreater(stats.mean_s, 0)
+
+        tracer.disable()
+        self.add_task()
+        self.assertEqual(self.counts(), counts)
+
+    def test_trace_file_gets_one_json_line_per_span(self):
+        path = os.path.join(self.tmpdir.name, "trace.jsonl")
+        tracer.enable(path)
+        with tracer.span("refresh", rows=3):
+            pass
+        with self.assertRaises(ValueError):
+            work(fail=True)
+        self.add_task()
+        tracer.disable()
+
+        with open(path) as f:
+            spans = [json.loads(line) for line in f]
+        self.assertEqual([span["span"] for span in spans[:2]], ["refresh", "work"])
+        self.assertEqual((spans[0]["rows"], spans[1]["error"]), (3, "ValueError"))
+        insert = next(span for span in spans if span["span"] == "sql.insert")
+        self.assertTrue(insert["statement"].startswith("INSERT INTO tasks"))
+        self.assertEqual(spans[-1]["span"], "sql.select")
+        self.assertIsNone(tracer.trace_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
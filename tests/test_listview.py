@@ -0,0 +1,315 @@
+import tkinter as tk
+import unittest
+from datetime import datetime
+from listview import (
+    PagedTaskListModel,
+    TaskListModel,
+    TaskRow,
+    TaskSelection,
+    VirtualListView,
+    active_sort_key,
+    done_sort_key,
+    format_active_row,
+    format_done_row,
+)
+
+
+def make_row(task_id, status="todo", completed_at=None, tag=None):
+    created = datetime(2025, 3, 1, 9, 0, 0)
+    return TaskRow(
+        task_id, f"Task {task_id}", None, tag, status, created, completed_at, created
+    )
+
+
+class TestTaskListModel(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.model = TaskListModel(format_active_row, active_sort_key)
+        self.model.subscribe(lambda kind, index: self.events.append((kind, index)))
+
+    def test_load_sorts_rows(self):
+        self.model.load([make_row(3), make_row(1), make_row(2)])
+        self.assertEqual([self.model.row(i).id for i in range(3)], [1, 2, 3])
+        self.assertEqual(self.events, [("reset", None)])
+
+    def test_upsert_inserts_in_order(self):
+        self.model.load([make_row(1), make_row(5)])
+        self.model.upsert(make_row(3))
+        self.assertEqual(self.model.index_of(3), 1)
+        self.assertEqual(self.events[-1], ("insert", 1))
+
+    def test_upsert_updates_in_place_and_refreshes_text(self):
+        self.model.load([make_row(1)])
+        self.assertIn("todo", self.model.text(0))
+        self.model.upsert(make_row(1, status="blocked"))
+        self.assertEqual(self.events[-1], ("update", 0))
+        self.assertIn("blocked", self.model.text(0))
+
+    def test_remove(self):
+        self.model.load([make_row(1), make_row(2)])
+        self.assertEqual(self.model.remove(1), 0)
+        self.assertIsNone(self.model.remove(1))
+        self.assertEqual(len(self.model), 1)
+        self.assertNotIn(1, self.model)
+
+    def test_ids_stay_parallel_to_rows(self):
+        self.model.load([make_row(4), make_row(2), make_row(8)])
+        self.model.upsert(make_row(6))
+        self.model.remove(2)
+        self.model.upsert(make_row(1, status="blocked"))
+        self.assertEqual(
+            [self.model.id_at(i) for i in range(len(self.model))],
+            [self.model.row(i).id for i in range(len(self.model))],
+        )
+        self.assertEqual([self.model.id_at(i) for i in range(4)], [1, 4, 6, 8])
+
+    def test_done_order_is_descending_with_missing_dates_last(self):
+        model = TaskListModel(format_done_row, done_sort_key, reverse=True)
+        model.load(
+            [
+                make_row(1, "done", datetime(2025, 3, 1)),
+                make_row(2, "done", None),
+                make_row(3, "done", datetime(2025, 3, 5)),
+            ]
+        )
+        model.upsert(make_row(4, "cancelled", datetime(2025, 3, 3)))
+        self.assertEqual([model.row(i).id for i in range(4)], [3, 4, 1, 2])
+        model.upsert(make_row(2, "done", datetime(2025, 3, 9)))
+        self.assertEqual(model.index_of(2), 0)
+        self.assertEqual([model.id_at(i) for i in range(4)], [2, 3, 4, 1])
+        self.assertIn("Completed: 2025-03-09 00:00:00", model.text(0))
+
+
+class TestPagedTaskListModel(unittest.TestCase):
+    def setUp(self):
+        self.history = [make_row(i, "done", datetime(2025, 3, i)) for i in range(1, 11)]
+        self.fetches = []
+        self.model = PagedTaskListModel(
+            format_done_row, done_sort_key, self.fetch, reverse=True, page_size=4
+        )
+
+    def fetch(self, after, limit):
+        self.fetches.append(after and after.id)
+        rows = sorted(self.history, key=done_sort_key, reverse=True)
+        if after is not None:
+            rows = [row for row in rows if done_sort_key(row) < done_sort_key(after)]
+        return rows[:limit]
+
+    def ids(self):
+        return [self.model.id_at(i) for i in range(len(self.model))]
+
+    def test_pages_are_fetched_on_demand(self):
+        self.model.reload()
+        self.assertEqual(self.ids(), [10, 9, 8, 7])
+        self.model.ensure_loaded(6)
+        self.assertEqual(self.ids(), [10, 9, 8, 7, 6, 5, 4, 3])
+        self.model.ensure_loaded(100)
+        self.assertEqual(len(self.model), 10)
+        self.assertFalse(self.model.has_more)
+        self.assertEqual(self.fetches, [None, 7, 3])
+
+    def test_upsert_past_the_last_page_is_left_for_later_pages(self):
+        self.model.upsert(make_row(11, "done", datetime(2025, 3, 11)))
+        self.assertEqual(len(self.model), 0)
+
+        self.model.reload()
+        self.model.upsert(make_row(11, "done", datetime(2025, 3, 11)))
+        self.assertEqual(self.ids(), [11, 10, 9, 8, 7])
+        # Re-completed long ago: now sorts beyond the loaded page
+        self.history[8] = make_row(9, "done", datetime(2025, 2, 1))
+        self.model.upsert(self.history[8])
+        self.assertEqual(self.ids(), [11, 10, 8, 7])
+        self.model.ensure_loaded(100)
+        self.assertEqual(self.ids(), [11, 10, 8, 7, 6, 5, 4, 3, 2, 1, 9])
+
+    def test_accepts_filters_patched_rows(self):
+        self.model.reload()
+        self.model.accepts = lambda row: row.completed_at >= datetime(2025, 3, 8)
+        self.model.upsert(make_row(11, "done", datetime(2025, 3, 11)))
+        self.model.upsert(make_row(8, "done", datetime(2025, 3, 1)))
+        self.assertEqual(self.ids(), [11, 10, 9, 7])
+
+
+class TestTaskSelection(unittest.TestCase):
+    def setUp(self):
+        self.model = TaskListModel(format_active_row, active_sort_key)
+        self.model.load([make_row(i) for i in range(1, 11)])
+        self.selection = TaskSelection()
+
+    def test_click_control_click_and_shift_click(self):
+        self.selection.set(3)
+        self.selection.toggle(7)
+        self.assertEqual((self.selection.ids, self.selection.anchor), ({3, 7}, 7))
+        self.selection.toggle(3)
+        self.assertEqual((self.selection.ids, self.selection.anchor), ({7}, 3))
+
+        # Ranges run from the anchor, in either direction
+        self.selection.extend(self.model, self.model.index_of(6))
+        self.assertEqual(self.selection.ids, {3, 4, 5, 6})
+        self.selection.extend(self.model, self.model.index_of(1))
+        self.assertEqual((self.selection.ids, self.selection.anchor), ({1, 2, 3}, 3))
+        self.assertEqual(self.selection.cursor, 1)
+
+    def test_select_all_and_prune(self):
+        self.selection.select_all(self.model)
+        self.assertEqual(len(self.selection), 10)
+        self.assertEqual(self.selection.anchor, 1)
+
+        self.model.remove(1)
+        self.model.remove(2)
+        self.selection.prune(self.model)
+        self.assertEqual(self.selection.ids, set(range(3, 11)))
+        self.assertIsNone(self.selection.anchor)
+        # Without an anchor a range starts where it ends
+        self.selection.extend(self.model, 0)
+        self.assertEqual((self.selection.ids, self.selection.anchor), ({3}, 3))
+
+
+class TestVirtualListView(unittest.TestCase):
+    """Drives the widget with generated events; needs a display (xvfb in CI)"""
+
+    def setUp(self):
+        try:
+            self.root = tk.Tk()
+        except tk.TclError as error:
+            self.skipTest(f"no display: {error}")
+        self.model = TaskListModel(format_active_row, active_sort_key)
+        self.model.load([make_row(i) for i in range(1, 101)])
+        self.view = VirtualListView(self.root, self.model, height=10)
+        self.view.pack(fill="both", expand=True)
+        self.selects = []
+        self.view.bind("<<ListboxSelect>>", lambda event: self.selects.append(1))
+        self.root.update()
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def click(self, index, sequence="<Button-1>"):
+        """Click the row at model ``index``, which must be on screen"""
+        row = index - self.view._top
+        self.assertTrue(0 <= row < self.view._visible, "row is not on screen")
+        self.root.update()
+        x, y, width, height = self.view.listbox.bbox(row)
+        self.view.listbox.event_generate(sequence, x=x + 1, y=y + height // 2)
+        self.root.update()
+
+    def key(self, sequence):
+        self.view.listbox.focus_force()
+        self.root.update()
+        self.view.listbox.event_generate(sequence)
+        self.root.update()
+
+    def highlighted_ids(self):
+        """Ids of the rows the listbox shows as selected"""
+        top = self.view._top
+        return {self.model.id_at(top + row) for row in self.view.listbox.curselection()}
+
+    def selection_cursor_index(self):
+        return self.model.index_of(self.view.selection.cursor)
+
+    def test_only_a_screenful_of_rows_is_rendered(self):
+        self.assertEqual(self.view.size(), 100)
+        self.assertEqual(self.view.listbox.size(), self.view._visible)
+        self.assertLess(self.view._visible, 100)
+
+    def test_shift_click_selects_a_range_across_scrolling(self):
+        self.click(2)
+        self.assertEqual(self.view.selected_ids(), [3])
+
+        self.view.scroll(50)
+        self.assertEqual(self.view._top, 50)
+        self.assertEqual(self.highlighted_ids(), set())
+        self.click(55, "<Shift-Button-1>")
+
+        # Rows scrolled past, never rendered, are selected too
+        self.assertEqual(set(self.view.selected_ids()), set(range(3, 57)))
+        self.assertEqual(self.view.selected_id(), 3)
+        self.assertEqual(self.selection_cursor_index(), 55)
+        self.assertEqual(self.highlighted_ids(), set(range(51, 57)))
+
+        self.view.scroll(-50)
+        self.assertEqual(self.highlighted_ids(), set(range(3, 1 + self.view._visible)))
+        self.assertEqual(len(self.selects), 2)
+
+        # A plain click starts over
+        self.click(0)
+        self.assertEqual(self.view.selected_ids(), [1])
+        self.assertEqual(self.highlighted_ids(), {1})
+
+    def test_control_click_toggles_rows_across_scrolling(self):
+        self.click(1)
+        self.view.scroll(40)
+        self.click(40, "<Control-Button-1>")
+        self.click(42, "<Control-Button-1>")
+        self.click(40, "<Control-Button-1>")
+        self.assertEqual(set(self.view.selected_ids()), {2, 43})
+        self.assertEqual(self.highlighted_ids(), {43})
+        # The anchor follows the last click, even one that deselected
+        self.assertEqual(self.view.curselection(), (40,))
+
+        self.view.scroll(-40)
+        self.assertEqual(self.highlighted_ids(), {2})
+
+        # Shift-click ranges then run from that anchor
+        self.view.scroll(35)
+        self.click(38, "<Shift-Button-1>")
+        self.assertEqual(set(self.view.selected_ids()), {39, 40, 41})
+
+    def test_shift_arrows_extend_past_the_bottom_of_the_screen(self):
+        last = self.view._visible - 1
+        self.click(last)
+        for _ in range(5):
+            self.key("<Shift-Down>")
+        self.assertEqual(set(self.view.selected_ids()), set(range(last + 1, last + 7)))
+        # The view follows the cursor, keeping the anchor where it was
+        self.assertEqual(self.view._top, 5)
+        self.assertEqual(self.view.curselection(), (last,))
+        self.assertEqual(self.highlighted_ids(), set(range(last + 1, last + 7)))
+
+        self.key("<Shift-Up>")
+        self.assertEqual(set(self.view.selected_ids()), set(range(last + 1, last + 6)))
+
+        self.key("<Control-a>")
+        self.assertEqual(len(self.view.selected_ids()), 100)
+
+    def test_selection_survives_incremental_reload(self):
+        self.view.scroll(10)
+        self.click(10)
+        self.click(15, "<Shift-Button-1>")
+        self.assertEqual(set(self.view.selected_ids()), set(range(11, 17)))
+
+        # Changes patched in one task at a time, as poll_changes does
+        self.model.upsert(make_row(13, status="blocked"))
+        self.model.remove(12)
+        self.model.upsert(make_row(0))
+        self.model.upsert(make_row(101))
+        self.root.update()
+
+        self.assertEqual(set(self.view.selected_ids()), {11, 13, 14, 15, 16})
+        self.assertEqual(self.view.selected_id(), 11)
+        self.assertIn("blocked", self.view.get(self.model.index_of(13)))
+        # The row inserted above the screen keeps the same rows in view
+        self.assertEqual(self.model.id_at(self.view._top), 11)
+        self.assertEqual(self.highlighted_ids(), {11, 13, 14, 15, 16})
+
+        # Extending keeps working from the anchor, now at a new index
+        self.click(self.model.index_of(18), "<Shift-Button-1>")
+        self.assertEqual(set(self.view.selected_ids()), set(range(11, 19)) - {12})
+
+    def test_full_reload_keeps_the_rows_still_listed(self):
+        self.click(4)
+        self.click(8, "<Shift-Button-1>")
+        self.model.load([make_row(i) for i in range(1, 101) if i not in (5, 7)])
+        self.root.update()
+
+        self.assertEqual(set(self.view.selected_ids()), {6, 8, 9})
+        self.assertEqual(self.view._top, 0)
+        self.assertEqual(self.highlighted_ids(), {6, 8, 9})
+        # The anchor was reloaded away, so a shift-click starts afresh
+        self.assertIsNone(self.view.selected_id())
+        self.click(2, "<Shift-Button-1>")
+        self.assertEqual(self.view.selected_ids(), [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,350 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from models import (
+    SCHEMA_VERSION,
+    ArchivedTask,
+    Base,
+    Task,
+    archive_tasks,
+    changes_since,
+    create_storage_engine,
+    active_tasks_query,
+    delete_tasks,
+    done_bucket_bounds,
+    done_tasks_page,
+    done_tasks_query,
+    last_change_seq,
+    parse_tags,
+    report_query,
+    tag_counts,
+    tagged,
+    update_tasks,
+    upgrade_schema,
+)
+
+LEGACY_SCHEMA = """CREATE TABLE tasks
+    (id INTEGER PRIMARY KEY,
+     title TEXT NOT NULL,
+     notes TEXT,
+     tag TEXT,
+     status TEXT DEFAULT 'todo',
+     created_at TEXT,
+     completed_at TEXT,
+     last_updated TEXT)"""
+
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "tasks.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_engine(self):
+        engine = create_engine(f"sqlite:///{self.db_path}")
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def test_upgrade_adds_indexes_to_legacy_database(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(LEGACY_SCHEMA)
+        connection.commit()
+        connection.close()
+
+        engine = self.make_engine()
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        upgrade_schema(engine)
+
+        with engine.connect() as conn:
+            indexes = {
+                row[0]
+                for row in conn.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'"
+                )
+            }
+            version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        self.assertLessEqual(
+            {
+                "ix_tasks_status_id",
+                "ix_tasks_status_completed_at",
+                "ix_tasks_created_at_status",
+            },
+            indexes,
+        )
+        self.assertEqual(version, SCHEMA_VERSION)
+
+    def test_upgrade_stops_task_ids_from_being_reused(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(LEGACY_SCHEMA)
+        connection.executemany(
+            "INSERT INTO tasks (id, title, tag) VALUES (?, ?, ?)",
+            [(1, "Kept", "docs"), (2, "Deleted later", None)],
+        )
+        connection.commit()
+        connection.close()
+
+        engine = self.make_engine()
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        session = sessionmaker(bind=engine)()
+        session.query(Task).filter(Task.id == 2).delete()
+        session.add(Task(title="New"))
+        session.commit()
+        self.assertEqual(
+            [(t.id, t.title) for t in session.query(Task).order_by(Task.id)],
+            [(1, "Kept"), (3, "New")],
+        )
+        # Nor is the id of an archived task, so archiving never overwrites
+        session.query(Task).filter(Task.id == 3).update(
+            {"status": "done", "completed_at": datetime(2025, 1, 1)}
+        )
+        archive_tasks(session, datetime(2025, 2, 1))
+        session.add(
+            Task(title="Newer", status="done", completed_at=datetime(2025, 1, 2))
+        )
+        session.commit()
+        self.assertEqual(archive_tasks(session, datetime(2025, 2, 1)), 1)
+        session.commit()
+        self.assertEqual(
+            [(t.id, t.title) for t in session.query(ArchivedTask).order_by("id")],
+            [(3, "New"), (4, "Newer")],
+        )
+
+        # Indexes and triggers of the old table came along
+        self.assertEqual(len(changes_since(session)), 6)
+        self.assertEqual(session.query(Task).filter(tagged("docs")).count(), 1)
+        session.close()
+        with engine.connect() as conn:
+            indexes = conn.exec_driver_sql(
+                "SELECT count(*) FROM sqlite_master"
+                " WHERE type = 'index' AND tbl_name = 'tasks' AND sql IS NOT NULL"
+            ).scalar()
+            matches = conn.exec_driver_sql(
+                "SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH 'kept'"
+            ).fetchall()
+        self.assertEqual(indexes, len(Task.__table__.indexes))
+        self.assertEqual(matches, [(1,)])
+
+    def test_list_and_report_queries_use_indexes(self):
+        engine = self.make_engine()
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+
+        plans = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def explain(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                plans.append((statement, [row[3] for row in cursor.fetchall()]))
+
+        session = sessionmaker(bind=engine)()
+        start, end = datetime(2025, 1, 1), datetime(2025, 12, 31)
+        active_tasks_query(session).all()
+        done_tasks_query(session).all()
+        report_query(session, start, end).all()
+        report_query(session, start, end, ["todo", "done"]).all()
+        report_query(session, start, end, tag="docs").all()
+        done_tasks_page(session, tag="docs")
+        tag_counts(session, ["todo"])
+        session.close()
+
+        self.assertEqual(len(plans), 8)
+        for statement, plan in plans:
+            for detail in plan:
+                self.assertFalse(
+                    detail.startswith("SCAN tasks"),
+                    f"full table scan in {plan} for {statement}",
+                )
+
+    def test_done_pages_walk_history_in_keyset_order(self):
+        engine = self.make_engine()
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        latest = datetime(2025, 3, 10)
+        session.execute(
+            insert(Task),
+            [
+                {
+                    "title": f"Task {i}",
+                    "status": ("done", "cancelled", "todo")[i % 3],
+                    # Pairs of tasks share a completion time; every 7th has none
+                    "completed_at": latest - timedelta(hours=i // 2) if i % 7 else None,
+                }
+                for i in range(300)
+            ],
+        )
+        expected = sorted(
+            session.query(Task).filter(Task.status.in_(["done", "cancelled"])),
+            key=lambda task: (task.completed_at or datetime.min, task.id),
+            reverse=True,
+        )
+
+        plans = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def explain(conn, cursor, statement, parameters, context, executemany):
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plans.extend(row[3] for row in cursor.fetchall())
+
+        seen, after = [], None
+        while True:
+            page = done_tasks_page(session, after, limit=17)
+            seen.extend(page)
+            if len(page) < 17:
+                break
+            after = (page[-1].completed_at, page[-1].id)
+        event.remove(engine, "before_cursor_execute", explain)
+        self.assertEqual(seen, expected)
+        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plans)
+
+        wednesday = datetime(2025, 3, 12, 15, 30)
+        self.assertEqual(
+            done_bucket_bounds("Earlier this week", wednesday),
+            (datetime(2025, 3, 10), datetime(2025, 3, 12)),
+        )
+        since = datetime(2025, 3, 9, 12)
+        recent = [t for t in expected if t.completed_at and t.completed_at >= since]
+        self.assertEqual(done_tasks_page(session, since=since), recent)
+
+        cutoff = latest - timedelta(hours=50)
+        archived = [
+            t.id for t in expected if t.completed_at and t.completed_at < cutoff
+        ]
+        self.assertEqual(archive_tasks(session, cutoff), len(archived))
+        session.commit()
+        self.assertEqual(
+            sorted(archived), sorted(t.id for t in session.query(ArchivedTask))
+        )
+        self.assertEqual(session.query(Task).filter(Task.id.in_(archived)).count(), 0)
+        session.close()
+
+    def test_change_log_records_every_mutation_in_order(self):
+        engine = self.make_engine()
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        session = sessionmaker(bind=engine)()
+        self.assertEqual(last_change_seq(session), 0)
+
+        task = Task(title="Task", status="todo", created_at=datetime(2025, 1, 1))
+        session.add(task)
+        session.commit()
+        task.status = "done"
+        task.completed_at = datetime(2025, 1, 2, 9, 30)
+        session.commit()
+        # Updates that leave every value as it was are not logged
+        session.query(Task).update({Task.title: Task.title})
+        session.commit()
+        task_id = task.id
+        archive_tasks(session, datetime(2025, 2, 1))
+        session.rollback()  # rolled back changes are not logged either
+        archive_tasks(session, datetime(2025, 2, 1))
+        session.commit()
+
+        changes = changes_since(session)
+        self.assertEqual(
+            [(c.seq, c.op, c.task_id) for c in changes],
+            [(1, "insert", task_id), (2, "update", task_id), (3, "delete", task_id)],
+        )
+        inserted = json.loads(changes[0].fields)
+        self.assertEqual((inserted["title"], inserted["completed_at"]), ("Task", None))
+        self.assertEqual(
+            json.loads(changes[1].fields),
+            {"status": "done", "completed_at": "2025-01-02 09:30:00.000000"},
+        )
+        self.assertIsNone(changes[2].fields)
+        self.assertEqual([c.seq for c in changes_since(session, 1, limit=1)], [2])
+        self.assertEqual(last_change_seq(session), 3)
+        session.close()
+
+    def test_tags_are_split_into_an_index_kept_in_sync(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(LEGACY_SCHEMA)
+        connection.executemany(
+            "INSERT INTO tasks (title, tag, status) VALUES (?, ?, 'todo')",
+            [("A", "work, Home"), ("B", "home,,home "), ("C", ""), ("D", None)],
+        )
+        connection.commit()
+        connection.close()
+        engine = self.make_engine()
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        session = sessionmaker(bind=engine)()
+        self.assertEqual(tag_counts(session), [("Home", 2), ("work", 1)])
+
+        def titles(name):
+            return sorted(t.title for t in session.query(Task).filter(tagged(name)))
+
+        self.assertEqual(titles("HOME"), ["A", "B"])
+        a, b = session.query(Task).order_by(Task.id)[:2]
+        a.tag = "errands"
+        session.add(Task(title="E", tag="work", status="done"))
+        session.delete(b)
+        session.commit()
+        self.assertEqual(titles("home"), [])
+        self.assertEqual(titles("errands"), ["A"])
+        self.assertEqual(tag_counts(session, ["todo"]), [("errands", 1)])
+        self.assertEqual(parse_tags(" a, B ,A,, b"), ["a", "B"])
+        session.close()
+
+    def test_bulk_updates_are_one_statement_per_chunk(self):
+        engine = self.make_engine()
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        session = sessionmaker(bind=engine)()
+        session.add_all(Task(title=f"T{i}", tag="old", status="todo") for i in range(3))
+        session.commit()
+        ids = [task.id for task in session.query(Task).order_by(Task.id)]
+        seq = last_change_seq(session)
+        statements = []
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+
+        rows = update_tasks(
+            session, ids + [99], "done", "Bulk", [Task.id, Task.status, Task.tag]
+        )
+        session.commit()
+        self.assertEqual(
+            sorted(tuple(row) for row in rows),
+            [(task_id, "done", "Bulk") for task_id in ids],
+        )
+        self.assertEqual(
+            [s for s in statements if s.startswith("UPDATE tasks")][:1],
+            [s for s in statements if s.startswith("UPDATE")],
+        )
+        self.assertEqual(
+            [c.op for c in changes_since(session, seq)], ["update", "update", "update"]
+        )
+        self.assertEqual(tag_counts(session), [("Bulk", 3)])
+        self.assertTrue(all(t.completed_at for t in session.query(Task)))
+
+        self.assertEqual(delete_tasks(session, ids[:2] + [99]), 2)
+        session.commit()
+        self.assertEqual([t.id for t in session.query(Task)], ids[2:])
+        self.assertEqual(tag_counts(session), [("Bulk", 1)])
+        session.close()
+
+    def test_local_storage_profile_applies_pragmas(self):
+        engine = create_storage_engine(self.db_path, "local")
+        self.addCleanup(engine.dispose)
+        with engine.connect() as conn:
+            pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            self.assertEqual(pragma("journal_mode"), "wal")
+            self.assertEqual(pragma("synchronous"), 1)
+            self.assertEqual(pragma("busy_timeout"), 5000)
+            self.assertEqual(pragma("mmap_size"), 268435456)
+
+
+if __name__ == "__main__":
+    unittest.main()
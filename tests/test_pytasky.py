@@ -1,6 +1,9 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import tkinter as tk
+from tkinter import ttk
+from listview import TaskRow
+from models import ACTIVE_STATUSES, DONE_STATUSES
 from pytasky import PyTaskyApp
 
 
@@ -12,9 +15,10 @@ class TestPyTaskyApp(unittest.TestCase):
     def tearDown(self):
         self.root.destroy()
 
-    @patch("pytasky.get_session")
+    @patch("store.get_session")
     def test_add_task(self, mock_get_session):
         mock_session = MagicMock()
+        mock_session.add.side_effect = lambda task: setattr(task, "id", 100000)
         mock_get_session.return_value = mock_session
 
         self.app.title_entry.insert(0, "Test Task")
@@ -30,21 +34,17 @@ class TestPyTaskyApp(unittest.TestCase):
         self.assertEqual(self.app.notes_entry.get(), "")
         self.assertEqual(self.app.tag_entry.get(), "")
         self.assertEqual(self.app.status_combo.get(), "todo")
+        self.assertIn(100000, self.app.active_model)
 
-    @patch("pytasky.get_session")
+    @patch("store.get_session")
     def test_update_task_list(self, mock_get_session):
         mock_session = MagicMock()
         mock_get_session.return_value = mock_session
-        mock_task = MagicMock()
-        mock_task.id = 1
-        mock_task.title = "Test Task"
-        mock_task.status = "todo"
-        mock_task.created_at = None
-        mock_task.last_updated = None
-        mock_session.query.return_value.filter.return_value.order_by.return_value.all.return_value = [
-            mock_task
+        mock_session.query.return_value.filter.return_value = [
+            (1, "Test Task", None, None, "todo", None, None, None)
         ]
 
+        self.app.store.invalidate()
         self.app.update_task_list()
 
         self.assertEqual(self.app.task_list.size(), 1)
@@ -53,29 +53,92 @@ class TestPyTaskyApp(unittest.TestCase):
             self.app.task_list.get(0),
         )
 
-    @patch("pytasky.get_session")
-    def test_update_done_list(self, mock_get_session):
-        mock_session = MagicMock()
-        mock_get_session.return_value = mock_session
-        mock_task = MagicMock()
-        mock_task.id = 1
-        mock_task.title = "Test Task"
-        mock_task.status = "done"
-        mock_task.created_at = None
-        mock_task.completed_at = None
-        mock_task.last_updated = None
-        mock_session.query.return_value.filter.return_value.order_by.return_value.all.return_value = [
-            mock_task
-        ]
-
-        self.app.update_done_list()
+    def test_update_done_list(self):
+        row = TaskRow(1, "Test Task", None, None, "done", None, None, None)
+        with patch.object(self.app.store, "done_page", return_value=[row]):
+            self.app.update_done_list()
+            self.assertEqual(self.app.done_list.size(), 1)
 
-        self.assertEqual(self.app.done_list.size(), 1)
         self.assertIn(
             "1. Test Task [done - Created: N/A - Completed: N/A - Updated: N/A]",
             self.app.done_list.get(0),
         )
 
+    @patch("pytasky.messagebox.showwarning")
+    @patch("store.get_session")
+    def test_unknown_status_is_a_warning_not_a_traceback(
+        self, mock_get_session, mock_warning
+    ):
+        self.assertEqual(str(self.app.status_combo.cget("state")), "readonly")
+        self.app.title_entry.insert(0, "Test Task")
+        self.app.status_combo.set("someday")
+
+        self.app.add_task()
+
+        mock_warning.assert_called_once()
+        self.assertIn("someday", mock_warning.call_args.args[1])
+        mock_get_session.return_value.add.assert_not_called()
+        self.assertEqual(self.app.title_entry.get(), "Test Task")
+
+    @patch("pytasky.messagebox.showwarning")
+    @patch("store.get_session")
+    def test_saving_an_unknown_status_keeps_the_edit_dialog_open(
+        self, mock_get_session, mock_warning
+    ):
+        # A status stored before statuses were checked
+        row = TaskRow(1, "Test Task", None, None, "someday", None, None, None)
+        self.app.active_model.load([row])
+        self.app.task_list.selection_set(0)
+        self.app.open_edit_window(None)
+        dialog = next(
+            w for w in self.root.winfo_children() if isinstance(w, tk.Toplevel)
+        )
+        widgets = dialog.winfo_children()
+        combo = next(w for w in widgets if isinstance(w, ttk.Combobox))
+        save = next(w for w in widgets if isinstance(w, ttk.Button))
+        self.assertEqual(str(combo.cget("state")), "readonly")
+        self.assertEqual(combo.get(), "someday")
+
+        save.invoke()
+
+        mock_warning.assert_called_once()
+        self.assertTrue(dialog.winfo_exists())
+        mock_get_session.return_value.commit.assert_not_called()
+        self.assertEqual(self.app.active_model.row(0), row)
+
+    def test_search_passes_the_list_filters_to_the_store(self):
+        self.app.active_tag = "work"
+        self.app.done_tag = "docs"
+        self.app.done_bucket = "All"
+        with patch.object(self.app.store, "search", return_value=[]) as search:
+            self.app.search_rows("log", ACTIVE_STATUSES)
+            self.app.search_rows("log", DONE_STATUSES)
+        self.assertEqual(
+            search.call_args_list[0].args, ("log", ACTIVE_STATUSES, "work")
+        )
+        self.assertEqual(
+            search.call_args_list[1].args, ("log", DONE_STATUSES, "docs", None, None)
+        )
+
+    def test_finished_pomodoro_completes_only_the_anchor_task(self):
+        self.app.active_model.load(
+            [
+                TaskRow(i, f"Task {i}", None, None, "todo", None, None, None)
+                for i in (1, 2, 3)
+            ]
+        )
+        self.app.task_list.selection.set(1)
+        self.app.task_list.selection.toggle(3)
+        self.app.task_list.selection.toggle(2)
+        done = TaskRow(2, "Task 2", None, None, "done", None, None, None)
+        with patch.object(self.app.store, "update", return_value=done) as update:
+            with patch.object(self.app.store, "update_many") as update_many:
+                self.app.update_status_to_done()
+
+        update.assert_called_once_with(2, status="done")
+        update_many.assert_not_called()
+        self.assertEqual([self.app.active_model.id_at(i) for i in (0, 1)], [1, 3])
+
     def test_set_custom_pomodoro(self):
         self.app.custom_entry.delete(0, tk.END)
         self.app.custom_entry.insert(0, "30")
@@ -0,0 +1,160 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from models import Base, Recurrence, Task, upgrade_schema
+from recurrence import RecurrenceScheduler, parse_rule
+from store import TaskStore
+
+
+class TestRules(unittest.TestCase):
+    def next_after(self, rule, after):
+        return parse_rule(rule).next_after(datetime.fromisoformat(after))
+
+    def test_rules_fire_at_the_next_matching_minute(self):
+        cases = [
+            ("daily 09:00", "2026-10-16 08:59:30", "2026-10-16 09:00"),
+            ("daily 09:00", "2026-10-16 09:00", "2026-10-17 09:00"),
+            # 16 October 2026 is a Friday
+            ("weekdays 09:30", "2026-10-16 10:00", "2026-10-19 09:30"),
+            ("weekly sat,mon 7:05", "2026-10-16 00:00", "2026-10-17 07:05"),
+            ("monthly 31 08:00", "2026-10-31 09:00", "2026-12-31 08:00"),
+            ("cron */20 9-10 * * *", "2026-10-16 09:41", "2026-10-16 10:00"),
+            ("cron 0 0 29 feb *", "2026-03-01 00:00", "2028-02-29 00:00"),
+            # Day of month or day of week when both are given, as in cron
+            ("cron 0 12 1 * sun", "2026-10-16 00:00", "2026-10-18 12:00"),
+            ("cron 0 12 1 * 7", "2026-10-19 00:00", "2026-10-25 12:00"),
+        ]
+        for rule, after, expected in cases:
+            with self.subTest(rule=rule, after=after):
+                self.assertEqual(
+                    self.next_after(rule, after), datetime.fromisoformat(expected)
+                )
+
+    def test_bad_rules_are_refused(self):
+        for rule in [
+            "",
+            "hourly",
+            "daily 9",
+            "daily 25:00",
+            "weekly funday 09:00",
+            "cron 0 9 * *",
+            "cron 0 9 0 * *",
+            "cron */0 * * * *",
+        ]:
+            with self.subTest(rule=rule), self.assertRaises(ValueError):
+                parse_rule(rule)
+        with self.assertRaises(ValueError):
+            self.next_after("cron 0 0 31 feb *", "2026-01-01 00:00")
+
+
+class TestRecurrenceScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.tmpdir.name, "tasks.db")
+        )
+        Base.metadata.create_all(self.engine)
+        upgrade_schema(self.engine)
+        self.sessions = sessionmaker(bind=self.engine)
+        self.scheduler = RecurrenceScheduler(self.sessions)
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self.record)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def inserts(self):
+        return [s for s in self.statements if s.startswith("INSERT INTO tasks ")]
+
+    def tasks(self):
+        with self.sessions() as session:
+            return session.query(Task.title, Task.created_at).order_by(Task.id).all()
+
+    def test_missed_fire_times_are_caught_up_in_one_insert(self):
+        standup = self.scheduler.add(
+            "Standup", "weekdays 09:30", tag="work, meetings", after=at("10-09 12:00")
+        )
+        self.scheduler.add("Plants", "weekly sun 10:00", after=at("10-09 12:00"))
+        self.assertEqual(standup.next_fire_at, at("10-12 09:30"))
+
+        # The app was closed until the afternoon of Friday the 16th
+        self.statements.clear()
+        self.assertEqual(self.scheduler.tick(at("10-16 15:00")), 6)
+        self.assertEqual(len(self.inserts()), 1)
+        self.assertEqual(
+            self.tasks(),
+            [("Standup", at(f"10-{day} 09:30")) for day in range(12, 17)]
+            + [("Plants", at("10-11 10:00"))],
+        )
+        self.assertEqual(self.scheduler.next_fire_at(), at("10-18 10:00"))
+        self.assertEqual(len(TaskStore(self.sessions).tagged_ids("meetings")), 5)
+        with self.sessions() as session:
+            rule = session.get(Recurrence, standup.id)
+            self.assertEqual(
+                (rule.last_fired_at, rule.next_fire_at),
+                (at("10-16 09:30"), at("10-19 09:30")),
+            )
+
+        self.assertEqual(self.scheduler.tick(at("10-16 16:00")), 0)
+        self.assertEqual(self.scheduler.tick(at("10-19 09:30")), 2)
+
+    def test_ticks_touch_only_due_rules(self):
+        for i in range(500):
+            self.scheduler.add(
+                f"Yearly {i}", "cron 0 9 1 jan *", after=at("10-01 00:00")
+            )
+        self.scheduler.add("Daily", "daily 09:00", after=at("10-01 00:00"))
+        self.scheduler.tick(at("10-01 00:00"))
+
+        # With nothing due a tick only looks for rules added since the last
+        self.statements.clear()
+        self.assertEqual(self.scheduler.tick(at("10-01 08:00")), 0)
+        self.assertEqual(len(self.statements), 1)
+
+        self.assertEqual(self.scheduler.tick(at("10-01 09:00")), 1)
+        self.assertEqual(self.scheduler.next_fire_at(), at("10-02 09:00"))
+        self.assertEqual(len(self.scheduler._heap), 501)
+
+    def test_catch_up_is_spread_over_ticks(self):
+        scheduler = RecurrenceScheduler(self.sessions, catch_up_limit=4)
+        scheduler.add("Daily", "daily 09:00", after=at("10-01 00:00"))
+        self.assertEqual(scheduler.tick(at("10-10 12:00")), 4)
+        self.assertEqual(scheduler.next_fire_at(), at("10-05 09:00"))
+        self.assertEqual(scheduler.tick(at("10-10 12:00")), 4)
+        self.assertEqual(scheduler.tick(at("10-10 12:00")), 2)
+        self.assertEqual(len(self.tasks()), 10)
+
+    def test_schedulers_sharing_a_database_never_duplicate_tasks(self):
+        self.scheduler.add("Daily", "daily 09:00", after=at("10-01 00:00"))
+        other = RecurrenceScheduler(self.sessions)
+        self.assertEqual(other.tick(at("10-01 00:00")), 0)
+
+        self.assertEqual(self.scheduler.tick(at("10-03 12:00")), 3)
+        # The other one's heap is behind; the stored time wins
+        self.assertEqual(other.tick(at("10-03 12:00")), 0)
+        self.assertEqual(other.next_fire_at(), at("10-04 09:00"))
+        self.assertEqual(other.tick(at("10-04 09:00")), 1)
+        self.assertEqual(self.scheduler.tick(at("10-04 09:00")), 0)
+
+        # Rules added or deleted elsewhere are noticed on the next tick
+        late = other.add("Late", "daily 10:00", after=at("10-04 09:00"))
+        self.assertTrue(other.remove(1))
+        self.assertFalse(other.remove(1))
+        self.assertEqual(self.scheduler.tick(at("10-05 09:30")), 1)
+        self.assertEqual(self.tasks()[-1], ("Late", at("10-04 10:00")))
+        self.assertEqual([rule.id for rule in self.scheduler.rules()], [late.id])
+
+
+def at(text):
+    return datetime.fromisoformat(f"2026-{text}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from refresh import RefreshScheduler
+
+
+class FakeIdle:
+    def __init__(self):
+        self.pending = {}
+        self.next_id = 0
+
+    def after_idle(self, callback):
+        self.next_id += 1
+        self.pending[self.next_id] = callback
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+    def run(self):
+        while self.pending:
+            after_id = min(self.pending)
+            self.pending.pop(after_id)()
+
+
+class TestRefreshScheduler(unittest.TestCase):
+    def setUp(self):
+        self.idle = FakeIdle()
+        self.scheduler = RefreshScheduler(self.idle.after_idle, self.idle.after_cancel)
+        self.calls = []
+        self.done_visible = False
+        self.scheduler.register("active", lambda: self.calls.append("active"))
+        self.scheduler.register(
+            "done", lambda: self.calls.append("done"), lambda: self.done_visible
+        )
+
+    def test_requests_coalesce_into_one_idle_pass(self):
+        for _ in range(5):
+            self.scheduler.request("active")
+        self.assertEqual((self.calls, len(self.idle.pending)), ([], 1))
+        self.idle.run()
+        self.assertEqual(self.calls, ["active"])
+        self.assertEqual(
+            self.scheduler.counters(),
+            {"requested": 5, "ran": 1, "avoided": 4, "coalesced": 4, "deferred": 0},
+        )
+        self.idle.run()
+        self.assertEqual(self.calls, ["active"])
+        with self.assertRaises(KeyError):
+            self.scheduler.request("reports")
+
+    def test_hidden_views_wait_until_shown(self):
+        self.scheduler.request("done", "active")
+        self.scheduler.request("done")
+        self.idle.run()
+        self.assertEqual(self.calls, ["active"])
+        self.assertEqual(self.scheduler.pending, {"done"})
+
+        # Passed over by later flushes, it still only counts once
+        self.scheduler.request("active")
+        self.idle.run()
+        self.scheduler.flush()
+        self.assertEqual(self.scheduler.deferred, 1)
+
+        self.done_visible = True
+        self.scheduler.flush()
+        self.assertEqual(self.calls, ["active", "active", "done"])
+        self.assertEqual(
+            self.scheduler.counters(),
+            {"requested": 4, "ran": 3, "avoided": 1, "coalesced": 1, "deferred": 1},
+        )
+
+        # Hidden again, a new request is a new deferral
+        self.done_visible = False
+        self.scheduler.request("done")
+        self.idle.run()
+        self.scheduler.flush()
+        self.assertEqual(self.scheduler.deferred, 2)
+
+    def test_direct_refreshes_and_close_drop_pending_work(self):
+        self.scheduler.request("active")
+        self.scheduler.mark_clean("active")
+        self.idle.run()
+        self.assertEqual(self.calls, [])
+
+        self.scheduler.request("active")
+        self.scheduler.close()
+        self.assertEqual(self.idle.pending, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
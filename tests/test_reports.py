@@ -0,0 +1,205 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from columnar import read_columnar, to_datetime
+from models import Base, Task, archive_tasks, upgrade_schema
+from reports import (
+    CSV_HEADER,
+    count_report_rows,
+    export_incremental,
+    export_report,
+    has_report_rows,
+    read_manifest,
+)
+
+
+class TestStreamingReports(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.addCleanup(engine.dispose)
+        self.session = sessionmaker(bind=engine)()
+        for i in range(1, 6):
+            created = datetime(2025, 3, i, 9, 30, 15, 123456)
+            self.session.add(
+                Task(
+                    id=i,
+                    title=f"Task {i}",
+                    notes='a, "quoted" note' if i == 2 else None,
+                    tag="work",
+                    status="done" if i % 2 else "todo",
+                    created_at=created,
+                    completed_at=created if i % 2 else None,
+                    last_updated=created,
+                )
+            )
+        self.session.commit()
+        self.start = datetime(2025, 3, 1)
+        self.end = datetime(2025, 3, 31)
+
+    def tearDown(self):
+        self.session.close()
+        self.tmpdir.cleanup()
+
+    def export(self, format_type, statuses=None):
+        path = os.path.join(self.tmpdir.name, f"report.{format_type}")
+        count = export_report(
+            self.session,
+            path,
+            format_type,
+            self.start,
+            self.end,
+            statuses,
+            batch_size=2,
+        )
+        with open(path, newline="") as f:
+            return count, f.read()
+
+    def test_json_matches_indented_dump(self):
+        count, text = self.export("json", ["done"])
+        expected = [
+            {
+                "id": i,
+                "title": f"Task {i}",
+                "notes": None,
+                "tag": "work",
+                "status": "done",
+                "created_at": f"2025-03-0{i} 09:30:15",
+                "completed_at": f"2025-03-0{i} 09:30:15",
+                "last_updated": f"2025-03-0{i} 09:30:15",
+            }
+            for i in (1, 3, 5)
+        ]
+        self.assertEqual(count, 3)
+        self.assertEqual(text, json.dumps(expected, indent=2))
+
+    def test_csv_streams_all_rows(self):
+        count, text = self.export("csv")
+        rows = list(csv.reader(text.splitlines()))
+        self.assertEqual(count, 5)
+        self.assertEqual(rows[0], CSV_HEADER)
+        self.assertEqual(rows[2][2], 'a, "quoted" note')
+        self.assertEqual(rows[2][6], "")
+
+    def test_ndjson_writes_one_record_per_line(self):
+        count, text = self.export("ndjson", ["todo"])
+        records = [json.loads(line) for line in text.splitlines()]
+        self.assertEqual(count, 2)
+        self.assertEqual([r["id"] for r in records], [2, 4])
+
+    def test_columnar_report_keeps_native_types(self):
+        path = os.path.join(self.tmpdir.name, "report.ptc")
+        count = export_report(self.session, path, "ptc", self.start, self.end)
+        columns = read_columnar(path)
+        self.assertEqual(count, 5)
+        self.assertEqual(columns["id"], [1, 2, 3, 4, 5])
+        self.assertEqual(columns["notes"][:3], [None, 'a, "quoted" note', None])
+        self.assertEqual(columns["status"], ["done", "todo"] * 2 + ["done"])
+        self.assertEqual(
+            to_datetime(columns["created_at"][0]), datetime(2025, 3, 1, 9, 30, 15)
+        )
+        self.assertIsNone(columns["completed_at"][1])
+        self.assertEqual(read_columnar(path, ["tag"]), {"tag": ["work"] * 5})
+
+    def test_progress_can_abort_and_remove_partial_file(self):
+        path = os.path.join(self.tmpdir.name, "aborted.csv")
+        seen = []
+
+        def progress(count):
+            seen.append(count)
+            if count >= 2:
+                raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            export_report(
+                self.session,
+                path,
+                "csv",
+                self.start,
+                self.end,
+                progress=progress,
+                progress_every=1,
+            )
+        self.assertEqual(seen, [1, 2])
+        self.assertFalse(os.path.exists(path))
+
+    def test_count_report_rows(self):
+        self.assertEqual(count_report_rows(self.session, self.start, self.end), 5)
+        self.assertEqual(
+            count_report_rows(self.session, self.start, self.end, ["todo"]), 2
+        )
+
+    def test_empty_report(self):
+        self.assertFalse(has_report_rows(self.session, self.start, self.end, ["x"]))
+        count, text = self.export("json", ["blocked"])
+        self.assertEqual((count, json.loads(text)), (0, []))
+
+
+class TestIncrementalExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.target = os.path.join(self.tmpdir.name, "warehouse")
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        self.addCleanup(engine.dispose)
+        self.session = sessionmaker(bind=engine)()
+        self.tasks = [Task(title=f"Task {i}", status="todo") for i in range(5)]
+        self.session.add_all(self.tasks)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.tmpdir.cleanup()
+
+    def export(self):
+        part = export_incremental(self.session, self.target, "ndjson")
+        self.session.commit()
+        if part is None:
+            return None, []
+        with open(os.path.join(self.target, part["file"])) as f:
+            return part, [json.loads(line) for line in f]
+
+    def test_later_runs_write_only_changed_tasks(self):
+        part, records = self.export()
+        self.assertEqual(part["file"], "part-00001.ndjson")
+        self.assertEqual([r["title"] for r in records], [t.title for t in self.tasks])
+        self.assertEqual(self.export(), (None, []))
+
+        self.tasks[3].title = "Renamed"
+        self.tasks[1].status = "done"
+        self.tasks[1].completed_at = datetime(2025, 3, 1)
+        self.session.add(Task(title="New", status="todo"))
+        self.session.commit()
+        done_id = self.tasks[1].id
+        archive_tasks(self.session, datetime(2025, 4, 1))
+        self.session.commit()
+
+        part, records = self.export()
+        self.assertEqual(part["file"], "part-00002.ndjson")
+        self.assertEqual([r["title"] for r in records], ["Renamed", "New"])
+        self.assertEqual(part["deleted"], [done_id])
+        manifest = read_manifest(self.target)
+        self.assertEqual(manifest["watermark"], part["watermark"])
+        self.assertEqual(
+            [p["since"] for p in manifest["parts"]],
+            [0, manifest["parts"][0]["watermark"]],
+        )
+        self.assertEqual(sorted(os.listdir(self.target))[-1], "part-00002.ndjson")
+
+    def test_target_keeps_its_format(self):
+        export_incremental(self.session, self.target, "csv")
+        with self.assertRaises(ValueError):
+            export_incremental(self.session, self.target, "ndjson")
+        with self.assertRaises(ValueError):
+            export_incremental(self.session, self.target, "json")
+
+
+if __name__ == "__main__":
+    unittest.main()
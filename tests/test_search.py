@@ -0,0 +1,93 @@
+import unittest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from listview import RankedTaskListModel, format_active_row, row_from_task
+from models import Base, Task, build_match_query, search_tasks, upgrade_schema
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        upgrade_schema(engine)
+        self.addCleanup(engine.dispose)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all(
+            [
+                Task(id=1, title="Fix login bug", notes="OAuth redirect", tag="auth"),
+                Task(id=2, title="Write docs", notes="login page copy", tag="docs"),
+                Task(id=3, title="Café menu", notes=None, tag=None, status="done"),
+            ]
+        )
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def ids(self, text, statuses=None):
+        return [task.id for task in search_tasks(self.session, text, statuses)]
+
+    def test_build_match_query(self):
+        self.assertEqual(build_match_query('fix "lo'), '"fix"* "lo"*')
+        self.assertEqual(build_match_query("  "), "")
+
+    def test_prefix_matches_ranked_by_title_first(self):
+        self.assertEqual(self.ids("log"), [1, 2])
+        self.assertEqual(self.ids("login redirect"), [1])
+        self.assertEqual(self.ids("cafe"), [3])
+        self.assertEqual(self.ids("log", ["done"]), [])
+        self.assertEqual(self.ids(""), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        task = self.session.get(Task, 1)
+        task.title = "Fix signup bug"
+        task.notes = None
+        self.session.commit()
+        self.assertEqual(self.ids("login"), [2])
+        self.assertEqual(self.ids("signup"), [1])
+        self.session.delete(self.session.get(Task, 2))
+        self.session.commit()
+        self.assertEqual(self.ids("login"), [])
+
+    def test_tag_and_completion_filters_apply_before_the_limit(self):
+        # The tagged task only matches in its notes, so ranks last
+        self.session.add_all(
+            [
+                Task(
+                    id=task_id,
+                    title="Clean up" if task_id == 10 else f"Log rotation {task_id}",
+                    notes="rotation" if task_id == 10 else None,
+                    tag="ops" if task_id == 10 else "misc",
+                    status="done",
+                    completed_at=datetime(2025, 3, task_id - 9),
+                )
+                for task_id in range(10, 16)
+            ]
+        )
+        self.session.commit()
+
+        def ids(**filters):
+            tasks = search_tasks(self.session, "rotation", ["done"], limit=2, **filters)
+            return [task.id for task in tasks]
+
+        self.assertNotIn(10, ids())
+        self.assertEqual(ids(tag="OPS"), [10])
+        self.assertEqual(ids(tag="docs"), [])
+        self.assertEqual(ids(until=datetime(2025, 3, 2)), [10])
+        self.assertEqual(
+            sorted(ids(since=datetime(2025, 3, 2), until=datetime(2025, 3, 4))),
+            [11, 12],
+        )
+
+    def test_ranked_model_keeps_result_order(self):
+        model = RankedTaskListModel(format_active_row)
+        model.load([row_from_task(task) for task in search_tasks(self.session, "log")])
+        self.assertEqual([model.row(i).id for i in range(len(model))], [1, 2])
+        row = model.row(1)._replace(title="Write more docs")
+        model.upsert(row)
+        self.assertEqual(model.index_of(2), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+import gc
+import os
+import tempfile
+import unittest
+import weakref
+from datetime import timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import ACTIVE_STATUSES, DONE_STATUSES, Base, Task, upgrade_schema
+from store import StaleTaskError, TaskStore, update_task
+
+
+class CountingSessions:
+    """Session factory that counts how often the store goes to the database"""
+
+    def __init__(self, engine):
+        self.sessionmaker = sessionmaker(bind=engine)
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return self.sessionmaker()
+
+
+class TestTaskStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.tmpdir.name, "tasks.db")
+        )
+        Base.metadata.create_all(self.engine)
+        upgrade_schema(self.engine)
+        self.sessions = CountingSessions(self.engine)
+        self.store = TaskStore(self.sessions)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def ids(self, statuses):
+        return sorted(row.id for row in self.store.rows(statuses))
+
+    def test_lists_are_served_from_cache_after_first_load(self):
+        first = self.store.add("First")
+        second = self.store.add("Second", status="done")
+        self.assertIsNotNone(second.completed_at)
+
+        self.assertEqual(self.ids(ACTIVE_STATUSES), [first.id])
+        self.assertEqual(self.ids(DONE_STATUSES), [second.id])
+        opened = self.sessions.opened
+        self.assertEqual(self.ids(ACTIVE_STATUSES), [first.id])
+        self.assertEqual(self.store.get(second.id), second)
+        self.assertEqual(self.sessions.opened, opened)
+
+    def test_writes_move_rows_between_cached_statuses(self):
+        task = self.store.add("Task")
+        self.store.rows(ACTIVE_STATUSES + DONE_STATUSES)
+
+        done = self.store.update(task.id, status="done")
+        self.assertIsNotNone(done.completed_at)
+        self.assertEqual(self.ids(ACTIVE_STATUSES), [])
+        self.assertEqual(self.ids(DONE_STATUSES), [task.id])
+
+        reopened = self.store.update(task.id, title="Renamed", status="todo")
+        self.assertEqual(self.store.get(task.id), reopened)
+        self.assertEqual(
+            (reopened.title, reopened.completed_at, self.ids(DONE_STATUSES)),
+            ("Renamed", None, []),
+        )
+        self.assertIsNone(self.store.update(999, status="done"))
+
+    def test_invalidate_rereads_rows_changed_elsewhere(self):
+        task = self.store.add("Task")
+        self.store.rows(ACTIVE_STATUSES + DONE_STATUSES)
+        session = self.sessions.sessionmaker()
+        session.get(Task, task.id).status = "cancelled"
+        session.commit()
+        session.close()
+
+        self.assertEqual(self.ids(DONE_STATUSES), [])
+        self.assertEqual(self.store.invalidate(task.id).status, "cancelled")
+        self.assertEqual(self.ids(DONE_STATUSES), [task.id])
+        self.assertEqual(self.ids(ACTIVE_STATUSES), [])
+
+        self.store.invalidate()
+        opened = self.sessions.opened
+        self.assertEqual(self.ids(DONE_STATUSES), [task.id])
+        self.assertEqual(self.sessions.opened, opened + 1)
+
+    def test_done_pages_and_archive(self):
+        old = self.store.add("Old", status="done")
+        recent = self.store.add("Recent", status="cancelled")
+        self.store.add("Active")
+        self.assertEqual(
+            [row.id for row in self.store.done_page()], [recent.id, old.id]
+        )
+        self.assertEqual(
+            self.store.done_page((recent.completed_at, recent.id), limit=5), [old]
+        )
+
+        self.assertEqual(self.store.archive(recent.completed_at), 1)
+        self.assertEqual([row.id for row in self.store.done_page()], [recent.id])
+        self.assertIsNone(self.store.get(old.id))
+
+    def test_sync_replays_changes_made_by_other_stores(self):
+        kept = self.store.add("Kept")
+        self.assertEqual(self.store.sync(), [])
+        self.store.rows(ACTIVE_STATUSES + DONE_STATUSES)
+        other = TaskStore(self.sessions)
+        added = other.add("Added elsewhere")
+        other.update(kept.id, title="Renamed", status="done")
+
+        opened = self.sessions.opened
+        changes = self.store.sync()
+        self.assertEqual(
+            [(c.op, c.task_id) for c in changes],
+            [("insert", added.id), ("update", kept.id)],
+        )
+        self.assertEqual(
+            set(changes[1].fields), {"title", "status", "completed_at", "last_updated"}
+        )
+        # Only the change log was read: the rows were patched in the cache
+        self.assertEqual(self.sessions.opened, opened + 1)
+        self.assertEqual(self.store.get(kept.id), other.get(kept.id))
+        self.assertEqual(self.ids(ACTIVE_STATUSES), [added.id])
+        self.assertEqual(self.store.sync(), [])
+
+        other.archive(other.get(kept.id).completed_at + timedelta(seconds=1))
+        self.assertEqual([c.op for c in self.store.sync()], ["delete"])
+        self.assertEqual(self.ids(DONE_STATUSES), [])
+
+    def test_tag_lookups_go_through_the_index(self):
+        docs = self.store.add("Docs", tag="docs, urgent")
+        self.store.add("Bug", tag="bugs")
+        shipped = self.store.add("Shipped", tag="docs", status="done")
+        self.assertEqual(self.store.tagged_ids("Docs"), {docs.id, shipped.id})
+        self.assertEqual(self.store.done_page(tag="docs"), [shipped])
+        self.assertEqual(self.store.done_page(tag="bugs"), [])
+
+        self.store.update(docs.id, tag="bugs")
+        self.assertEqual(self.store.tag_counts(ACTIVE_STATUSES), [("bugs", 2)])
+        self.assertEqual(self.store.tag_counts(), [("bugs", 2), ("docs", 1)])
+
+    def test_bulk_updates_and_deletes_commit_once(self):
+        tasks = [self.store.add(f"Task {i}", tag="old") for i in range(3)]
+        ids = [task.id for task in tasks]
+        self.store.rows(ACTIVE_STATUSES + DONE_STATUSES)
+        self.store.sync()
+
+        opened = self.sessions.opened
+        rows = self.store.update_many(ids[:2] + [999], status="done", tag="new, bulk")
+        self.assertEqual(self.sessions.opened, opened + 1)
+        self.assertEqual(sorted(row.id for row in rows), ids[:2])
+        self.assertTrue(all(row.completed_at for row in rows))
+        # The cache was patched from the returned rows
+        self.assertEqual(self.ids(DONE_STATUSES), ids[:2])
+        self.assertEqual(self.store.get(ids[0]).tag, "new, bulk")
+        self.assertEqual(self.store.tagged_ids("bulk"), set(ids[:2]))
+        self.assertEqual([c.op for c in self.store.sync()], ["update", "update"])
+        with self.assertRaises(ValueError):
+            self.store.update_many(ids, status="sideways")
+
+        self.assertEqual(self.store.delete(ids[1:] + [999]), 2)
+        self.assertEqual(self.ids(ACTIVE_STATUSES + DONE_STATUSES), ids[:1])
+        self.assertIsNone(self.store.get(ids[2]))
+        self.assertEqual(self.store.tag_counts(), [("bulk", 1), ("new", 1)])
+        self.assertEqual([c.op for c in self.store.sync()], ["delete", "delete"])
+
+    def test_stale_edits_are_refused(self):
+        task = self.store.add("Task")
+        other = TaskStore(self.sessions)
+        changed = other.update(task.id, title="Changed elsewhere")
+
+        with self.assertRaises(StaleTaskError):
+            self.store.update(task.id, title="Mine", expected_updated=task.last_updated)
+        self.assertEqual(self.store.invalidate(task.id), changed)
+        saved = self.store.update(
+            task.id, title="Mine", expected_updated=changed.last_updated
+        )
+        self.assertEqual(saved.title, "Mine")
+
+    def test_edits_racing_a_commit_are_refused(self):
+        task = self.store.add("Task")
+        mine = self.sessions()
+        try:
+            # This session reads the task, then another writer commits
+            read = mine.get(Task, task.id)
+            self.assertEqual(read.last_updated, task.last_updated)
+            other = TaskStore(self.sessions).update(task.id, title="Theirs")
+            with self.assertRaises(StaleTaskError):
+                update_task(
+                    mine, task.id, title="Mine", expected_updated=task.last_updated
+                )
+            mine.commit()
+        finally:
+            mine.close()
+        self.assertEqual(TaskStore(self.sessions).get(task.id), other)
+        self.assertIsNone(
+            self.store.update(999, title="x", expected_updated=task.last_updated)
+        )
+        with self.assertRaises(StaleTaskError):
+            self.store.update(task.id, title="Mine", expected_updated=task.last_updated)
+
+    def test_edit_cycles_leak_no_sessions_or_connections(self):
+        sessions = weakref.WeakSet()
+
+        def factory():
+            session = self.sessions()
+            sessions.add(session)
+            return session
+
+        editor = TaskStore(factory, cache=False)
+        other = TaskStore(self.sessions, cache=False)
+        task_id = editor.add("Task").id
+        stale = 0
+        for i in range(1000):
+            # Opening the dialog takes a snapshot; closing it drops it
+            snapshot = editor.get(task_id)
+            if i % 100 == 1:
+                other.update(task_id, notes=f"Edited elsewhere {i}")
+            if i % 2 == 0:
+                continue
+            try:
+                editor.update(
+                    task_id, title=f"Edit {i}", expected_updated=snapshot.last_updated
+                )
+            except StaleTaskError:
+                stale += 1
+        self.assertEqual(stale, 10)
+        self.assertGreater(self.sessions.opened, 1000)
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+        gc.collect()
+        self.assertEqual(len(sessions), 0)
+
+    def test_uncached_store_always_reads_the_database(self):
+        store = TaskStore(self.sessions, cache=False)
+        task = store.add("Task")
+        store.rows(ACTIVE_STATUSES)
+        opened = self.sessions.opened
+        self.assertEqual([row.id for row in store.rows(ACTIVE_STATUSES)], [task.id])
+        self.assertEqual(store.get(task.id).title, "Task")
+        self.assertEqual(self.sessions.opened, opened + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
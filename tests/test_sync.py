@@ -0,0 +1,218 @@
+import asyncio
+import os
+import queue
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import ACTIVE_STATUSES, DONE_STATUSES, Base, upgrade_schema
+from remote import RemoteTaskStore
+from server import SyncServer
+from store import StaleTaskError, TaskStore
+from worker import Job
+
+
+class TestSyncServer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.tmpdir.name, "tasks.db")
+        )
+        Base.metadata.create_all(self.engine)
+        upgrade_schema(self.engine)
+        self.sessions = sessionmaker(bind=self.engine)
+        self.server = SyncServer(TaskStore(self.sessions), port=0, poll_s=0.05)
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.server.start())
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.client = self.connect()
+
+    def tearDown(self):
+        self.call(self.server.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(5)
+
+    def connect(self):
+        store = RemoteTaskStore(self.server.url, timeout=5, retry_s=0.1)
+        self.addCleanup(store.close)
+        return store
+
+    def test_crud_round_trip(self):
+        task = self.client.add("Write docs", tag="docs")
+        self.assertEqual(
+            (task.title, task.tag, task.status), ("Write docs", "docs", "todo")
+        )
+        self.assertEqual(self.client.invalidate(task.id), task)
+        self.assertEqual(
+            [row.id for row in self.client.rows(ACTIVE_STATUSES)], [task.id]
+        )
+
+        done = self.client.update(task.id, status="done")
+        self.assertIsNotNone(done.completed_at)
+        self.assertEqual(self.client.rows(ACTIVE_STATUSES), [])
+        self.assertEqual(self.connect().done_page(), [done])
+        self.assertIsNone(self.client.update(999, title="missing"))
+        with self.assertRaises(StaleTaskError):
+            self.client.update(
+                task.id, title="Stale", expected_updated=task.last_updated
+            )
+        self.assertEqual(
+            self.client.update(
+                task.id, title="Fresh", expected_updated=done.last_updated
+            ).title,
+            "Fresh",
+        )
+        self.assertIsNone(self.client.get(999))
+        with self.assertRaises(ValueError):
+            self.client.add("Bad", status="sideways")
+
+    def listen(self, store):
+        changes = queue.Queue()
+        store.listen(changes.put)
+        # Wait for the listener to subscribe before writing
+        while not self.server._subscribers:
+            threading.Event().wait(0.01)
+        return changes
+
+    def test_changes_are_pushed_to_other_clients(self):
+        other = self.connect()
+        other.sync()
+        changes = self.listen(other)
+        self.assertEqual(other.rows(ACTIVE_STATUSES), [])
+
+        task = self.client.add("Shared")
+        self.assertEqual(
+            [(c.op, c.task_id) for c in changes.get(timeout=5)], [("insert", task.id)]
+        )
+        self.assertEqual(other.rows(ACTIVE_STATUSES), [task])
+
+        done = self.client.update(task.id, status="done")
+        self.assertEqual(changes.get(timeout=5)[0].fields["status"], "done")
+        self.assertEqual(other.rows(ACTIVE_STATUSES), [])
+        self.assertEqual(other.get(task.id), done)
+
+        before = done.completed_at + timedelta(seconds=1)
+        self.assertEqual(self.client.archive(before), 1)
+        self.assertEqual([c.op for c in changes.get(timeout=5)], ["delete"])
+        self.assertIsNone(other.get(task.id))
+
+    def test_bulk_writes_over_http(self):
+        ids = [self.client.add(f"Task {i}").id for i in range(3)]
+        other = self.connect()
+        other.sync()
+        changes = self.listen(other)
+
+        rows = self.client.update_many(ids, status="done", tag="bulk")
+        self.assertEqual(sorted(row.id for row in rows), ids)
+        self.assertEqual(self.client.rows(ACTIVE_STATUSES), [])
+        self.assertEqual(self.client.tagged_ids("bulk"), set(ids))
+        self.assertEqual(
+            sorted((c.op, c.task_id) for c in changes.get(timeout=5)),
+            [("update", task_id) for task_id in ids],
+        )
+        self.assertEqual(other.get(ids[0]).status, "done")
+
+        self.assertEqual(self.client.delete(ids[:2]), 2)
+        self.assertEqual([c.op for c in changes.get(timeout=5)], ["delete", "delete"])
+        self.assertEqual([row.id for row in self.client.rows(DONE_STATUSES)], ids[2:])
+        self.assertIsNone(other.get(ids[0]))
+
+    def test_offline_clients_catch_up_from_the_change_log(self):
+        other = self.connect()
+        self.assertEqual(other.sync(), [])
+        first = self.client.add("First")
+        self.client.update(first.id, tag="while offline")
+        # Written straight to the database, as the command line would
+        second = TaskStore(self.sessions).add("Second")
+
+        changes = self.listen(other)
+        caught_up = changes.get(timeout=5)
+        self.assertEqual(
+            [(c.op, c.task_id) for c in caught_up],
+            [("insert", first.id), ("update", first.id), ("insert", second.id)],
+        )
+        self.assertEqual(other.get(first.id).tag, "while offline")
+
+        third = TaskStore(self.sessions).add("Third")
+        self.assertEqual(changes.get(timeout=5)[0].task_id, third.id)
+        self.assertEqual(other.get(third.id), third)
+
+    def test_concurrent_writes_share_a_transaction(self):
+        async def burst():
+            return await asyncio.gather(
+                *(
+                    self.server._write("add", None, {"title": f"Task {i}"})
+                    for i in range(20)
+                )
+            )
+
+        batches = self.server.batches
+        rows = self.call(burst())
+        self.assertEqual(len({row.id for row in rows}), 20)
+        self.assertEqual(self.server.batches, batches + 1)
+
+        async def with_bad_write():
+            return await asyncio.gather(
+                self.server._write("add", None, {"title": "Good"}),
+                self.server._write("add", None, {"title": ""}),
+                return_exceptions=True,
+            )
+
+        good, bad = self.call(with_bad_write())
+        self.assertEqual(good.title, "Good")
+        self.assertIsInstance(bad, ValueError)
+
+    def test_reports_and_stats_over_http(self):
+        for i in range(5):
+            self.client.add(
+                f"Task {i}", tag=f"team-{i % 2}", status="done" if i % 2 else "todo"
+            )
+        start = datetime.now() - timedelta(days=1)
+        end = datetime.now() + timedelta(days=1)
+        self.assertEqual(self.client.report_count(start, end, DONE_STATUSES), 2)
+        self.assertEqual(self.client.report_count(start, end, tag="team-0"), 3)
+        self.assertEqual(self.client.tag_counts(ACTIVE_STATUSES), [("team-0", 3)])
+        self.assertEqual(len(self.client.tagged_ids("team-1")), 2)
+        self.assertEqual(len(self.client.done_page(tag="team-1")), 2)
+        self.assertTrue(self.client.has_report_rows(start, end))
+
+        filename = os.path.join(self.tmpdir.name, "report.csv")
+        count = self.client.export(Job(queue.Queue()), filename, "csv", start, end)
+        local = os.path.join(self.tmpdir.name, "local.csv")
+        self.server.store.export(Job(queue.Queue()), local, "csv", start, end)
+        with open(filename) as remote_file, open(local) as local_file:
+            self.assertEqual(remote_file.read(), local_file.read())
+        self.assertEqual(count, 5)
+
+        task_id = self.client.rows(DONE_STATUSES)[0].id
+        self.client.record_pomodoro(task_id, start, start + timedelta(minutes=25))
+        stats = self.client.stats(start, end)
+        self.assertEqual(
+            set(stats),
+            {
+                "median_cycle_s",
+                "tags",
+                "totals",
+                "pomodoros",
+                "completed_per_day",
+                "pomodoros_per_task",
+            },
+        )
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.assertEqual(
+            stats["completed_per_day"], [{"day": today, "tag": "team-1", "done": 2}]
+        )
+        self.assertEqual(stats["pomodoros_per_task"][0]["pomodoros"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
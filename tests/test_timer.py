@@ -0,0 +1,99 @@
+import unittest
+from timer import PomodoroTimer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeScheduler:
+    def __init__(self, clock):
+        self.clock = clock
+        self.pending = {}
+        self.next_id = 0
+
+    def after(self, ms, callback):
+        self.next_id += 1
+        self.pending[self.next_id] = (self.clock.now + ms / 1000, callback)
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        del self.pending[after_id]
+
+    def advance(self, seconds, lag=0.0):
+        """Move time forward, firing due callbacks up to ``lag`` seconds late"""
+        end = self.clock.now + seconds
+        while self.pending:
+            after_id, (due, callback) = min(
+                self.pending.items(), key=lambda item: item[1][0]
+            )
+            if due + lag > end:
+                break
+            del self.pending[after_id]
+            self.clock.now = max(self.clock.now, due + lag)
+            callback()
+        self.clock.now = end
+
+
+class TestPomodoroTimer(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = FakeScheduler(self.clock)
+        self.ticks = []
+        self.finished = []
+        self.timer = PomodoroTimer(
+            60,
+            self.scheduler.after,
+            self.scheduler.after_cancel,
+            on_tick=self.ticks.append,
+            on_finish=lambda: self.finished.append(self.clock.now),
+            clock=self.clock,
+        )
+
+    def test_repaints_once_per_displayed_second(self):
+        self.timer.start()
+        self.scheduler.advance(3)
+        self.assertEqual(self.ticks, [60, 59, 58, 57])
+        self.assertEqual(len(self.scheduler.pending), 1)
+
+    def test_late_callbacks_do_not_drift(self):
+        self.timer.start()
+        self.scheduler.advance(30, lag=0.4)
+        self.assertEqual(self.timer.remaining_seconds, 30)
+        self.scheduler.advance(31, lag=0.4)
+        self.assertEqual(len(self.finished), 1)
+        self.assertAlmostEqual(self.finished[0], 1060.4)
+
+    def test_blocked_main_loop_skips_to_correct_second(self):
+        self.timer.start()
+        self.clock.now += 12.5
+        self.scheduler.advance(0)
+        self.assertEqual(self.ticks, [60, 48])
+
+    def test_pause_and_resume(self):
+        self.timer.start()
+        self.scheduler.advance(10.5)
+        self.timer.pause()
+        self.assertFalse(self.timer.running)
+        self.assertEqual(self.scheduler.pending, {})
+        self.scheduler.advance(100)
+        self.assertAlmostEqual(self.timer.remaining, 49.5)
+        self.timer.start()
+        self.scheduler.advance(49.5)
+        self.assertEqual(len(self.finished), 1)
+        self.assertEqual(self.timer.remaining_seconds, 0)
+
+    def test_reset_stops_and_repaints(self):
+        self.timer.start()
+        self.timer.reset(300)
+        self.assertFalse(self.timer.running)
+        self.assertEqual(self.ticks[-1], 300)
+        self.assertEqual(self.timer.remaining_seconds, 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+from worker import BackgroundWorker
+
+
+class TestBackgroundWorker(unittest.TestCase):
+    def setUp(self):
+        self.scheduled = []
+        self.worker = BackgroundWorker(
+            lambda ms, callback: self.scheduled.append(callback)
+        )
+        self.events = []
+
+    def tearDown(self):
+        self.worker.shutdown()
+
+    def run_until_idle(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.worker.busy and time.monotonic() < deadline:
+            callbacks, self.scheduled = self.scheduled, []
+            for callback in callbacks:
+                callback()
+            time.sleep(0.001)
+        self.assertFalse(self.worker.busy)
+
+    def submit(self, func, *args):
+        return self.worker.submit(
+            func,
+            *args,
+            on_progress=lambda *a: self.events.append(("progress", a)),
+            on_done=lambda result: self.events.append(("done", result)),
+            on_error=lambda error: self.events.append(("error", str(error))),
+            on_cancel=lambda: self.events.append(("cancelled", None)),
+        )
+
+    def test_progress_and_result_are_delivered_in_order(self):
+        def job(handle, n):
+            for i in range(n):
+                handle.report_progress(i + 1, n)
+            return n * 10
+
+        self.submit(job, 3)
+        self.run_until_idle()
+        self.assertEqual(
+            self.events,
+            [
+                ("progress", (1, 3)),
+                ("progress", (2, 3)),
+                ("progress", (3, 3)),
+                ("done", 30),
+            ],
+        )
+
+    def test_cancel_stops_job(self):
+        started = threading.Event()
+
+        def job(handle):
+            started.set()
+            while True:
+                handle.raise_if_cancelled()
+                time.sleep(0.001)
+
+        handle = self.submit(job)
+        started.wait(5)
+        handle.cancel()
+        self.run_until_idle()
+        self.assertEqual(self.events, [("cancelled", None)])
+
+    def test_errors_are_reported(self):
+        def job(handle):
+            raise ValueError("boom")
+
+        self.submit(job)
+        self.run_until_idle()
+        self.assertEqual(self.events, [("error", "boom")])
+
+
+if __name__ == "__main__":
+    unittest.main()